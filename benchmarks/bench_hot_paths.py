@@ -0,0 +1,434 @@
+"""Benchmark jalur panas ingest, penyimpanan dan render pada skala 1k, 100k dan 1M record.
+
+Kasus yang diukur (record = pesan untuk decode/drain, selain itu jumlah log,
+alert dan sampel sensor per metrik di store):
+
+    decode             inject(): parse topik, decode dan validasi payload ke buffer
+    drain              drain() yang dipanggil process_mqtt_messages(): buffer ke store bersama
+    alert_summary      ringkasan alert dari penghitung berjalan (jumlah 24 jam, top device, laju)
+    alert_scan_legacy  pemindaian dan sort seluruh list alert seperti sebelum penghitung berjalan
+    log_query          filter log render_logs_tab(): query indeks LogStore dan DataFrame berwarna
+    overview_figure    agregat min/mean/max seluruh device dan figure Plotly render_overview_tab()
+    overview_live      decimasi min/max satu device (mode Live) dan figure Plotly
+    rerun_overview     satu rerun penuh dashboard di tab Overview (AppTest, headless)
+    rerun_logs         idem, tab Logs
+    rerun_alerts       idem, tab Alerts
+
+Jalankan dari root repo:
+
+    python benchmarks/bench_hot_paths.py --scales 1000 100000
+    python benchmarks/bench_hot_paths.py --scales 1000 100000 1000000 --save benchmarks/baseline.json
+    python benchmarks/bench_hot_paths.py --compare benchmarks/baseline.json
+
+--compare keluar dengan kode 1 jika ada kasus yang lebih lambat dari baseline
+melebihi --tolerance. Kasus yang sama juga bisa dijalankan dengan
+pytest-benchmark lewat benchmarks/test_hot_paths.py.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import cycle, islice
+
+import plotly.graph_objects as go
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from jmailbox.ingest import IngestService
+from jmailbox.logs import log_frame, style_log_frame
+from jmailbox.series import MinMaxDecimator, decimate_minmax, from_epoch_ms, now_ms
+from jmailbox.simulator import ALERT_REASONS, FleetSimulator
+from jmailbox.store import DashboardStore
+
+DASHBOARD = os.path.join(ROOT, "dashboard_jmailbox.py")
+DEFAULT_SCALES = [1000, 100000]
+DEVICES = 50                # Jumlah mailbox virtual
+MESSAGE_POOL = 20000        # Pesan simulator yang diputar ulang untuk decode/drain
+CHART_MAX_POINTS = 1500     # Sama dengan konfigurasi dashboard
+DAY_MS = 24 * 3600 * 1000
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+# Filter bawaan tab Logs: tiga level dan tiga device pertama
+LOG_FILTER_LEVELS = ["INFO", "WARNING", "ERROR"]
+RERUN_TABS = {
+    'rerun_overview': "📊 Overview",
+    'rerun_logs': "📝 Logs",
+    'rerun_alerts': "🚨 Alerts"
+}
+
+
+# ==================== DATA ====================
+@lru_cache(maxsize=1)
+def message_pool(seed=0):
+    """Pesan mailbox dari simulator (tanpa kamera): list (topic, payload)"""
+    fleet = FleetSimulator(mailboxes=DEVICES, cameras=0, seed=seed, prefix="bench")
+    return [(topic, payload) for _, topic, payload in fleet.messages(1000, count=MESSAGE_POOL)]
+
+
+def messages(count):
+    """`count` pesan; pool tetap diputar ulang agar memori tidak ikut membesar"""
+    return islice(cycle(message_pool()), count)
+
+
+def device_ids():
+    return [f"bench-mb{i:04d}" for i in range(DEVICES)]
+
+
+@lru_cache(maxsize=1)
+def seeded_store(scale, seed=0):
+    """Store berisi `scale` log, alert dan sampel sensor per metrik dalam 24 jam terakhir
+
+    Batas laju dan deduplikasi alert dimatikan agar setiap alert tersimpan;
+    retensi sensor dibagi rata ke seluruh device seperti SENSOR_RETENTION
+    dashboard (20000 per deret = 1M sampel untuk 50 device).
+    """
+    rng = random.Random(seed)
+    store = DashboardStore(sensor_retention=max(1, scale // DEVICES), log_capacity=scale,
+                           alert_dedup_ms=0, alert_rate=1e9, alert_burst=1e9)
+    ids = device_ids()
+    end = now_ms()
+    step = max(1, DAY_MS // scale)
+    start = end - step * scale
+    with store.lock:
+        for i, device_id in enumerate(ids):
+            status = {"type": "ESP32", "tags": [f"zone-{i % 5}"]}
+            store.registry.touch(device_id, end, status)
+            store.registry.announce(device_id, status)
+        for i in range(scale):
+            ts = start + i * step
+            device_id = ids[i % DEVICES]
+            store.logs.append(ts, LOG_LEVELS[i % len(LOG_LEVELS)], device_id, f"Benchmark log entry {i}")
+            reason, severity = ALERT_REASONS[i % len(ALERT_REASONS)]
+            store.alerts.append(ts, device_id, reason, severity, f"Benchmark alert {i}")
+            store.sensors.record(device_id, ts, {
+                "distance": rng.uniform(5, 60),
+                "wifi_rssi": rng.uniform(-90, -40)
+            })
+        store.touch(*DashboardStore.DOMAINS)
+    return store
+
+
+def legacy_alerts(scale):
+    """List dict alert seperti st.session_state.security_alerts sebelum AlertStore"""
+    ids = device_ids()
+    end = now_ms()
+    step = max(1, DAY_MS // scale)
+    alerts = []
+    for i in range(scale):
+        reason, severity = ALERT_REASONS[i % len(ALERT_REASONS)]
+        alerts.append({
+            "timestamp": from_epoch_ms(end - (scale - i) * step),
+            "device": ids[i % DEVICES],
+            "reason": reason,
+            "severity": severity,
+            "message": f"Benchmark alert {i}"
+        })
+    return alerts
+
+
+# ==================== KASUS ====================
+class Case:
+    """Satu kasus benchmark: setup(scale) mengembalikan fungsi tanpa argumen yang diukur
+
+    Kasus `fresh` mengubah state yang disiapkan (mis. mengosongkan buffer),
+    sehingga setup diulang sebelum setiap pengukuran.
+    """
+
+    def __init__(self, setup, fresh=False):
+        self.setup = setup
+        self.fresh = fresh
+
+
+def ingest_service(buffer_size):
+    """IngestService yang tidak pernah terhubung ke broker; pesan masuk lewat inject()"""
+    return IngestService("127.0.0.1", 1883, ["jmailbox/#"], store=DashboardStore(),
+                         buffer_size=buffer_size)
+
+
+def setup_decode(scale):
+    service = ingest_service(scale)
+    batch = list(messages(scale))
+
+    def run():
+        for topic, payload in batch:
+            service.inject(topic, payload)
+    return run
+
+
+def setup_drain(scale):
+    service = ingest_service(scale)
+    for topic, payload in messages(scale):
+        service.inject(topic, payload)
+
+    def run():
+        service.drain(max_messages=scale, max_ms=10 ** 9)
+    return run
+
+
+def setup_alert_summary(scale):
+    store = seeded_store(scale)
+
+    def run():
+        store.alert_summary()
+        store.alert_rate(60)
+    return run
+
+
+def setup_alert_scan_legacy(scale):
+    alerts = legacy_alerts(scale)
+
+    def run():
+        now = datetime.now()
+        since = now - timedelta(hours=24)
+        sorted(alerts, key=lambda a: a['timestamp'], reverse=True)[:20]
+        len([a for a in alerts if a['timestamp'] >= since])
+        len([a for a in alerts if a['timestamp'].date() == now.date()])
+        len([a for a in alerts if a.get('severity', 1) >= 3])
+    return run
+
+
+def setup_log_query(scale):
+    store = seeded_store(scale)
+    devices = device_ids()[:3]
+
+    def run():
+        logs, _ = store.query_logs(levels=LOG_FILTER_LEVELS, devices=devices, limit=100)
+        style_log_frame(log_frame(logs))
+    return run
+
+
+def setup_overview_figure(scale):
+    store = seeded_store(scale)
+
+    def run():
+        agg = store.sensor_aggregate('distance')
+        fig = go.Figure()
+        for column in ('max', 'min', 'mean'):
+            x, y = decimate_minmax(agg['timestamp'], agg[column], CHART_MAX_POINTS)
+            fig.add_trace(go.Scatter(x=x, y=y, mode='lines', name=column))
+    return run
+
+
+def setup_overview_live(scale):
+    store = seeded_store(scale)
+    device_id = device_ids()[0]
+
+    def run():
+        decimator = MinMaxDecimator(CHART_MAX_POINTS)
+        store.update_decimator(device_id, 'distance', decimator)
+        x, y = decimator.points()
+        go.Figure(go.Scatter(x=x, y=y, mode='lines'))
+    return run
+
+
+class DashboardApp:
+    """Dashboard dijalankan headless lewat AppTest dengan store berisi data benchmark
+
+    Hanya dibuat di proses anak AppProcess: broker diarahkan ke port lokal yang
+    tertutup, endpoint HTTP dimatikan dan direktori kerja dipindah ke folder
+    sementara (riwayat SQLite dan arsip dashboard). Setiap rerun didahului
+    touch() semua domain, sehingga yang diukur adalah rerun setelah data berubah.
+    """
+
+    def __init__(self):
+        from streamlit.logger import set_log_level
+        from streamlit.testing.v1 import AppTest
+
+        os.environ.update(JMAILBOX_MQTT_BROKER="127.0.0.1", JMAILBOX_MQTT_PORT="1",
+                          JMAILBOX_METRICS_PORT="0", JMAILBOX_EXPORT_PORT="0")
+        os.chdir(tempfile.mkdtemp(prefix="jmailbox-bench-"))
+        self.at = AppTest.from_file(DASHBOARD, default_timeout=120)
+        self.run()
+        # Peringatan per rerun (ScriptRunContext, use_container_width) menenggelamkan tabel;
+        # logger Streamlit baru ada setelah rerun pertama
+        set_log_level("error")
+        # Layanan ingest dashboard adalah cache_resource di proses ini; satu-satunya yang berjalan
+        self.service = next(obj for obj in gc.get_objects()
+                            if isinstance(obj, IngestService) and obj.running)
+        self.scale = None
+
+    def load(self, scale):
+        if self.scale != scale:
+            self.service.store = seeded_store(scale)
+            self.scale = scale
+
+    def run(self, tab=None):
+        if tab is not None:
+            self.at.session_state["main_tabs"] = tab
+        self.at.run()
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].value)
+
+    def rerun(self, tab):
+        store = self.service.store
+        with store.lock:
+            store.touch(*DashboardStore.DOMAINS)
+        self.run(tab)
+
+
+def _app_worker(conn):
+    """Isi proses anak: jalankan (method, argumen) DashboardApp dari conn sampai menerima None"""
+    app = DashboardApp()
+    conn.send((None, None))
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        method, args = request
+        try:
+            conn.send((getattr(app, method)(*args), None))
+        except Exception as e:
+            conn.send((None, f"{type(e).__name__}: {str(e)}"))
+
+
+class AppProcess:
+    """DashboardApp di proses anak (spawn)
+
+    Direktori kerja, environment, cache_resource dan thread Streamlit milik
+    dashboard tetap di proses anak, sehingga tidak bocor ke pemanggil (mis.
+    test lain dalam satu sesi pytest). Yang diukur termasuk satu round-trip
+    pipe, kecil dibanding satu rerun.
+    """
+
+    def __init__(self):
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_app_worker, args=(child_conn,),
+                                       name="jmailbox-bench-app", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self._result()
+
+    def _result(self):
+        try:
+            result, error = self.conn.recv()
+        except EOFError:
+            raise RuntimeError("Dashboard benchmark process exited") from None
+        if error is not None:
+            raise RuntimeError(error)
+        return result
+
+    def call(self, method, *args):
+        self.conn.send((method, args))
+        return self._result()
+
+    def close(self):
+        self.conn.send(None)
+        self.process.join(10)
+
+
+@lru_cache(maxsize=1)
+def dashboard_app():
+    return AppProcess()
+
+
+def rerun_setup(tab):
+    def setup(scale):
+        app = dashboard_app()
+        app.call("load", scale)
+        return lambda: app.call("rerun", tab)
+    return setup
+
+
+CASES = {
+    'decode': Case(setup_decode, fresh=True),
+    'drain': Case(setup_drain, fresh=True),
+    'alert_summary': Case(setup_alert_summary),
+    'alert_scan_legacy': Case(setup_alert_scan_legacy),
+    'log_query': Case(setup_log_query),
+    'overview_figure': Case(setup_overview_figure),
+    'overview_live': Case(setup_overview_live),
+}
+CASES.update((name, Case(rerun_setup(tab))) for name, tab in RERUN_TABS.items())
+
+
+# ==================== PENGUKURAN ====================
+def time_case(case, scale, repeat):
+    """Median waktu (ms) satu kasus pada satu skala; setup tidak ikut diukur"""
+    run = case.setup(scale)
+    if not case.fresh:
+        run()  # pemanasan
+    timings = []
+    for i in range(repeat):
+        if case.fresh and i:
+            run = case.setup(scale)
+        gc.collect()
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)['results']
+
+
+def save_baseline(path, results, args):
+    """Simpan hasil sebagai JSON {kasus: {skala: median ms}} beserta info mesin"""
+    data = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': results
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main():
+    """Cetak tabel median waktu per kasus dan skala, opsional simpan/bandingkan baseline"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="tulis hasil ke file baseline JSON")
+    parser.add_argument("--compare", help="bandingkan dengan file baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="perlambatan maksimum terhadap baseline sebelum dianggap regresi")
+    parser.add_argument("--min-ms", type=float, default=1.0,
+                        help="kasus di bawah waktu ini tidak dinilai (terlalu berisik)")
+    args = parser.parse_args()
+    save = args.save
+    baseline = load_baseline(args.compare) if args.compare else {}
+
+    results = {}
+    regressions = []
+    print(f"{'case':<18} {'records':>9} {'median (ms)':>12} {'us/record':>10} {'baseline':>10} {'change':>8}")
+    for scale in args.scales:
+        for name in args.cases:
+            elapsed = time_case(CASES[name], scale, args.repeat)
+            results.setdefault(name, {})[str(scale)] = round(elapsed, 3)
+            line = f"{name:<18} {scale:>9} {elapsed:>12.2f} {elapsed * 1000 / scale:>10.3f}"
+            base = baseline.get(name, {}).get(str(scale))
+            if base:
+                change = elapsed / base - 1
+                line += f" {base:>10.2f} {change:>+7.0%}"
+                if change > args.tolerance and max(base, elapsed) >= args.min_ms:
+                    regressions.append((name, scale, change))
+                    line += "  REGRESSION"
+            print(line)
+            sys.stdout.flush()
+
+    if save:
+        save_baseline(save, results, args)
+        print(f"Baseline saved to {save}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.tolerance:.0%}: "
+              + ", ".join(f"{name}@{scale} {change:+.0%}" for name, scale, change in regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark waktu rerun tampilan log: widget per baris (lama) vs satu grid dataframe.
+
+Jalankan dari root repo:
+
+    python benchmarks/bench_log_viewer.py --rows 10 100 500 2000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_viewer_app():
+    """Tampilan lama: empat st.columns dan satu span HTML per baris log"""
+    import streamlit as st
+    from datetime import datetime
+
+    rows = st.session_state.bench_rows
+    color_map = {"DEBUG": "#888", "INFO": "#4B8DFF", "WARNING": "#FFA500", "ERROR": "#FF4B4B"}
+    levels = list(color_map)
+    logs = [
+        {"timestamp": datetime.now(), "level": levels[i % 4], "device": f"mb{i % 7}",
+         "message": f"Benchmark log entry {i}"}
+        for i in range(rows)
+    ]
+    with st.container(height=500, border=True):
+        for log in logs:
+            color = color_map.get(log['level'], "#888")
+            cols = st.columns([1, 2, 3, 2])
+            with cols[0]:
+                st.markdown(f"<span style='color:{color}; font-weight:bold;'>{log['level']}</span>",
+                            unsafe_allow_html=True)
+            with cols[1]:
+                st.text(log['device'])
+            with cols[2]:
+                st.text(log['message'][:80] + "..." if len(log['message']) > 80 else log['message'])
+            with cols[3]:
+                st.caption(log['timestamp'].strftime("%H:%M:%S"))
+
+
+def grid_viewer_app():
+    """Tampilan baru: satu st.dataframe berwarna per level"""
+    import sys
+    import streamlit as st
+    from datetime import datetime
+
+    sys.path.insert(0, st.session_state.bench_root)
+    from jmailbox.logs import log_frame, style_log_frame
+
+    rows = st.session_state.bench_rows
+    levels = ["DEBUG", "INFO", "WARNING", "ERROR"]
+    logs = [
+        {"timestamp": datetime.now(), "level": levels[i % 4], "device": f"mb{i % 7}",
+         "message": f"Benchmark log entry {i}"}
+        for i in range(rows)
+    ]
+    st.dataframe(style_log_frame(log_frame(logs)), height=500, hide_index=True)
+
+
+def time_rerun(app, rows, repeat):
+    """Median waktu rerun (ms) untuk satu aplikasi dengan jumlah baris tertentu"""
+    at = AppTest.from_function(app, default_timeout=120)
+    at.session_state.bench_rows = rows
+    at.session_state.bench_root = ROOT
+    at.run()  # pemanasan
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        at.run()
+        timings.append((time.perf_counter() - started) * 1000)
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return statistics.median(timings)
+
+
+def main():
+    """Cetak tabel waktu rerun terhadap jumlah baris"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 100, 500, 2000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'legacy (ms)':>14} {'grid (ms)':>12} {'speedup':>9}")
+    for rows in args.rows:
+        legacy = time_rerun(legacy_viewer_app, rows, args.repeat)
+        grid = time_rerun(grid_viewer_app, rows, args.repeat)
+        print(f"{rows:>8} {legacy:>14.1f} {grid:>12.1f} {legacy / grid:>8.1f}x")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Kasus bench_hot_paths.py sebagai suite pytest-benchmark.
+
+Skala dipilih lewat JMAILBOX_BENCH_SCALES (default 1000). Jalankan dari root repo:
+
+    pip install -r requirements-dev.txt
+    JMAILBOX_BENCH_SCALES=1000,100000,1000000 pytest benchmarks/test_hot_paths.py --benchmark-autosave
+    pytest benchmarks/test_hot_paths.py --benchmark-compare --benchmark-compare-fail=median:25%
+
+Tidak termasuk testpaths bawaan: `pytest` saja hanya menjalankan tests/.
+Tanpa pytest-benchmark seluruh modul dilewati.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from bench_hot_paths import CASES
+
+SCALES = [int(scale) for scale in os.environ.get("JMAILBOX_BENCH_SCALES", "1000").split(",")]
+
+
+@pytest.mark.parametrize("scale", SCALES)
+@pytest.mark.parametrize("name", list(CASES))
+def test_hot_path(benchmark, name, scale):
+    case = CASES[name]
+    benchmark.group = name
+    benchmark.extra_info['records'] = scale
+    if case.fresh:
+        # Setup diulang per putaran dan tidak ikut diukur
+        benchmark.pedantic(lambda run: run(), setup=lambda: ((case.setup(scale),), {}), rounds=3)
+    else:
+        benchmark(case.setup(scale))
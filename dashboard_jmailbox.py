@@ -1,13 +1,29 @@
 import streamlit as st
-import paho.mqtt.client as mqtt
+import functools
 import json
+import os
 import time
+import uuid
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import threading
-import queue
-import sys
+
+from jmailbox.alerts import severity_level
+from jmailbox.archive import SnapshotArchive
+from jmailbox.camera import thumbnail
+from jmailbox.export import FORMATS as EXPORT_FORMATS, export_file, export_filename, http_export
+from jmailbox.export import formats as export_formats
+from jmailbox.fleet import FleetDispatcher
+from jmailbox.history import HistoryStore
+from jmailbox.ingest import IngestService
+from jmailbox.logs import log_frame, style_log_frame
+from jmailbox.metrics import MetricsServer, deep_sizeof
+from jmailbox.payloads import backends as payload_backends
+from jmailbox.payments import day_of
+from jmailbox.series import MinMaxDecimator, decimate_minmax, from_epoch_ms, now_ms, to_epoch_ms
+from jmailbox.shard import parse_brokers
+from jmailbox.simulator import MAX_SPEED, MIN_SPEED, FleetSimulator, LoadRunner, ServiceSink, read_recording
+from jmailbox.store import DashboardStore
 
 # ==================== KONFIGURASI HALAMAN ====================
 st.set_page_config(
@@ -18,210 +34,337 @@ st.set_page_config(
 )
 
 # ==================== KONFIGURASI MQTT ====================
-MQTT_BROKER = "broker.hivemq.com"
-MQTT_PORT = 1883
+# Broker bisa diganti lewat environment, mis. broker lokal untuk uji beban dengan simulator
+MQTT_BROKER = os.environ.get("JMAILBOX_MQTT_BROKER", "broker.hivemq.com")
+MQTT_PORT = int(os.environ.get("JMAILBOX_MQTT_PORT", "1883"))
+# Broker tambahan (mis. per region) "host:port,host2:port"; ingest dari semua broker lewat worker shard
+MQTT_EXTRA_BROKERS = parse_brokers(os.environ.get("JMAILBOX_MQTT_EXTRA_BROKERS", ""))
 MQTT_TOPICS = [
     "jmailbox/+/status",      # Status perangkat
     "jmailbox/+/sensor",      # Data sensor
     "jmailbox/+/alert",       # Alert keamanan
     "jmailbox/+/log",         # Log sistem
-    "jmailbox/+/camera",      # Perintah kamera
+    "jmailbox/+/camera",      # Frame JPEG dan perintah kamera
     "jmailbox/+/payment",     # Status pembayaran
 ]
 
-# ==================== INISIALISASI STATE ====================
-if 'mqtt_client' not in st.session_state:
-    st.session_state.mqtt_client = None
-    st.session_state.mqtt_connected = False
+# ==================== KONFIGURASI INGEST ====================
+INGEST_BUFFER_SIZE = 10000          # Kapasitas maksimum buffer pesan
+INGEST_DROP_POLICY = "drop_oldest"  # "drop_oldest" atau "drop_newest" saat buffer penuh
+INGEST_COALESCE_CHANNELS = ("status",)  # Hanya simpan pesan terbaru per device
+DRAIN_MAX_MESSAGES = 2000           # Budget pesan per drain
+DRAIN_MAX_MS = 50                   # Budget waktu per drain (ms)
+DRAIN_INTERVAL_MS = 100             # Jeda antar drain di event loop ingest
+MQTT_RECONNECT_MIN_S = 1            # Jeda reconnect pertama; berlipat dua tiap kegagalan
+MQTT_RECONNECT_MAX_S = 60           # Batas atas jeda reconnect
+# Proses worker decode; 0 = decode di event loop ingest (minimal 1 jika ada broker tambahan)
+INGEST_SHARDS = int(os.environ.get("JMAILBOX_INGEST_SHARDS", "0"))
+INGEST_SHARD_MODE = os.environ.get("JMAILBOX_INGEST_SHARD_MODE", "share")  # "share" ($share) atau "hash" (broker tanpa $share)
+MQTT_SHARE_GROUP = os.environ.get("JMAILBOX_MQTT_SHARE_GROUP")  # Grup $share; kosong = unik per proses dashboard
+SENSOR_RETENTION = 20000            # Jumlah sampel per metrik sensor yang disimpan
+CHART_MAX_POINTS = 1500             # Batas titik per garis (kira-kira lebar grafik dalam piksel)
+CHART_CACHE_SIZE = 16               # Jumlah figure grafik yang disimpan per sesi
+LOG_CAPACITY = 200000               # Jumlah log di memori (log lebih lama dibaca dari riwayat)
+PACKAGE_CAPACITY = 10000            # Jumlah paket di memori (paket selesai dibuang lebih dulu)
+CAMERA_FRAMES = 8                   # Jumlah frame terbaru yang disimpan per kamera
+CAMERA_MAX_FPS = 5                  # Batas frame rate tampilan Camera Feed
+COMMAND_TIMEOUT_S = 5               # Batas waktu menunggu balasan perintah sebelum dikirim ulang
+COMMAND_RETRIES = 2                 # Jumlah kirim ulang sebelum perintah dianggap timeout
+ALERT_DEDUP_S = 60                  # Alert sama (device, reason, severity) dalam jendela ini digabung
+ALERT_RATE = 5                      # Batas alert baru per device (per detik) saat badai alert; 0 = tanpa batas
+ALERT_BURST = 20                    # Jumlah alert baru per device yang boleh masuk sekaligus
+FLEET_RATE = 20                     # Batas laju perintah massal (perintah per detik)
+FLEET_BURST = 20                    # Jumlah perintah massal yang boleh dikirim sekaligus
+FLEET_COMMANDS = ["system_status", "reboot", "configure", "open_door", "close_door", "capture"]
 
-if 'devices' not in st.session_state:
-    st.session_state.devices = {}
+# ==================== KONFIGURASI METRIK ====================
+METRICS_HOST = "127.0.0.1"          # Endpoint Prometheus hanya bisa diakses dari mesin ini
+METRICS_PORT = int(os.environ.get("JMAILBOX_METRICS_PORT", "9108"))  # 0 = endpoint dimatikan
+SESSION_MEMORY_INTERVAL_S = 30      # Jeda minimum antar pengukuran ukuran session_state per sesi
 
-if 'system_logs' not in st.session_state:
-    st.session_state.system_logs = []
+# ==================== KONFIGURASI EKSPOR ====================
+# Endpoint streaming GET /export tanpa autentikasi; bind ke 0.0.0.0 hanya di jaringan tepercaya
+EXPORT_HOST = os.environ.get("JMAILBOX_EXPORT_HOST", "127.0.0.1")
+EXPORT_PORT = int(os.environ.get("JMAILBOX_EXPORT_PORT", "9109"))  # 0 = endpoint dimatikan
+EXPORT_PUBLIC_URL = os.environ.get("JMAILBOX_EXPORT_URL")  # Alamat yang dibuka browser, mis. http://gateway.lan:9109
+EXPORT_DOWNLOAD_MAX_ROWS = 200000   # Batas baris tombol Download (file ditampung di memori Streamlit)
 
-if 'security_alerts' not in st.session_state:
-    st.session_state.security_alerts = []
+# ==================== KONFIGURASI REFRESH ====================
+# Interval default (detik) tiap widget live; masing-masing berjalan sebagai fragment sendiri
+REFRESH_INTERVALS = {
+    "metrics": 2,       # Kartu metrik Overview
+    "charts": 5,        # Grafik sensor Overview
+    "package": 3,       # Status paket di Delivery Control
+    "alerts": 5,        # Daftar alert
+    "ingest": 2,        # Statistik buffer ingest di sidebar
+    "camera": 1 / CAMERA_MAX_FPS,   # Camera Feed, tidak boleh lebih cepat dari CAMERA_MAX_FPS
+    "fleet": 1,         # Progres perintah massal
+    "load": 1,          # Progres load generator / replay
+    "performance": 2,   # Panel Performance
+}
+REFRESH_MIN_INTERVAL = 1.0          # Batas bawah slider interval widget selain kamera
+REFRESH_MAX_INTERVAL = 60.0
 
-if 'sensor_data' not in st.session_state:
-    st.session_state.sensor_data = {
-        'distance': [],
-        'timestamp': [],
-        'wifi_rssi': []
-    }
+# ==================== KONFIGURASI RIWAYAT ====================
+HISTORY_DB_PATH = "jmailbox_history.db"  # Database SQLite riwayat
+HISTORY_RAW_RETENTION_DAYS = 2      # Masa simpan sampel mentah (rollup 1 jam disimpan permanen)
+HISTORY_ROLLUP_1M_RETENTION_DAYS = 30
+HISTORY_LOG_RETENTION_DAYS = 30     # Masa simpan log di database (None = permanen)
+HISTORY_ALERT_RETENTION_DAYS = 90   # Masa simpan alert
+HISTORY_LEDGER_RETENTION_DAYS = 365 # Masa simpan paket (sejak update terakhir) dan pembayaran
+ARCHIVE_DIR = "jmailbox_archive"    # Arsip foto capture (content-addressed)
+ARCHIVE_MAX_MB = 512                # Batas total ukuran arsip; foto terlama dihapus lebih dulu
+ARCHIVE_THUMBNAIL_CACHE = 500       # Jumlah thumbnail yang disimpan di memori
+ARCHIVE_PAGE_SIZE = 24              # Jumlah foto per halaman galeri
+PACKAGE_PAGE_SIZE = 50              # Jumlah paket per halaman ledger
+CHART_RANGES = {
+    "Live": None,
+    "Last hour": timedelta(hours=1),
+    "Last 24 hours": timedelta(hours=24),
+    "Last 7 days": timedelta(days=7),
+}
+LOG_RANGES = {
+    "All time": None,
+    "Last hour": timedelta(hours=1),
+    "Last 24 hours": timedelta(hours=24),
+    "Last 7 days": timedelta(days=7),
+}
+# Dataset riwayat yang bisa diekspor (jmailbox.history.EXPORTS) -> label
+EXPORT_DATASETS = {
+    'logs': "System logs",
+    'alerts': "Security alerts",
+    'samples': "Sensor samples (raw)",
+    'samples_1m': "Sensor series (1-minute rollup)",
+    'samples_1h': "Sensor series (1-hour rollup)",
+    'deliveries': "Deliveries",
+}
 
-if 'current_package' not in st.session_state:
-    st.session_state.current_package = {
-        'resi': None,
-        'status': 'No active delivery',
-        'timestamp': None,
-        'is_cod': False,
-        'amount': 0
-    }
+# ==================== LAYANAN INGEST BERSAMA ====================
+@st.cache_resource
+def get_ingest_service():
+    """Satu layanan ingest MQTT untuk seluruh proses, dipakai bersama semua sesi"""
+    history = HistoryStore(
+        HISTORY_DB_PATH,
+        raw_retention_days=HISTORY_RAW_RETENTION_DAYS,
+        rollup_1m_retention_days=HISTORY_ROLLUP_1M_RETENTION_DAYS,
+        log_retention_days=HISTORY_LOG_RETENTION_DAYS,
+        alert_retention_days=HISTORY_ALERT_RETENTION_DAYS,
+        ledger_retention_days=HISTORY_LEDGER_RETENTION_DAYS
+    )
+    store = DashboardStore(
+        sensor_retention=SENSOR_RETENTION,
+        history=history,
+        log_capacity=LOG_CAPACITY,
+        camera_frames=CAMERA_FRAMES,
+        archive=SnapshotArchive(
+            ARCHIVE_DIR,
+            max_bytes=ARCHIVE_MAX_MB * 1024 * 1024,
+            thumbnail_cache_size=ARCHIVE_THUMBNAIL_CACHE
+        ),
+        command_timeout_ms=COMMAND_TIMEOUT_S * 1000,
+        command_retries=COMMAND_RETRIES,
+        alert_dedup_ms=ALERT_DEDUP_S * 1000,
+        alert_rate=ALERT_RATE,
+        alert_burst=ALERT_BURST,
+        ledger_retention_days=HISTORY_LEDGER_RETENTION_DAYS,
+        package_capacity=PACKAGE_CAPACITY
+    )
+    store.load_history()
+    return IngestService(
+        MQTT_BROKER, MQTT_PORT, MQTT_TOPICS,
+        store=store,
+        buffer_size=INGEST_BUFFER_SIZE,
+        drop_policy=INGEST_DROP_POLICY,
+        coalesce_channels=INGEST_COALESCE_CHANNELS,
+        drain_max_messages=DRAIN_MAX_MESSAGES,
+        drain_max_ms=DRAIN_MAX_MS,
+        drain_interval_ms=DRAIN_INTERVAL_MS,
+        reconnect_min_s=MQTT_RECONNECT_MIN_S,
+        reconnect_max_s=MQTT_RECONNECT_MAX_S,
+        brokers=MQTT_EXTRA_BROKERS,
+        shards=INGEST_SHARDS,
+        shard_mode=INGEST_SHARD_MODE,
+        share_group=MQTT_SHARE_GROUP
+    )
 
-# Queue untuk komunikasi antar-thread
-message_queue = queue.Queue()
+ingest_service = get_ingest_service()
 
-# ==================== FUNGSI MQTT ====================
-def on_connect(client, userdata, flags, rc):
-    """Callback ketika terkoneksi ke broker MQTT"""
-    if rc == 0:
-        st.session_state.mqtt_connected = True
-        # Subscribe ke semua topik
-        for topic in MQTT_TOPICS:
-            client.subscribe(topic, qos=1)
-        message_queue.put(("INFO", "Connected to MQTT Broker"))
-    else:
-        message_queue.put(("ERROR", f"Connection failed with code {rc}"))
+@st.cache_resource
+def get_fleet_dispatcher():
+    """Pengirim perintah massal bersama; batas laju berlaku untuk semua sesi"""
+    return FleetDispatcher(ingest_service, rate=FLEET_RATE, burst=FLEET_BURST)
+
+fleet_dispatcher = get_fleet_dispatcher()
+
+@st.cache_resource
+def get_load_runner():
+    """Load generator in-process bersama (satu simulasi/replay sekaligus per proses)"""
+    return LoadRunner()
+
+def new_load_sandbox():
+    """Layanan ingest terpisah untuk satu run load generator
+
+    Store di memori saja, tanpa riwayat SQLite dan arsip foto, dan tidak pernah
+    terhubung ke broker: lalu lintas sintetis tidak masuk ke store bersama,
+    ledger paket/pembayaran, riwayat maupun arsip yang dilihat operator.
+    """
+    store = DashboardStore(
+        sensor_retention=SENSOR_RETENTION,
+        log_capacity=LOG_CAPACITY,
+        camera_frames=CAMERA_FRAMES,
+        alert_dedup_ms=ALERT_DEDUP_S * 1000,
+        alert_rate=ALERT_RATE,
+        alert_burst=ALERT_BURST
+    )
+    return IngestService(
+        MQTT_BROKER, MQTT_PORT, MQTT_TOPICS,
+        store=store,
+        buffer_size=INGEST_BUFFER_SIZE,
+        drop_policy=INGEST_DROP_POLICY,
+        coalesce_channels=INGEST_COALESCE_CHANNELS,
+        drain_max_messages=DRAIN_MAX_MESSAGES,
+        drain_max_ms=DRAIN_MAX_MS
+    )
 
-def on_message(client, userdata, msg):
-    """Callback ketika menerima pesan MQTT"""
+@st.cache_resource
+def get_metrics_server():
+    """Endpoint Prometheus lokal bersama; None jika dimatikan atau port sudah dipakai"""
+    if not METRICS_PORT:
+        return None
     try:
-        payload = msg.payload.decode()
-        data = json.loads(payload)
-        topic = msg.topic
-        
-        # Masukkan pesan ke queue untuk diproses di thread utama
-        message_queue.put(("DATA", {
-            "topic": topic,
-            "data": data,
-            "timestamp": datetime.now()
-        }))
-    except Exception as e:
-        message_queue.put(("ERROR", f"Error processing MQTT message: {str(e)}"))
+        return MetricsServer(ingest_service.metrics, METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        ingest_service.store.add_log("ERROR", f"Metrics endpoint unavailable on port {METRICS_PORT}: {str(e)}")
+        return None
+
+@st.cache_resource
+def get_export_server():
+    """Endpoint ekspor streaming bersama; None jika dimatikan, tanpa riwayat atau port sudah dipakai"""
+    history = ingest_service.store.history
+    if not EXPORT_PORT or history is None:
+        return None
+    try:
+        routes = {'/export': functools.partial(http_export, history)}
+        return MetricsServer(None, EXPORT_HOST, EXPORT_PORT, routes=routes,
+                             public_url=EXPORT_PUBLIC_URL).start()
+    except OSError as e:
+        ingest_service.store.add_log("ERROR", f"Export endpoint unavailable on {EXPORT_HOST}:{EXPORT_PORT}: {str(e)}")
+        return None
+
+metrics_server = get_metrics_server()
+export_server = get_export_server()
+render_seconds = ingest_service.metrics.histogram(
+    'jmailbox_render_seconds', "Render time per dashboard tab and live fragment", ('view',))
+session_memory = ingest_service.metrics.gauge(
+    'jmailbox_session_memory_bytes', "Estimated session_state size per dashboard session", ('session',))
 
+# ==================== FUNGSI MQTT ====================
 def process_mqtt_messages():
-    """Proses pesan dari queue MQTT"""
-    while not message_queue.empty():
-        msg_type, content = message_queue.get_nowait()
-        
-        if msg_type == "INFO" or msg_type == "ERROR":
-            # Tambahkan ke log
-            st.session_state.system_logs.append({
-                "timestamp": datetime.now(),
-                "level": msg_type,
-                "message": content,
-                "device": "Dashboard"
-            })
-            
-        elif msg_type == "DATA":
-            topic = content["topic"]
-            data = content["data"]
-            timestamp = content["timestamp"]
-            
-            # Ekstrak device ID dari topic
-            parts = topic.split('/')
-            if len(parts) >= 2:
-                device_id = parts[1]
-                
-                # Update device info
-                if device_id not in st.session_state.devices:
-                    st.session_state.devices[device_id] = {
-                        'id': device_id,
-                        'type': 'ESP32-CAM' if 'cam' in device_id else 'ESP32',
-                        'last_seen': timestamp,
-                        'status': {}
-                    }
-                
-                st.session_state.devices[device_id]['last_seen'] = timestamp
-                st.session_state.devices[device_id]['status'].update(data)
-                
-                # Proses berdasarkan tipe data
-                if 'sensor' in topic:
-                    # Simpan data sensor
-                    if 'distance' in data:
-                        st.session_state.sensor_data['distance'].append({
-                            'value': data['distance'],
-                            'timestamp': timestamp
-                        })
-                    if 'wifi_rssi' in data:
-                        st.session_state.sensor_data['wifi_rssi'].append({
-                            'value': data['wifi_rssi'],
-                            'timestamp': timestamp
-                        })
-                    
-                    # Simpan hanya 100 data terbaru
-                    for key in st.session_state.sensor_data:
-                        if len(st.session_state.sensor_data[key]) > 100:
-                            st.session_state.sensor_data[key] = st.session_state.sensor_data[key][-100:]
-                
-                elif 'alert' in topic:
-                    # Tambahkan alert keamanan
-                    st.session_state.security_alerts.append({
-                        "timestamp": timestamp,
-                        "device": device_id,
-                        "reason": data.get('reason', 'Unknown'),
-                        "severity": data.get('severity', 1),
-                        "message": data.get('message', '')
-                    })
-                
-                elif 'log' in topic:
-                    # Tambahkan log sistem
-                    st.session_state.system_logs.append({
-                        "timestamp": timestamp,
-                        "level": data.get('level', 'INFO'),
-                        "message": data.get('message', ''),
-                        "device": device_id
-                    })
-                
-                elif 'status' in topic:
-                    # Update status paket jika ada
-                    if 'resi' in data and data['resi']:
-                        st.session_state.current_package['resi'] = data['resi']
-                        st.session_state.current_package['status'] = data.get('status', 'In Progress')
-                        st.session_state.current_package['timestamp'] = timestamp
-                        st.session_state.current_package['is_cod'] = data.get('is_cod', False)
-                        st.session_state.current_package['amount'] = data.get('amount', 0)
-
-def init_mqtt():
-    """Inisialisasi koneksi MQTT"""
-    if st.session_state.mqtt_client is None or not st.session_state.mqtt_connected:
+    """Perbarui snapshot sesi ini dari store bersama
+
+    Pesan dipindahkan ke store oleh event loop ingest; script hanya drain sendiri
+    jika event loop tidak berjalan. Hanya domain yang berubah sejak snapshot
+    terakhir yang disalin ulang.
+    """
+    if not ingest_service.running:
+        ingest_service.drain()
+    
+    previous = st.session_state.get('snapshot')
+    if previous is not None and previous['version'] == ingest_service.store.version:
+        return previous
+    snapshot = ingest_service.store.snapshot(previous)
+    st.session_state.snapshot = snapshot
+    st.session_state.devices = snapshot['devices']
+    st.session_state.device_index = snapshot['device_index']
+    st.session_state.sensor_metrics = snapshot['sensor_metrics']
+    st.session_state.current_package = snapshot['current_package']
+    return snapshot
+
+def alert_summary(snapshot):
+    """Ringkasan alert dari penghitung store, dihitung ulang hanya jika ada alert baru atau menit berganti"""
+    alert_key = (snapshot['versions']['alerts'], int(time.time() // 60))
+    if st.session_state.get('alert_summary_key') != alert_key:
+        st.session_state.alert_summary_key = alert_key
+        st.session_state.alert_summary = ingest_service.store.alert_summary()
+    return st.session_state.alert_summary
+
+def devices_with(capability):
+    """Device dengan kemampuan tertentu (delivery, payment, camera, ...) dari indeks registry"""
+    return st.session_state.device_index['capability'].get(capability, [])
+
+def live_fragment(name, func, *args):
+    """Jalankan func sebagai fragment yang me-refresh dirinya sendiri sesuai interval widget"""
+    intervals = st.session_state.setdefault('refresh_intervals', dict(REFRESH_INTERVALS))
+    run_every = intervals[name] if st.session_state.get('auto_refresh', True) else None
+    st.fragment(timed(func), run_every=run_every)(*args)
+
+def timed(func):
+    """Bungkus fungsi render agar durasinya tercatat di histogram render per view
+
+    functools.wraps mempertahankan nama fungsi, yang juga dipakai st.fragment
+    untuk mengenali fragment antar rerun.
+    """
+    @functools.wraps(func)
+    def wrapper(*args):
+        started = time.perf_counter()
         try:
-            client = mqtt.Client(client_id=f"dashboard_{int(time.time())}")
-            client.on_connect = on_connect
-            client.on_message = on_message
-            
-            client.connect(MQTT_BROKER, MQTT_PORT, 60)
-            client.loop_start()
-            
-            st.session_state.mqtt_client = client
-            time.sleep(1)  # Beri waktu untuk koneksi
-            return True
-        except Exception as e:
-            st.error(f"Failed to connect to MQTT: {str(e)}")
-            return False
-    return True
+            return func(*args)
+        finally:
+            render_seconds.labels(func.__name__).observe(time.perf_counter() - started)
+    return wrapper
+
+def record_session_memory():
+    """Perkirakan ukuran session_state sesi ini, paling sering sekali tiap SESSION_MEMORY_INTERVAL_S"""
+    now = time.monotonic()
+    if now - st.session_state.get('memory_measured_at', -SESSION_MEMORY_INTERVAL_S) < SESSION_MEMORY_INTERVAL_S:
+        return
+    st.session_state.memory_measured_at = now
+    session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex[:8])
+    session_memory.labels(session_id).set(deep_sizeof(st.session_state.to_dict()))
+    # Sesi yang tidak lagi diukur dianggap sudah ditutup
+    session_memory.prune(SESSION_MEMORY_INTERVAL_S * 10)
+
+def init_mqtt(force=False):
+    """Jalankan event loop ingest bersama; force melewati jeda backoff reconnect"""
+    try:
+        if force:
+            return ingest_service.reconnect_now()
+        return ingest_service.start()
+    except Exception as e:
+        st.error(f"Failed to start MQTT ingest: {str(e)}")
+        return False
+
+def connection_caption():
+    """Status koneksi broker, jadwal reconnect berikutnya dan koneksi worker shard"""
+    shards = ingest_service.shard_stats()
+    if shards:
+        links = sum(sum(row['connected']) for row in shards)
+        expected = len(shards) * len(ingest_service.brokers)
+        suffix = f" · {links}/{expected} shard connections"
+    else:
+        suffix = ""
+    if ingest_service.connected:
+        return "🟢 Connected to broker" + suffix
+    stats = ingest_service.connection_stats
+    text = "🔴 Disconnected"
+    if stats['retry_at']:
+        text += f" · retry in {max(0, stats['retry_at'] - time.time()):.0f}s"
+    if stats['last_error']:
+        text += f" · {stats['last_error']}"
+    return text + suffix
 
 def send_command(device_id, command, data=None):
     """Kirim perintah ke device via MQTT"""
-    if st.session_state.mqtt_client and st.session_state.mqtt_connected:
-        topic = f"jmailbox/{device_id}/command"
-        payload = {
-            "command": command,
-            "timestamp": int(time.time() * 1000),
-            "source": "dashboard"
-        }
-        if data:
-            payload.update(data)
-        
+    if ingest_service.connected:
         try:
-            st.session_state.mqtt_client.publish(topic, json.dumps(payload), qos=1)
+            # Balasan device dicocokkan lewat correlation ID (cmd_id) di topik status/log
+            command_id = ingest_service.send_command(device_id, command, data)
             
             # Log perintah yang dikirim
-            st.session_state.system_logs.append({
-                "timestamp": datetime.now(),
-                "level": "INFO",
-                "message": f"Sent command '{command}' to {device_id}",
-                "device": "Dashboard"
-            })
+            ingest_service.store.add_log("INFO", f"Sent command '{command}' to {device_id} (id {command_id})")
             return True
         except Exception as e:
-            st.session_state.system_logs.append({
-                "timestamp": datetime.now(),
-                "level": "ERROR",
-                "message": f"Failed to send command: {str(e)}",
-                "device": "Dashboard"
-            })
+            ingest_service.store.add_log("ERROR", f"Failed to send command: {str(e)}")
             return False
     return False
 
@@ -236,7 +379,7 @@ def render_sidebar():
         col1, col2 = st.columns(2)
         with col1:
             if st.button("🔗 Connect", use_container_width=True):
-                if init_mqtt():
+                if init_mqtt(force=True):
                     st.success("Connected!")
                 else:
                     st.error("Connection failed")
@@ -252,10 +395,15 @@ def render_sidebar():
             st.info("No devices connected")
             selected_device = None
         else:
+            # Label diambil saat render: tipe device bisa berubah sebelum rerun berikutnya,
+            # dan label pilihan lama harus tetap sama dengan opsi yang sudah ditampilkan
+            labels = {device_id: f"{device_id} ({st.session_state.devices[device_id]['type']})"
+                      for device_id in device_list}
             selected_device = st.selectbox(
                 "Select Device",
                 options=device_list,
-                format_func=lambda x: f"{x} ({st.session_state.devices[x]['type']})"
+                format_func=lambda x: labels.get(x, x),
+                key="sidebar_device"
             )
         
         st.markdown("---")
@@ -280,31 +428,157 @@ def render_sidebar():
                     send_command(selected_device, "close_door")
         
         st.markdown("---")
-        st.markdown("#### Dashboard v1.0")
-        st.caption(f"Last update: {datetime.now().strftime('%H:%M:%S')}")
+        st.markdown("### 📥 Ingest Buffer")
+        live_fragment("ingest", render_ingest_stats)
+
+def render_ingest_stats():
+    """Metrik backpressure buffer ingest (fragment sidebar)"""
+    process_mqtt_messages()
+    record_session_memory()
+    stats = ingest_service.buffer_stats()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Queue Depth", f"{stats['depth']:,}",
+                 help=f"Capacity {stats['capacity']:,}, peak {stats['high_watermark']:,}")
+        st.metric("Dropped", f"{stats['dropped']:,}",
+                 help=f"Policy: {stats['policy']}")
+    with col2:
+        st.metric("Drain Time", f"{stats['last_ms']:.1f} ms",
+                 help=f"{stats['last_count']:,} messages in last drain, max {stats['max_ms']:.1f} ms")
+        st.metric("Coalesced", f"{stats['coalesced']:,}")
+    invalid = sum(row['failures'] for row in ingest_service.decode_stats())
+    st.caption(f"Queue lag: {stats['last_lag_ms']:.0f} ms · Invalid payloads: {invalid:,}")
+    st.caption(connection_caption())
+    
+    st.markdown("---")
+    st.markdown("#### Dashboard v1.0")
+    st.caption(f"Last update: {datetime.now().strftime('%H:%M:%S')}")
+
+LIVENESS_LABELS = {"online": "🟢 Online", "idle": "🟡 Idle", "offline": "🔴 Offline"}
+
+ALL_DEVICES = "All devices (min/mean/max)"
+
+def new_sensor_figure(yaxis_title, color, band):
+    """Figure kosong untuk satu metrik: satu garis, atau pita min/max dengan garis rata-rata"""
+    fig = go.Figure()
+    if band:
+        fig.add_trace(go.Scatter(
+            mode='lines', line=dict(width=0), name='Max', showlegend=False
+        ))
+        fig.add_trace(go.Scatter(
+            mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(128,128,128,0.2)',
+            name='Min', showlegend=False
+        ))
+        fig.add_trace(go.Scatter(
+            mode='lines', name=f'Mean {yaxis_title}', line=dict(color=color)
+        ))
+    else:
+        fig.add_trace(go.Scatter(mode='lines', name=yaxis_title, line=dict(color=color)))
+    
+    fig.update_layout(
+        height=300,
+        xaxis_title="Time",
+        yaxis_title=yaxis_title,
+        template="plotly_white"
+    )
+    return fig
+
+def update_sensor_figure(entry, metric, device, chart_range):
+    """Isi ulang trace figure dari data terbaru; False jika belum ada data"""
+    fig = entry['figure']
+    store = ingest_service.store
+    
+    if chart_range is None and device != ALL_DEVICES:
+        # Live satu device: hanya sampel baru yang masuk ke decimator
+        if store.update_decimator(device, metric, entry['decimator']) is None:
+            return False
+        x, y = entry['decimator'].points()
+        fig.data[0].update(x=x, y=y, mode='lines+markers' if len(y) <= 500 else 'lines')
+        return True
+    
+    if chart_range is not None:
+        end = now_ms()
+        agg = store.history.query_series(
+            metric,
+            device_id=None if device == ALL_DEVICES else device,
+            start_ms=end - int(chart_range.total_seconds() * 1000),
+            end_ms=end
+        )
+    else:
+        agg = store.sensor_aggregate(metric)
+    if agg is None:
+        return False
+    
+    for trace, column in zip(fig.data, ('max', 'min', 'mean')):
+        x, y = decimate_minmax(agg['timestamp'], agg[column], CHART_MAX_POINTS)
+        trace.update(x=x, y=y)
+    return True
+
+def render_sensor_chart(metric, device, yaxis_title, color, chart_range=None):
+    """Grafik satu metrik sensor untuk satu device atau agregat seluruh device
+
+    Mode live membaca ring buffer in-memory; rentang waktu lain dibaca dari
+    riwayat SQLite (rollup untuk rentang panjang). Figure disimpan per sesi
+    dan hanya diperbarui jika ada sampel baru sejak render terakhir.
+    """
+    cache = st.session_state.setdefault('chart_cache', {})
+    key = (metric, device, chart_range)
+    entry = cache.get(key)
+    if entry is None:
+        if len(cache) >= CHART_CACHE_SIZE:
+            del cache[next(iter(cache))]
+        band = chart_range is not None or device == ALL_DEVICES
+        entry = cache[key] = {
+            'figure': new_sensor_figure(yaxis_title, color, band),
+            'decimator': MinMaxDecimator(CHART_MAX_POINTS),
+            'version': None,
+            'has_data': False
+        }
+    
+    version = ingest_service.store.sensor_version(metric)
+    if chart_range is not None:
+        # Jendela waktu ikut bergeser, segarkan paling lambat tiap menit
+        version = (version, now_ms() // 60000)
+    if version != entry['version']:
+        entry['has_data'] = update_sensor_figure(entry, metric, device, chart_range)
+        entry['version'] = version
+    
+    if not entry['has_data']:
+        st.caption(f"No {metric} data" + ("" if device == ALL_DEVICES else f" from {device}"))
+        return
+    st.plotly_chart(entry['figure'], use_container_width=True)
 
 def render_overview_tab():
     """Tab Overview - Ringkasan sistem"""
     st.header("📊 System Overview")
+    live_fragment("metrics", render_overview_metrics)
+    st.markdown("---")
+    live_fragment("charts", render_overview_charts)
+
+def render_overview_metrics():
+    """Kartu metrik Overview (fragment)"""
+    snapshot = process_mqtt_messages()
+    alerts = alert_summary(snapshot)
     
     # Metrics cards
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         device_count = len(st.session_state.devices)
+        online_count = len(st.session_state.device_index['liveness']['online'])
         st.metric("Connected Devices", device_count, 
-                 delta=None if device_count == 0 else f"{device_count} online")
+                 delta=None if device_count == 0 else f"{online_count} online")
     
     with col2:
-        active_alerts = len([a for a in st.session_state.security_alerts 
-                           if a['timestamp'] > datetime.now() - timedelta(hours=24)])
+        active_alerts = alerts['count_24h']
         st.metric("24h Alerts", active_alerts, 
                  delta_color="inverse" if active_alerts > 0 else "off")
     
     with col3:
-        if st.session_state.sensor_data['distance']:
-            last_dist = st.session_state.sensor_data['distance'][-1]['value']
-            st.metric("Distance", f"{last_dist} cm")
+        latest_distance = ingest_service.store.sensor_latest('distance')
+        if latest_distance:
+            device_id, _, value = latest_distance
+            st.metric("Distance", f"{value:g} cm", help=f"Latest reading from {device_id}")
         else:
             st.metric("Distance", "N/A")
     
@@ -314,52 +588,42 @@ def render_overview_tab():
             st.metric("Delivery Status", status)
         else:
             st.metric("Delivery Status", "Idle")
+
+def render_overview_charts():
+    """Grafik sensor Overview (fragment); figure di-cache per versi sensor"""
+    process_mqtt_messages()
     
-    st.markdown("---")
-    
-    # Grafik sensor data
-    if st.session_state.sensor_data['distance']:
+    # Grafik sensor data per device atau agregat seluruh device
+    sensor_metrics = st.session_state.sensor_metrics
+    if sensor_metrics:
+        sensor_devices = sorted(set().union(*sensor_metrics.values()))
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            selected = st.selectbox(
+                "Sensor Source",
+                options=[ALL_DEVICES] + sensor_devices,
+                key="overview_sensor_device"
+            )
+        with col2:
+            range_name = st.selectbox("Time Range", list(CHART_RANGES), key="overview_range")
+        chart_range = CHART_RANGES[range_name]
+        
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("📈 Distance Sensor")
-            df_distance = pd.DataFrame(st.session_state.sensor_data['distance'])
-            if not df_distance.empty:
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df_distance['timestamp'],
-                    y=df_distance['value'],
-                    mode='lines+markers',
-                    name='Distance (cm)',
-                    line=dict(color='#FF4B4B')
-                ))
-                fig.update_layout(
-                    height=300,
-                    xaxis_title="Time",
-                    yaxis_title="Distance (cm)",
-                    template="plotly_white"
-                )
-                st.plotly_chart(fig, use_container_width=True)
+            render_sensor_chart('distance', selected, "Distance (cm)", '#FF4B4B', chart_range)
         
         with col2:
             st.subheader("📶 WiFi Signal")
-            df_rssi = pd.DataFrame(st.session_state.sensor_data['wifi_rssi'])
-            if not df_rssi.empty:
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df_rssi['timestamp'],
-                    y=df_rssi['value'],
-                    mode='lines+markers',
-                    name='RSSI (dBm)',
-                    line=dict(color='#4B8DFF')
-                ))
-                fig.update_layout(
-                    height=300,
-                    xaxis_title="Time",
-                    yaxis_title="Signal Strength (dBm)",
-                    template="plotly_white"
-                )
-                st.plotly_chart(fig, use_container_width=True)
+            render_sensor_chart('wifi_rssi', selected, "Signal Strength (dBm)", '#4B8DFF', chart_range)
+        
+        # Metrik tambahan yang terdeteksi otomatis dari payload sensor
+        other_metrics = sorted(m for m in sensor_metrics if m not in ('distance', 'wifi_rssi'))
+        if other_metrics:
+            st.subheader("🧪 Other Sensor Metrics")
+            metric = st.selectbox("Metric", other_metrics, key="overview_other_metric")
+            render_sensor_chart(metric, selected, metric, '#00C851', chart_range)
     else:
         st.info("No sensor data available. Connect devices to see real-time metrics.")
 
@@ -388,12 +652,11 @@ def render_delivery_tab():
                 submitted = st.form_submit_button("Start Delivery", type="primary")
                 
                 if submitted:
-                    # Cari device ESP32 utama
-                    esp32_devices = [d for d in st.session_state.devices 
-                                   if st.session_state.devices[d]['type'] == 'ESP32']
+                    # Cari device utama yang menangani pengiriman
+                    delivery_devices = devices_with('delivery')
                     
-                    if esp32_devices:
-                        device_id = esp32_devices[0]
+                    if delivery_devices:
+                        device_id = delivery_devices[0]
                         payload = {"resi": resi, "is_cod": is_cod}
                         if is_cod:
                             payload.update({"amount": amount, "money_slot": slot})
@@ -405,24 +668,7 @@ def render_delivery_tab():
         
         # Status paket saat ini
         st.subheader("Current Package Status")
-        package = st.session_state.current_package
-        
-        if package['resi']:
-            with st.container(border=True):
-                cols = st.columns([2, 1, 1])
-                with cols[0]:
-                    st.markdown(f"**Resi:** {package['resi']}")
-                    st.markdown(f"**Status:** {package['status']}")
-                with cols[1]:
-                    if package['is_cod']:
-                        st.markdown(f"**Amount:** Rp{package['amount']:,.0f}")
-                    else:
-                        st.markdown("**Type:** Regular")
-                with cols[2]:
-                    if package['timestamp']:
-                        st.caption(f"Updated: {package['timestamp'].strftime('%H:%M:%S')}")
-        else:
-            st.info("No active delivery")
+        live_fragment("package", render_package_status)
     
     with col2:
         # Kontrol pembayaran
@@ -432,10 +678,9 @@ def render_delivery_tab():
             slot = st.selectbox("Select Money Slot", [1, 2], key="payment_slot")
             
             if st.button("💵 Dispense Money", use_container_width=True, type="primary"):
-                esp32_devices = [d for d in st.session_state.devices 
-                               if st.session_state.devices[d]['type'] == 'ESP32']
-                if esp32_devices:
-                    if send_command(esp32_devices[0], "dispense_money", {"slot": slot}):
+                payment_devices = devices_with('payment')
+                if payment_devices:
+                    if send_command(payment_devices[0], "dispense_money", {"slot": slot}):
                         st.success(f"Dispensing from slot {slot}")
                 else:
                     st.warning("No ESP32 device connected")
@@ -445,24 +690,214 @@ def render_delivery_tab():
             col_a, col_b = st.columns(2)
             with col_a:
                 if st.button("🔄 Test Servo", use_container_width=True):
-                    esp32_devices = [d for d in st.session_state.devices 
-                                   if st.session_state.devices[d]['type'] == 'ESP32']
-                    if esp32_devices:
-                        send_command(esp32_devices[0], "test_servo", {"angle": 90})
+                    delivery_devices = devices_with('delivery')
+                    if delivery_devices:
+                        send_command(delivery_devices[0], "test_servo", {"angle": 90})
             with col_b:
                 if st.button("🔊 Test Buzzer", use_container_width=True):
-                    esp32_devices = [d for d in st.session_state.devices 
-                                   if st.session_state.devices[d]['type'] == 'ESP32']
-                    if esp32_devices:
-                        send_command(esp32_devices[0], "test_buzzer")
+                    delivery_devices = devices_with('delivery')
+                    if delivery_devices:
+                        send_command(delivery_devices[0], "test_buzzer")
+    
+    # Ledger semua paket yang pernah tercatat
+    st.markdown("---")
+    st.subheader("📋 Package Ledger")
+    render_package_ledger()
+    
+    # Rekonsiliasi COD dari total berjalan ledger pembayaran
+    st.markdown("---")
+    st.subheader("🧾 COD Reconciliation")
+    render_cod_reconciliation()
+
+def render_package_status():
+    """Paket yang sedang berjalan, satu per device (fragment)"""
+    process_mqtt_messages()
+    packages = ingest_service.store.active_packages()
+    
+    if not packages:
+        st.info("No active delivery")
+        return
+    
+    for package in packages:
+        with st.container(border=True):
+            cols = st.columns([2, 1, 1])
+            with cols[0]:
+                st.markdown(f"**Resi:** {package['resi']}")
+                st.markdown(f"**Status:** {package['status']}")
+            with cols[1]:
+                if package['is_cod']:
+                    st.markdown(f"**Amount:** Rp{package['amount']:,.0f}")
+                else:
+                    st.markdown("**Type:** Regular")
+                st.caption(f"Device: {package['device']}")
+            with cols[2]:
+                st.caption(f"Updated: {from_epoch_ms(package['updated']).strftime('%H:%M:%S')}")
+
+def render_cod_reconciliation():
+    """Rekonsiliasi COD harian seluruh device, total per slot dan pembayaran terbaru"""
+    store = ingest_service.store
+    day = st.date_input("Reconciliation Date", value=datetime.now().date(), key="cod_date")
+    rows = store.reconcile_cod(day_of(to_epoch_ms(datetime.combine(day, datetime.min.time()))))
+    
+    if rows:
+        expected = sum(row['expected_amount'] for row in rows)
+        collected = sum(row['collected_amount'] for row in rows)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Expected COD", f"Rp{expected:,.0f}")
+        col2.metric("Collected", f"Rp{collected:,.0f}")
+        col3.metric("Difference", f"Rp{collected - expected:,.0f}",
+                    delta_color="off" if collected == expected else "inverse")
+        st.dataframe(
+            pd.DataFrame({
+                "Device": [row['device'] for row in rows],
+                "COD Packages": [row['expected_count'] for row in rows],
+                "Expected": [row['expected_amount'] for row in rows],
+                "Payments": [row['collected_count'] for row in rows],
+                "Collected": [row['collected_amount'] for row in rows],
+                "Difference": [row['difference'] for row in rows]
+            }),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Expected": st.column_config.NumberColumn("Expected", format="Rp%d"),
+                "Collected": st.column_config.NumberColumn("Collected", format="Rp%d"),
+                "Difference": st.column_config.NumberColumn("Difference", format="Rp%d")
+            }
+        )
+    else:
+        st.info("No COD activity on this date")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### Money Slot Totals")
+        by_slot, _ = store.payment_totals()
+        if by_slot:
+            st.dataframe(
+                pd.DataFrame({
+                    "Device": [device for device, _ in by_slot],
+                    "Slot": [slot for _, slot in by_slot],
+                    "Payments": [count for count, _ in by_slot.values()],
+                    "Total": [amount for _, amount in by_slot.values()]
+                }),
+                use_container_width=True,
+                hide_index=True,
+                column_config={"Total": st.column_config.NumberColumn("Total", format="Rp%d")}
+            )
+        else:
+            st.caption("No payments recorded")
+    with col2:
+        st.markdown("#### Recent Payments")
+        payments = store.recent_payments(20)
+        if payments:
+            st.dataframe(
+                pd.DataFrame({
+                    "Time": [from_epoch_ms(event.timestamp) for event in payments],
+                    "Device": [event.device for event in payments],
+                    "Resi": [event.resi for event in payments],
+                    "Slot": [event.slot for event in payments],
+                    "Amount": [event.amount for event in payments],
+                    "Status": [event.status for event in payments]
+                }),
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Time": st.column_config.DatetimeColumn("Time", format="HH:mm:ss"),
+                    "Amount": st.column_config.NumberColumn("Amount", format="Rp%d")
+                }
+            )
+        else:
+            st.caption("No payments recorded")
+
+def render_package_ledger():
+    """Cari paket per resi atau telusuri ledger per device/status dengan paginasi cursor"""
+    store = ingest_service.store
+    devices, statuses = store.package_filters()
+    
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        resi = st.text_input("Search Resi", placeholder="Exact resi number...", key="ledger_resi").strip()
+    with col2:
+        device = st.selectbox("Device", ["All devices"] + devices, key="ledger_device")
+    with col3:
+        status = st.selectbox("Status", ["All statuses"] + statuses, key="ledger_status")
+    
+    # Pencarian resi memakai indeks hash, lengkap dengan riwayat transisinya
+    if resi:
+        package = store.get_package(resi)
+        if package is None:
+            st.warning(f"Resi {resi} not found")
+            return
+        with st.container(border=True):
+            cols = st.columns(4)
+            cols[0].metric("Status", package['status'])
+            cols[1].metric("Device", package['device'])
+            cols[2].metric("Amount", f"Rp{package['amount']:,.0f}" if package['is_cod'] else "Regular")
+            cols[3].metric("Paid", f"Rp{package['paid']:,.0f}")
+            st.dataframe(
+                pd.DataFrame({
+                    "Time": [from_epoch_ms(ts) for ts, _, _ in package['events']],
+                    "Source": [source for _, source, _ in package['events']],
+                    "Status": [event_status for _, _, event_status in package['events']]
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+        return
+    
+    # Kembali ke halaman pertama jika filter berubah
+    filters = (device, status)
+    if st.session_state.get('ledger_filters') != filters:
+        st.session_state.ledger_filters = filters
+        st.session_state.ledger_cursors = [None]
+    cursors = st.session_state.ledger_cursors
+    
+    packages, next_cursor = store.query_packages(
+        device_id=None if device == "All devices" else device,
+        status=None if status == "All statuses" else status,
+        before=cursors[-1],
+        limit=PACKAGE_PAGE_SIZE
+    )
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("⬅️ Newer", use_container_width=True, disabled=len(cursors) == 1,
+                  on_click=cursors.pop, key="ledger_newer")
+    with col2:
+        st.caption(f"Page {len(cursors)} · {len(packages)} packages of {len(store.packages):,}")
+    with col3:
+        st.button("Older ➡️", use_container_width=True, disabled=next_cursor is None,
+                  on_click=cursors.append, args=(next_cursor,), key="ledger_older")
+    
+    if packages:
+        st.dataframe(
+            pd.DataFrame({
+                "Resi": [package['resi'] for package in packages],
+                "Device": [package['device'] for package in packages],
+                "Status": [package['status'] for package in packages],
+                "COD": [package['is_cod'] for package in packages],
+                "Amount": [package['amount'] for package in packages],
+                "Paid": [package['paid'] for package in packages],
+                "Created": [from_epoch_ms(package['created']) for package in packages],
+                "Updated": [from_epoch_ms(package['updated']) for package in packages]
+            }),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Amount": st.column_config.NumberColumn("Amount", format="Rp%d"),
+                "Paid": st.column_config.NumberColumn("Paid", format="Rp%d"),
+                "Created": st.column_config.DatetimeColumn("Created", format="DD/MM HH:mm:ss"),
+                "Updated": st.column_config.DatetimeColumn("Updated", format="DD/MM HH:mm:ss")
+            }
+        )
+    else:
+        st.info("No packages recorded yet")
 
 def render_camera_tab():
     """Tab Camera - Monitoring ESP32-CAM"""
     st.header("📷 ESP32-CAM Monitoring")
     
     # Cari device kamera
-    cam_devices = [d for d in st.session_state.devices 
-                   if st.session_state.devices[d]['type'] == 'ESP32-CAM']
+    cam_devices = devices_with('camera')
     
     if not cam_devices:
         st.info("No camera devices connected. Ensure ESP32-CAM is powered and connected to MQTT.")
@@ -478,31 +913,15 @@ def render_camera_tab():
         with col1:
             st.metric("Camera", selected_cam)
         with col2:
-            last_seen = cam_info['last_seen']
-            time_diff = (datetime.now() - last_seen).total_seconds()
-            status = "🟢 Online" if time_diff < 30 else "🟡 Idle" if time_diff < 120 else "🔴 Offline"
-            st.metric("Status", status)
+            st.metric("Status", LIVENESS_LABELS[cam_info['liveness']])
         with col3:
             if 'free_heap' in cam_info['status']:
                 st.metric("Free Memory", f"{cam_info['status']['free_heap']:,} bytes")
         
-        # Feed placeholder (bisa diganti dengan gambar aktual dari MQTT)
+        # Feed frame JPEG dari topik camera
         st.markdown("---")
         st.subheader("Camera Feed")
-        
-        with st.container(height=400):
-            # Placeholder untuk feed kamera
-            # Di implementasi nyata, ini akan menampilkan gambar dari MQTT
-            st.markdown("""
-            <div style='display: flex; justify-content: center; align-items: center; 
-                        height: 100%; background-color: #f0f2f6; border-radius: 10px;'>
-                <div style='text-align: center;'>
-                    <div style='font-size: 48px; margin-bottom: 16px;'>📷</div>
-                    <h3 style='color: #666;'>Camera Feed</h3>
-                    <p style='color: #888;'>Live feed will appear here when available</p>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+        live_fragment("camera", render_camera_feed, selected_cam)
         
         # Kontrol kamera
         st.markdown("---")
@@ -517,13 +936,119 @@ def render_camera_tab():
         with col3:
             if st.button("⚙️ Update Settings", use_container_width=True):
                 send_command(selected_cam, "configure", {"quality": quality})
+    
+    # Galeri foto capture dari arsip
+    st.markdown("---")
+    st.subheader("🗂️ Photo Archive")
+    render_photo_archive(cam_devices)
+
+def render_photo_archive(cam_devices):
+    """Galeri foto arsip; hanya thumbnail yang dimuat, foto penuh dibuka sesuai pilihan"""
+    archive = ingest_service.store.archive
+    stats = archive.stats()
+    st.caption(f"{stats['photos']:,} photos · {stats['unique']:,} unique · "
+               f"{stats['bytes'] / 1048576:.1f} of {stats['max_bytes'] / 1048576:.0f} MB")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        device = st.selectbox("Camera", ["All cameras"] + cam_devices, key="archive_device")
+    with col2:
+        resi = st.text_input("Resi", placeholder="Filter by resi...", key="archive_resi").strip()
+    
+    # Kembali ke halaman pertama jika filter berubah
+    filters = (device, resi)
+    if st.session_state.get('archive_filters') != filters:
+        st.session_state.archive_filters = filters
+        st.session_state.archive_cursors = [None]
+    cursors = st.session_state.archive_cursors
+    
+    photos, next_cursor = archive.query(
+        device_id=None if device == "All cameras" else device,
+        resi=resi or None,
+        before=cursors[-1],
+        limit=ARCHIVE_PAGE_SIZE
+    )
+    if not photos:
+        st.info("No archived photos. Use 📸 Capture Photo to take one.")
+        return
+    
+    cols = st.columns(6)
+    for i, photo in enumerate(photos):
+        image = archive.thumbnail(photo['hash'])
+        if image:
+            with cols[i % 6]:
+                label = photo['resi'] or photo['device']
+                st.image(image, caption=f"{label} · {from_epoch_ms(photo['timestamp']).strftime('%d/%m %H:%M:%S')}")
+    
+    # Navigasi halaman
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("⬅️ Newer", use_container_width=True, disabled=len(cursors) == 1,
+                  on_click=cursors.pop, key="archive_newer")
+    with col2:
+        st.caption(f"Page {len(cursors)} · {len(photos)} photos")
+    with col3:
+        st.button("Older ➡️", use_container_width=True, disabled=next_cursor is None,
+                  on_click=cursors.append, args=(next_cursor,), key="archive_older")
+    
+    # Foto ukuran penuh hanya dibaca untuk foto yang dipilih
+    by_id = {photo['id']: photo for photo in photos}
+    selected = st.selectbox(
+        "Open Photo",
+        options=[None] + list(by_id),
+        format_func=lambda photo_id: "—" if photo_id is None else
+            f"{from_epoch_ms(by_id[photo_id]['timestamp']).strftime('%Y-%m-%d %H:%M:%S')} · "
+            f"{by_id[photo_id]['resi'] or by_id[photo_id]['device']}",
+        key="archive_open"
+    )
+    if selected is not None:
+        image = archive.image(by_id[selected]['hash'])
+        if image:
+            st.image(image, use_container_width=True)
+
+def render_camera_feed(device_id):
+    """Frame terbaru dan ring frame satu kamera (fragment, dibatasi CAMERA_MAX_FPS)"""
+    process_mqtt_messages()
+    frames = ingest_service.store.cameras.frames(device_id)
+    
+    with st.container(height=400):
+        if frames:
+            latest = frames[0]
+            st.image(latest['data'], use_container_width=True)
+        else:
+            # Placeholder sampai frame pertama diterima
+            st.markdown("""
+            <div style='display: flex; justify-content: center; align-items: center; 
+                        height: 100%; background-color: #f0f2f6; border-radius: 10px;'>
+                <div style='text-align: center;'>
+                    <div style='font-size: 48px; margin-bottom: 16px;'>📷</div>
+                    <h3 style='color: #666;'>Camera Feed</h3>
+                    <p style='color: #888;'>Live feed will appear here when available</p>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+    
+    if frames:
+        latest = frames[0]
+        st.caption(f"Frame {latest['frame_id'] if latest['frame_id'] is not None else '-'} · "
+                   f"{latest['size'] / 1024:.1f} KB · "
+                   f"{from_epoch_ms(latest['timestamp']).strftime('%H:%M:%S')}")
+        
+        # Thumbnail frame sebelumnya di ring
+        thumbs = [(frame, thumbnail(frame)) for frame in frames[1:]]
+        thumbs = [(frame, image) for frame, image in thumbs if image]
+        if thumbs:
+            cols = st.columns(len(thumbs))
+            for col, (frame, image) in zip(cols, thumbs):
+                with col:
+                    st.image(image, caption="📸" if frame['capture'] else None)
 
 def render_logs_tab():
     """Tab Logs - Sistem log"""
     st.header("📝 System Logs")
     
     # Filter logs
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
         log_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "ALERT"]
         selected_levels = st.multiselect(
@@ -541,68 +1066,137 @@ def render_logs_tab():
         )
     
     with col3:
-        log_limit = st.slider("Show Last N Logs", 10, 500, 100)
+        range_name = st.selectbox("Time Range", list(LOG_RANGES), key="log_range")
     
-    # Filter logs berdasarkan seleksi
-    filtered_logs = [
-        log for log in st.session_state.system_logs[-log_limit:]
-        if log['level'] in selected_levels
-        and (not selected_devices or log['device'] in selected_devices)
-    ]
+    with col4:
+        page_size = st.slider("Logs per Page", 10, 2000, 100)
     
-    # Tampilkan logs
+    # Kembali ke halaman pertama jika filter berubah
+    filters = (tuple(selected_levels), tuple(selected_devices), range_name, page_size)
+    if st.session_state.get('log_filters') != filters:
+        st.session_state.log_filters = filters
+        st.session_state.log_cursors = [None]
+    cursors = st.session_state.log_cursors
+    
+    # Filter dan paginasi dijalankan di log store (indeks), bukan di list sesi
+    log_range = LOG_RANGES[range_name]
+    filtered_logs, next_cursor = ingest_service.store.query_logs(
+        levels=selected_levels,
+        devices=selected_devices or None,
+        since=datetime.now() - log_range if log_range else None,
+        before=cursors[-1],
+        limit=page_size
+    )
+    
+    # Navigasi halaman
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("⬅️ Newer", use_container_width=True, disabled=len(cursors) == 1,
+                  on_click=cursors.pop)
+    with col2:
+        st.caption(f"Page {len(cursors)} · {len(filtered_logs)} logs")
+    with col3:
+        st.button("Older ➡️", use_container_width=True, disabled=next_cursor is None,
+                  on_click=cursors.append, args=(next_cursor,))
+    
+    # Tampilkan logs dalam satu grid (browser hanya menggambar baris yang terlihat)
     if filtered_logs:
-        # Container untuk logs
-        log_container = st.container(height=500, border=True)
+        st.dataframe(
+            style_log_frame(log_frame(filtered_logs)),
+            height=500,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Time": st.column_config.DatetimeColumn("Time", format="HH:mm:ss"),
+                "Level": st.column_config.TextColumn("Level", width="small"),
+                "Device": st.column_config.TextColumn("Device", width="small"),
+                "Message": st.column_config.TextColumn("Message", width="large")
+            }
+        )
+    else:
+        st.info("No logs available with current filters")
+    
+    # Ekspor seluruh riwayat terfilter, bukan hanya halaman yang tampil
+    st.markdown("---")
+    render_export_panel(selected_levels, selected_devices)
+
+def render_export_panel(selected_levels, selected_devices):
+    """Ekspor riwayat SQLite per rentang tanggal; dibaca dan dikompres per chunk saat diunduh"""
+    history = ingest_service.store.history
+    with st.expander("📥 Export History"):
+        if history is None:
+            st.info("History database is disabled; nothing to export.")
+            return
         
-        with log_container:
-            for log in reversed(filtered_logs):
-                # Tentukan warna berdasarkan level
-                color_map = {
-                    "DEBUG": "#888",
-                    "INFO": "#4B8DFF",
-                    "WARNING": "#FFA500",
-                    "ERROR": "#FF4B4B",
-                    "ALERT": "#FF1493"
-                }
-                color = color_map.get(log['level'], "#888")
-                
-                # Tampilkan log entry
-                cols = st.columns([1, 2, 3, 2])
-                with cols[0]:
-                    st.markdown(f"<span style='color:{color}; font-weight:bold;'>{log['level']}</span>", 
-                               unsafe_allow_html=True)
-                with cols[1]:
-                    st.text(log['device'])
-                with cols[2]:
-                    st.text(log['message'][:80] + "..." if len(log['message']) > 80 else log['message'])
-                with cols[3]:
-                    st.caption(log['timestamp'].strftime("%H:%M:%S"))
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            dataset = st.selectbox("Dataset", list(EXPORT_DATASETS),
+                                   format_func=EXPORT_DATASETS.get, key="export_dataset")
+        with col2:
+            fmt = st.selectbox("Format", export_formats(), key="export_format")
+        with col3:
+            today = datetime.now().date()
+            days = st.date_input("Date Range", value=(today - timedelta(days=7), today),
+                                 max_value=today, key="export_days")
+        if len(days) != 2:
+            st.caption("Select both a start and an end date.")
+            return
+        
+        # end eksklusif: tengah malam setelah hari terakhir
+        start_ms = to_epoch_ms(datetime.combine(days[0], datetime.min.time()))
+        end_ms = to_epoch_ms(datetime.combine(days[1] + timedelta(days=1), datetime.min.time()))
+        # Filter perangkat dan level dari atas; "Dashboard" hanya ada di logs
+        devices = None
+        if selected_devices:
+            devices = [d for d in selected_devices if dataset == 'logs' or d != "Dashboard"]
+        filters = {'devices': devices}
+        if dataset == 'logs':
+            filters['levels'] = selected_levels
+        
+        # Dihitung paling banyak sampai batas + 1 agar biayanya tetap kecil
+        rows = history.count_export_rows(dataset, start_ms, end_ms, filters,
+                                         limit=EXPORT_DOWNLOAD_MAX_ROWS + 1)
+        too_large = rows > EXPORT_DOWNLOAD_MAX_ROWS
         
-        # Ekspor logs
-        st.markdown("---")
         col1, col2 = st.columns([3, 1])
+        with col1:
+            scope = ", ".join(devices) if devices is not None else "all devices"
+            if dataset == 'logs':
+                scope += f" · levels: {', '.join(selected_levels) or 'none'}"
+            count = f"more than {EXPORT_DOWNLOAD_MAX_ROWS:,}" if too_large else f"{rows:,}"
+            st.caption(f"Filters: {scope} · {count} rows")
+            if export_server is not None:
+                params = [('dataset', dataset), ('format', fmt), ('start', start_ms), ('end', end_ms)]
+                params += [('device', device) for device in devices or []]
+                params += [('level', level) for level in filters.get('levels', [])]
+                st.caption(f"Streaming endpoint: {export_server.link('/export', params)}")
         with col2:
-            if st.button("📥 Export Logs", use_container_width=True):
-                if filtered_logs:
-                    df = pd.DataFrame(filtered_logs)
-                    csv = df.to_csv(index=False)
-                    
-                    st.download_button(
-                        label="Download CSV",
-                        data=csv,
-                        file_name=f"jmailbox_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-    else:
-        st.info("No logs available with current filters")
+            # File dibuat saat tombol diklik, langsung dari SQLite ke file sementara
+            st.download_button(
+                "📥 Download",
+                data=functools.partial(export_file, history, dataset, fmt, start_ms, end_ms, filters),
+                file_name=export_filename(dataset, fmt, start_ms, end_ms),
+                mime=EXPORT_FORMATS[fmt],
+                disabled=too_large,
+                use_container_width=True
+            )
+        if too_large:
+            hint = ("use the streaming endpoint above" if export_server is not None
+                    else "set JMAILBOX_EXPORT_PORT to enable the streaming endpoint")
+            st.warning(f"In-app downloads are limited to {EXPORT_DOWNLOAD_MAX_ROWS:,} rows because the "
+                       f"file is held in memory. Narrow the date range or filters, or {hint}.")
 
 def render_alerts_tab():
     """Tab Alerts - Notifikasi keamanan"""
     st.header("🚨 Security Alerts")
+    live_fragment("alerts", render_alert_list)
+
+def render_alert_list():
+    """Ringkasan, laju dan daftar alert (fragment) dari penghitung berjalan, tanpa memindai alert"""
+    snapshot = process_mqtt_messages()
+    alerts = alert_summary(snapshot)
     
-    if not st.session_state.security_alerts:
+    if not alerts['recent']:
         st.info("No security alerts detected.")
         return
     
@@ -610,32 +1204,31 @@ def render_alerts_tab():
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        total_alerts = len(st.session_state.security_alerts)
-        st.metric("Total Alerts", total_alerts)
+        st.metric("24h Alerts", alerts['count_24h'], help=f"{alerts['total']} since restart")
     
     with col2:
-        today_alerts = len([a for a in st.session_state.security_alerts 
-                          if a['timestamp'].date() == datetime.now().date()])
-        st.metric("Today", today_alerts)
+        st.metric("Today", alerts['today'])
     
     with col3:
-        high_alerts = len([a for a in st.session_state.security_alerts 
-                         if a.get('severity', 1) >= 3])
-        st.metric("High Severity", high_alerts, delta_color="inverse")
+        st.metric("High Severity (24h)", alerts['severity_24h'][3], delta_color="inverse")
+    
+    if alerts['top_devices']:
+        st.caption("Top devices: " + " · ".join(f"{device} ({count})" for device, count in alerts['top_devices']))
+    if alerts['deduplicated'] or alerts['suppressed']:
+        st.caption(f"{alerts['deduplicated']} repeat(s) merged into existing alerts · "
+                   f"{alerts['suppressed']} suppressed by per-device rate limit "
+                   f"({ALERT_RATE}/s, burst {ALERT_BURST})")
+    
+    render_alert_rate(snapshot)
     
     st.markdown("---")
     
-    # Daftar alert
+    # Daftar alert (sudah terbaru dulu)
     st.subheader("Recent Alerts")
     
-    # Urutkan dari yang terbaru
-    recent_alerts = sorted(st.session_state.security_alerts, 
-                         key=lambda x: x['timestamp'], 
-                         reverse=True)[:20]
-    
-    for alert in recent_alerts:
+    for alert in alerts['recent']:
         # Tentukan warna berdasarkan severity
-        severity = alert.get('severity', 1)
+        severity = severity_level(alert.get('severity', 1))
         if severity >= 3:
             border_color = "#FF4B4B"
             icon = "🔴"
@@ -655,11 +1248,13 @@ def render_alerts_tab():
             with cols[0]:
                 st.markdown(f"<h2>{icon}</h2>", unsafe_allow_html=True)
             with cols[1]:
-                st.markdown(f"**{alert['reason']}**")
+                repeats = f" ×{alert['count']}" if alert['count'] > 1 else ""
+                st.markdown(f"**{alert['reason']}**{repeats}")
                 st.caption(alert.get('message', ''))
                 st.caption(f"Device: {alert['device']}")
             with cols[2]:
-                time_diff = datetime.now() - alert['timestamp']
+                # Waktu kemunculan terakhir (alert berulang digabung)
+                time_diff = datetime.now() - alert['last_seen']
                 if time_diff.days > 0:
                     time_text = f"{time_diff.days} day(s) ago"
                 elif time_diff.seconds > 3600:
@@ -671,6 +1266,31 @@ def render_alerts_tab():
                 st.markdown(f"<span style='color:{border_color}; font-weight:bold;'>{severity_text}</span>", 
                            unsafe_allow_html=True)
 
+def render_alert_rate(snapshot):
+    """Grafik alert per menit (1 jam terakhir) dengan menit lonjakan ditandai"""
+    rate_key = (snapshot['versions']['alerts'], int(time.time() // 60))
+    entry = st.session_state.get('alert_rate')
+    if entry is None or entry['key'] != rate_key:
+        minutes, counts, bursts = ingest_service.store.alert_rate(60)
+        times = [from_epoch_ms(int(minute) * 60000) for minute in minutes]
+        fig = go.Figure()
+        fig.add_trace(go.Bar(x=times, y=counts, name='Alerts/min', marker_color='#4B8DFF'))
+        if bursts.any():
+            fig.add_trace(go.Scatter(
+                x=[t for t, burst in zip(times, bursts) if burst], y=counts[bursts],
+                mode='markers', name='Burst', marker=dict(color='#FF4B4B', size=10, symbol='triangle-up')
+            ))
+        fig.update_layout(
+            height=250,
+            xaxis_title="Time",
+            yaxis_title="Alerts per minute",
+            template="plotly_white"
+        )
+        entry = st.session_state.alert_rate = {'key': rate_key, 'figure': fig, 'bursts': int(bursts.sum())}
+    if entry['bursts']:
+        st.warning(f"⚠️ {entry['bursts']} alert burst(s) in the last hour")
+    st.plotly_chart(entry['figure'], use_container_width=True)
+
 def render_config_tab():
     """Tab Configuration - Konfigurasi sistem"""
     st.header("⚙️ System Configuration")
@@ -685,14 +1305,28 @@ def render_config_tab():
             # Versi dashboard
             st.text_input("Dashboard Version", value="1.0.0", disabled=True)
             
-            # Refresh interval
-            refresh_interval = st.slider(
-                "Auto-refresh Interval (seconds)",
-                min_value=5,
-                max_value=60,
-                value=30,
-                step=5
+            # Auto-refresh per widget; disimpan di key non-widget agar tidak hilang saat tab ditutup
+            st.session_state.auto_refresh = st.toggle(
+                "Auto-refresh",
+                value=st.session_state.get('auto_refresh', True)
             )
+            intervals = st.session_state.setdefault('refresh_intervals', dict(REFRESH_INTERVALS))
+            with st.expander("Refresh Intervals (seconds)"):
+                for name in REFRESH_INTERVALS:
+                    # Hanya Camera Feed yang boleh di bawah satu detik
+                    if name == "camera":
+                        min_value, step = 1 / CAMERA_MAX_FPS, 1 / CAMERA_MAX_FPS
+                    else:
+                        min_value, step = REFRESH_MIN_INTERVAL, 0.5
+                    intervals[name] = st.slider(
+                        name.capitalize(),
+                        min_value=min_value,
+                        max_value=REFRESH_MAX_INTERVAL,
+                        value=min(max(float(intervals[name]), min_value), REFRESH_MAX_INTERVAL),
+                        step=step,
+                        key=f"refresh_{name}",
+                        disabled=not st.session_state.auto_refresh
+                    )
             
             # Tema warna
             st.markdown("#### Color Theme")
@@ -734,26 +1368,67 @@ def render_config_tab():
             
             broker = st.text_input(
                 "Broker URL",
-                value=MQTT_BROKER,
-                help="MQTT broker address"
+                value=ingest_service.broker,
+                help="MQTT broker address (default from JMAILBOX_MQTT_BROKER)"
             )
             
             port = st.number_input(
                 "Port",
                 min_value=1,
                 max_value=65535,
-                value=MQTT_PORT
+                value=ingest_service.port
             )
             
             st.markdown("#### Topics")
             for topic in MQTT_TOPICS:
                 st.code(topic, language="text")
             
-            if st.button("🔗 Test Connection", use_container_width=True):
-                if init_mqtt():
-                    st.success("Connection successful!")
-                else:
-                    st.error("Connection failed")
+            pool = ingest_service.shard_pool
+            if pool is not None:
+                st.markdown("#### Sharded Ingestion")
+                st.caption(f"{pool.shards} worker process(es), mode `{pool.mode}`"
+                           + (f", share group `{pool.share_group}`" if pool.mode == "share" else "")
+                           + ". Commands use the broker each device last reported from.")
+                for extra_host, extra_port in ingest_service.brokers:
+                    st.code(f"{extra_host}:{extra_port}", language="text")
+            
+            col_a, col_b = st.columns(2)
+            with col_a:
+                if st.button("💾 Apply Broker", use_container_width=True,
+                             disabled=(broker, port) == (ingest_service.broker, ingest_service.port)):
+                    ingest_service.set_broker(broker.strip(), port)
+                    ingest_service.store.add_log("INFO", f"MQTT broker changed to {broker.strip()}:{port}")
+                    if init_mqtt(force=True):
+                        st.success(f"Connected to {broker}:{port}")
+                    else:
+                        st.warning("Broker changed; still connecting")
+            with col_b:
+                if st.button("🔗 Test Connection", use_container_width=True):
+                    if init_mqtt(force=True):
+                        st.success("Connection successful!")
+                    else:
+                        st.error("Connection failed")
+            st.caption(connection_caption())
+        
+        # Latensi round-trip perintah
+        with st.container(border=True):
+            st.subheader("📡 Command Round-Trip")
+            render_command_stats()
+        
+        # Decoder payload dan kegagalan validasi per device
+        with st.container(border=True):
+            st.subheader("🧾 Payload Decoding")
+            render_decode_stats()
+        
+        # Perintah massal ke armada device
+        with st.container(border=True):
+            st.subheader("🛰️ Fleet Commands")
+            render_fleet_commands()
+        
+        # Lalu lintas sintetis / rekaman tanpa hardware
+        with st.container(border=True):
+            st.subheader("🧪 Load Generator")
+            render_load_generator()
         
         # Device management
         with st.container(border=True):
@@ -770,19 +1445,335 @@ def render_config_tab():
                                 send_command(device_id, "reboot")
                         with col_b:
                             if st.button("🗑️ Remove", key=f"remove_{device_id}", type="secondary"):
-                                if device_id in st.session_state.devices:
-                                    del st.session_state.devices[device_id]
-                                    st.rerun()
+                                ingest_service.store.remove_device(device_id)
+                                st.rerun()
             else:
                 st.info("No devices connected")
 
+def render_command_stats():
+    """Persentil latensi perintah per device dan jenis perintah, plus perintah terakhir"""
+    stats, pending, finished = ingest_service.store.command_stats()
+    st.caption(f"{pending} command(s) awaiting reply · timeout {COMMAND_TIMEOUT_S}s, "
+               f"{COMMAND_RETRIES} retries")
+    if not stats:
+        st.info("No commands completed yet")
+        return
+    
+    st.dataframe(
+        pd.DataFrame({
+            "Device": [row['device'] for row in stats],
+            "Command": [row['command'] for row in stats],
+            "p50 (ms)": [row['p50'] for row in stats],
+            "p95 (ms)": [row['p95'] for row in stats],
+            "p99 (ms)": [row['p99'] for row in stats],
+            "Acked": [row['acked'] for row in stats],
+            "Failed": [row['failed'] for row in stats],
+            "Timeouts": [row['timeout'] for row in stats]
+        }),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            name: st.column_config.NumberColumn(name, format="%.0f")
+            for name in ("p50 (ms)", "p95 (ms)", "p99 (ms)")
+        }
+    )
+    
+    with st.expander("Recent Commands"):
+        st.dataframe(
+            pd.DataFrame({
+                "Sent": [from_epoch_ms(entry['first_sent']) for entry in finished],
+                "Device": [entry['device'] for entry in finished],
+                "Command": [entry['command'] for entry in finished],
+                "Result": [entry['status'] for entry in finished],
+                "Attempts": [entry['attempts'] for entry in finished],
+                "Latency (ms)": [entry['latency'] for entry in finished]
+            }),
+            use_container_width=True,
+            hide_index=True,
+            column_config={"Sent": st.column_config.DatetimeColumn("Sent", format="HH:mm:ss")}
+        )
+
+def render_decode_stats():
+    """Backend decoder yang aktif dan jumlah payload tidak valid per device"""
+    backends = payload_backends()
+    st.caption(f"JSON: {backends['json']} · "
+               f"MessagePack: {'enabled' if backends['msgpack'] else 'not installed'} · "
+               f"CBOR: {'enabled' if backends['cbor'] else 'not installed'}")
+    rows = ingest_service.decode_stats()
+    if not rows:
+        st.info("No invalid payloads received")
+        return
+    rows.sort(key=lambda row: row['failures'], reverse=True)
+    st.dataframe(
+        pd.DataFrame({
+            "Device": [row['device'] for row in rows],
+            "Failures": [row['failures'] for row in rows],
+            "Last Error": [row['last_error'] for row in rows]
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
+
+def render_fleet_commands():
+    """Form perintah massal berdasarkan tipe, status dan tag, plus progres job"""
+    index = st.session_state.device_index
+    command = st.selectbox("Command", FLEET_COMMANDS, key="fleet_command")
+    
+    col_a, col_b, col_c = st.columns(3)
+    with col_a:
+        types = st.multiselect("Type", sorted(index['type']), key="fleet_types")
+    with col_b:
+        liveness = st.multiselect("Status", list(LIVENESS_LABELS), format_func=LIVENESS_LABELS.get,
+                                  key="fleet_liveness")
+    with col_c:
+        tags = st.multiselect("Tag", sorted(index['tag']), key="fleet_tags")
+    params = st.text_input("Parameters (JSON, optional)", placeholder='{"quality": 10}', key="fleet_params")
+    
+    targets = ingest_service.store.select_devices(types or None, liveness or None, tags or None)
+    data = None
+    if params.strip():
+        try:
+            data = json.loads(params)
+        except ValueError as e:
+            st.error(f"Invalid JSON: {str(e)}")
+            return
+        if not isinstance(data, dict):
+            st.error("Parameters must be a JSON object")
+            return
+    
+    if st.button(f"🚀 Send to {len(targets)} device(s)", disabled=not targets or not ingest_service.connected,
+                 use_container_width=True):
+        job_id = fleet_dispatcher.dispatch(command, targets, data)
+        ingest_service.store.add_log("INFO", f"Fleet {job_id}: sending '{command}' to {len(targets)} devices "
+                                             f"(max {FLEET_RATE}/s)")
+    
+    live_fragment("fleet", render_fleet_jobs)
+
+def render_load_generator():
+    """Jalankan simulator armada atau replay rekaman NDJSON ke layanan ingest sandbox"""
+    runner = get_load_runner()
+    st.caption("Feeds messages into a separate in-memory ingest service (no broker). Live data, history, "
+               "ledgers and the photo archive are not touched. For broker load tests run "
+               "`python -m jmailbox.simulator simulate --broker <host>`.")
+    mode = st.radio("Source", ["Simulated fleet", "Replay recording"], horizontal=True, key="load_mode")
+    
+    if mode == "Simulated fleet":
+        col_a, col_b, col_c = st.columns(3)
+        with col_a:
+            mailboxes = st.number_input("Mailboxes", min_value=1, max_value=5000, value=50, key="load_mailboxes")
+        with col_b:
+            rate = st.number_input("Messages/s", min_value=1, max_value=50000, value=1000, step=100,
+                                   key="load_rate")
+        with col_c:
+            duration = st.number_input("Duration (s)", min_value=1, max_value=3600, value=30, key="load_duration")
+        description = f"{mailboxes} simulated mailboxes at {rate:,}/s for {duration}s"
+        source = lambda: FleetSimulator(mailboxes).messages(rate, duration)
+        speed = 1.0
+    else:
+        path = st.text_input("Recording (NDJSON)", value="jmailbox_traffic.ndjson", key="load_path")
+        speed = st.slider("Speed", min_value=MIN_SPEED, max_value=MAX_SPEED, value=1, key="load_speed")
+        description = f"replay of {path} at {speed}x"
+        source = lambda: read_recording(path)
+        if not os.path.exists(path):
+            st.info("Record traffic with `python -m jmailbox.simulator record --out <file>` "
+                    "or `simulate --record <file>`")
+    
+    col_a, col_b = st.columns(2)
+    with col_a:
+        if st.button("▶️ Start", use_container_width=True, disabled=runner.running, key="load_start"):
+            try:
+                sink = ServiceSink(new_load_sandbox(), drain_every=DRAIN_MAX_MESSAGES)
+                runner.start(description, source(), sink, speed)
+                ingest_service.store.add_log("INFO", f"Load generator started: {description}")
+            except (OSError, ValueError) as e:
+                st.error(f"Could not start load generator: {str(e)}")
+    with col_b:
+        st.button("⏹️ Stop", use_container_width=True, disabled=not runner.running, on_click=runner.stop,
+                  key="load_stop")
+    
+    live_fragment("load", render_load_progress)
+
+def render_load_progress():
+    """Statistik run load generator terakhir (fragment)"""
+    summary = get_load_runner().summary()
+    if summary['description'] is None:
+        return
+    state = "running" if summary['running'] else "finished"
+    st.caption(f"{summary['description']} · {state}")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Sent", f"{summary['sent']:,}")
+    col2.metric("Rate", f"{summary['rate']:,.0f}/s")
+    col3.metric("Behind Schedule", f"{summary['behind_ms']:.0f} ms")
+    sandbox = get_load_runner().sink.service
+    stats = sandbox.buffer_stats()
+    with sandbox.store.lock:
+        devices = len(sandbox.store.registry.devices)
+        packages = len(sandbox.store.packages)
+    st.caption(f"Sandbox: {stats['drained']:,} applied · {stats['dropped']:,} dropped · "
+               f"{devices:,} devices · {packages:,} packages")
+    if summary['error']:
+        st.error(summary['error'])
+
+def render_fleet_jobs():
+    """Progres kirim dan balasan tiap job perintah massal"""
+    jobs = fleet_dispatcher.jobs()
+    if not jobs:
+        st.caption("No fleet commands sent yet")
+        return
+    
+    for job in jobs[:5]:
+        total = max(job['total'], 1)
+        replied = job['acked'] + job['failed'] + job['timeout']
+        state = "cancelled" if job['cancelled'] else "sending" if job['finished'] is None else "sent"
+        st.markdown(f"**{job['id']}** · `{job['command']}` · {state}")
+        st.progress(job['sent'] / total, text=f"Sent {job['sent']}/{job['total']}"
+                                              + (f" ({job['send_failed']} failed)" if job['send_failed'] else ""))
+        st.progress(replied / total, text=f"✅ {job['acked']} acked · ❌ {job['failed']} failed · "
+                                          f"⏱️ {job['timeout']} timed out · {job['pending']} awaiting reply")
+        if job['finished'] is None and not job['cancelled']:
+            st.button("⏹️ Cancel", key=f"cancel_{job['id']}", on_click=fleet_dispatcher.cancel, args=(job['id'],))
+
+def render_performance_tab():
+    """Tab Performance - Instrumentasi pipeline dashboard sendiri"""
+    st.header("📈 Performance")
+    live_fragment("performance", render_performance_panel)
+    
+    # Ekspor metrik dalam format teks Prometheus
+    st.markdown("---")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        if metrics_server is not None:
+            st.caption(f"Prometheus endpoint: {metrics_server.url}")
+        else:
+            st.caption("Prometheus endpoint disabled or port unavailable (see JMAILBOX_METRICS_PORT)")
+    with col2:
+        st.download_button(
+            "📥 Export Metrics",
+            data=ingest_service.metrics.render(),
+            file_name=f"jmailbox_metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prom",
+            mime="text/plain",
+            use_container_width=True
+        )
+
+def render_performance_panel():
+    """Laju pesan, decode, antrean, drain, waktu render dan memori sesi (fragment)"""
+    metrics = ingest_service.metrics
+    totals = {values[0]: child.value
+              for values, child in metrics.get('jmailbox_mqtt_messages_total').children()}
+    
+    # Laju per channel dari selisih penghitung sejak refresh panel sebelumnya
+    now = time.monotonic()
+    previous_at, previous = st.session_state.get('perf_totals', (now, totals))
+    st.session_state.perf_totals = (now, totals)
+    elapsed = now - previous_at
+    rates = {
+        channel: (count - previous.get(channel, 0)) / elapsed if elapsed > 0 else 0.0
+        for channel, count in totals.items()
+    }
+    
+    drain = metrics.get('jmailbox_drain_seconds').labels().summary()
+    sessions = dict(session_memory.children())
+    own = sessions.get((st.session_state.get('session_id'),))
+    total_memory = sum(gauge.value for gauge in sessions.values())
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Messages/s", f"{sum(rates.values()):,.0f}", help=f"{sum(totals.values()):,} since start")
+    with col2:
+        st.metric("Queue Depth", f"{len(ingest_service.buffer):,}")
+    with col3:
+        st.metric("Drain p95", "-" if drain['p95'] is None else f"{drain['p95'] * 1000:.1f} ms",
+                  help=f"{drain['count']:,} non-empty drains")
+    with col4:
+        st.metric("Session Memory", "-" if own is None else f"{own.value / 1e6:.1f} MB",
+                  help=f"{len(sessions)} session(s), {total_memory / 1e6:.1f} MB total")
+    
+    st.subheader("Ingest by Channel")
+    decode = dict(metrics.get('jmailbox_decode_seconds').children())
+    channels = sorted(totals)
+    # Frame kamera biner tidak melewati decoder
+    decode_stats = [decode[(channel,)].summary() if (channel,) in decode else {'p50': None, 'p95': None, 'p99': None}
+                    for channel in channels]
+    st.dataframe(
+        pd.DataFrame({
+            "Channel": channels,
+            "Messages": [totals[channel] for channel in channels],
+            "Msg/s": [rates[channel] for channel in channels],
+            "Decode p50 (µs)": [micros(row['p50']) for row in decode_stats],
+            "Decode p95 (µs)": [micros(row['p95']) for row in decode_stats],
+            "Decode p99 (µs)": [micros(row['p99']) for row in decode_stats]
+        }),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            name: st.column_config.NumberColumn(name, format="%.1f")
+            for name in ("Msg/s", "Decode p50 (µs)", "Decode p95 (µs)", "Decode p99 (µs)")
+        }
+    )
+    
+    shards = ingest_service.shard_stats()
+    if shards:
+        render_shard_table(shards, now)
+    
+    st.subheader("Render Time")
+    views = [(values[0], histogram.summary()) for values, histogram in render_seconds.children()]
+    views.sort(key=lambda view: view[1]['p95'] or 0, reverse=True)
+    st.dataframe(
+        pd.DataFrame({
+            "View": [name for name, _ in views],
+            "Renders": [row['count'] for _, row in views],
+            "p50 (ms)": [millis(row['p50']) for _, row in views],
+            "p95 (ms)": [millis(row['p95']) for _, row in views],
+            "Max (ms)": [millis(row['max']) for _, row in views]
+        }),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            name: st.column_config.NumberColumn(name, format="%.1f")
+            for name in ("p50 (ms)", "p95 (ms)", "Max (ms)")
+        }
+    )
+
+def render_shard_table(shards, now):
+    """Laju, pesan yang dilewati, drop dan koneksi per worker shard"""
+    st.subheader("Ingest Shards")
+    previous_at, previous = st.session_state.get('perf_shards', (now, {}))
+    st.session_state.perf_shards = (now, {row['shard']: row['received'] for row in shards})
+    elapsed = now - previous_at
+    brokers = len(ingest_service.brokers)
+    st.dataframe(
+        pd.DataFrame({
+            "Shard": [row['shard'] for row in shards],
+            "PID": [row['pid'] for row in shards],
+            "Status": ["🟢 Running" if row['alive'] else "🔴 Stopped" for row in shards],
+            "Brokers": [f"{sum(row['connected'])}/{brokers}" for row in shards],
+            "Received": [row['received'] for row in shards],
+            "Msg/s": [(row['received'] - previous.get(row['shard'], row['received'])) / elapsed
+                      if elapsed > 0 else 0.0 for row in shards],
+            "Skipped": [row['skipped'] for row in shards],
+            "Forwarded": [row['forwarded'] for row in shards],
+            "Dropped": [row['dropped'] for row in shards],
+            "Restarts": [row['restarts'] for row in shards]
+        }),
+        use_container_width=True,
+        hide_index=True,
+        column_config={"Msg/s": st.column_config.NumberColumn("Msg/s", format="%.1f")}
+    )
+    if ingest_service.shard_pool.mode == "hash":
+        st.caption("Hash mode: every shard receives all messages and skips devices owned by other shards.")
+
+def micros(seconds):
+    return None if seconds is None else seconds * 1e6
+
+def millis(seconds):
+    return None if seconds is None else seconds * 1000
+
 # ==================== APLIKASI UTAMA ====================
 def main():
     """Fungsi utama aplikasi"""
     
-    # Inisialisasi MQTT
-    if not st.session_state.mqtt_connected:
-        init_mqtt()
+    # Inisialisasi MQTT (event loop ingest berjalan sekali per proses)
+    init_mqtt()
     
     # Proses pesan MQTT yang masuk
     process_mqtt_messages()
@@ -793,39 +1784,34 @@ def main():
     # Title dan tabs
     st.title("📦 J-MAILBOX Monitoring Dashboard")
     
-    # Buat tabs sesuai desain
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+    # Buat tabs sesuai desain; hanya tab yang sedang dibuka yang dirender
+    tabs = st.tabs([
         "📊 Overview",
         "🚚 Delivery Control",
         "📷 Camera",
         "📝 Logs",
         "🚨 Alerts",
-        "⚙️ Configuration"
-    ])
+        "⚙️ Configuration",
+        "📈 Performance"
+    ], key="main_tabs", on_change="rerun")
+    renderers = [
+        render_overview_tab,
+        render_delivery_tab,
+        render_camera_tab,
+        render_logs_tab,
+        render_alerts_tab,
+        render_config_tab,
+        render_performance_tab
+    ]
     
     # Render setiap tab
-    with tab1:
-        render_overview_tab()
-    
-    with tab2:
-        render_delivery_tab()
-    
-    with tab3:
-        render_camera_tab()
-    
-    with tab4:
-        render_logs_tab()
-    
-    with tab5:
-        render_alerts_tab()
-    
-    with tab6:
-        render_config_tab()
+    for tab, render in zip(tabs, renderers):
+        if tab.open is False:
+            continue
+        with tab:
+            timed(render)()
     
-    # Auto-refresh berdasarkan interval
-    if st.session_state.get('auto_refresh', False):
-        time.sleep(st.session_state.get('refresh_interval', 30))
-        st.rerun()
+    record_session_memory()
 
 # ==================== JALANKAN APLIKASI ====================
 if __name__ == "__main__":
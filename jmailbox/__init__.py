@@ -0,0 +1 @@
+"""Komponen inti J-MAILBOX Dashboard (ingest MQTT dan penyimpanan data)."""
@@ -0,0 +1,229 @@
+"""Alert keamanan dalam urutan kedatangan dengan penghitung yang diperbarui per alert."""
+import heapq
+import time
+import uuid
+from collections import OrderedDict, deque
+from operator import itemgetter
+
+import numpy as np
+
+from jmailbox.payments import day_of
+from jmailbox.ratelimit import TokenBucket
+from jmailbox.series import from_epoch_ms
+
+MINUTE_MS = 60 * 1000
+WINDOW_MINUTES = 24 * 60
+SEVERITY_LEVELS = (1, 2, 3)     # LOW, MEDIUM, HIGH (severity >= 3 dianggap HIGH)
+
+
+def severity_level(value):
+    """Severity payload (angka atau teks) sebagai level 1..3"""
+    try:
+        level = int(float(value))
+    except (TypeError, ValueError):
+        level = 1
+    return min(max(level, 1), 3)
+
+
+class AlertStore:
+    """Alert terakhir di ring buffer plus penghitung berjalan
+
+    Jumlah per menit per severity disimpan di array numpy melingkar selebar
+    jendela 24 jam (slot = menit % jendela), sehingga jumlah 24 jam, deret laju
+    dan deteksi lonjakan dihitung dengan operasi vektor berukuran tetap, tidak
+    bergantung pada banyaknya alert.
+
+    Alert yang sama (device, reason, severity) dalam `dedup_window_ms` sejak
+    kemunculan terakhirnya hanya menaikkan `count` alert yang sudah ada. Alert
+    baru per device dibatasi token bucket (`rate` per detik, `burst`); kelebihannya
+    tetap dihitung di penghitung tetapi tidak disimpan. Bucket yang menganggur
+    lebih lama dari waktu isi penuhnya (burst / rate detik) dibuang. `rate` <= 0
+    mematikan batas laju: tidak ada bucket dan tidak ada sapuan.
+    """
+
+    def __init__(self, capacity=10000, window_minutes=WINDOW_MINUTES, dedup_window_ms=60000,
+                 rate=5, burst=20, clock=time.monotonic):
+        self.alerts = deque(maxlen=capacity)
+        self.next_seq = 1
+        self.window_minutes = window_minutes
+        self.dedup_window_ms = dedup_window_ms
+        self.rate = rate
+        self.burst = burst
+        # (device, reason, severity) -> [kemunculan terakhir (ms), alert], urut kemunculan terakhir
+        self._open = OrderedDict()
+        self._buckets = {}
+        self._clock = clock
+        if rate > 0:
+            self._bucket_idle_s = burst / rate
+            self._next_bucket_sweep = clock() + self._bucket_idle_s
+        else:
+            self._bucket_idle_s = self._next_bucket_sweep = None
+        self.deduplicated = 0
+        self.suppressed = {}
+        # Menit epoch yang sedang ditempati tiap slot (-1 = kosong) dan jumlahnya per severity
+        self._minutes = np.full(window_minutes, -1, dtype=np.int64)
+        self._counts = np.zeros((window_minutes, len(SEVERITY_LEVELS)), dtype=np.int64)
+        self.total = 0
+        self.by_day = {}
+        self.by_device = {}
+        self.by_severity = dict.fromkeys(SEVERITY_LEVELS, 0)
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def append(self, timestamp_ms, device_id, reason, severity, message):
+        """Catat satu kemunculan alert dan perbarui semua penghitung
+
+        Mengembalikan (alert, baru): alert yang baru disimpan atau yang digabung,
+        atau (None, False) jika alert baru ditekan oleh batas laju device.
+        """
+        level = severity_level(severity)
+        self._count(timestamp_ms, device_id, level, 1)
+
+        key = (device_id, str(reason), level)
+        self._expire_open(timestamp_ms)
+        entry = self._open.get(key)
+        if entry is not None:
+            entry[0] = timestamp_ms
+            self._open.move_to_end(key)
+            alert = entry[1]
+            alert['count'] += 1
+            alert['last_seen'] = from_epoch_ms(timestamp_ms)
+            alert['message'] = message
+            self.deduplicated += 1
+            return alert, False
+
+        if self.rate > 0 and not self._take_token(device_id):
+            self.suppressed[device_id] = self.suppressed.get(device_id, 0) + 1
+            return None, False
+
+        alert = self._store(timestamp_ms, device_id, reason, severity, message, 1)
+        self._open[key] = [timestamp_ms, alert]
+        return alert, True
+
+    def _take_token(self, device_id):
+        now = self._clock()
+        if now >= self._next_bucket_sweep:
+            self._evict_buckets(now)
+        bucket = self._buckets.get(device_id)
+        if bucket is None:
+            bucket = self._buckets[device_id] = TokenBucket(self.rate, self.burst, self._clock)
+        return bucket.try_take(now)
+
+    def _evict_buckets(self, now):
+        """Buang bucket yang sudah terisi penuh lagi; bucket baru setara dengannya"""
+        idle_since = now - self._bucket_idle_s
+        self._buckets = {device_id: bucket for device_id, bucket in self._buckets.items()
+                         if bucket.updated > idle_since}
+        self._next_bucket_sweep = now + self._bucket_idle_s
+
+    def _store(self, timestamp_ms, device_id, reason, severity, message, count,
+               last_ms=None, group=None):
+        alert = {
+            "seq": self.next_seq,
+            # Kunci baris grup deduplikasi di riwayat
+            "group": group or uuid.uuid4().hex,
+            "timestamp": from_epoch_ms(timestamp_ms),
+            "last_seen": from_epoch_ms(timestamp_ms if last_ms is None else last_ms),
+            "device": device_id,
+            "reason": reason,
+            "severity": severity,
+            "message": message,
+            "count": count
+        }
+        self.next_seq += 1
+        self.alerts.append(alert)
+        return alert
+
+    def _expire_open(self, now_ms):
+        """Tutup grup deduplikasi yang sudah lewat jendela (terlama di depan)"""
+        horizon = now_ms - self.dedup_window_ms
+        open_groups = self._open
+        while open_groups:
+            key, (last_ms, _) = next(iter(open_groups.items()))
+            if last_ms >= horizon:
+                break
+            del open_groups[key]
+
+    def _count(self, timestamp_ms, device_id, level, count):
+        self.total += count
+        day = day_of(timestamp_ms)
+        self.by_day[day] = self.by_day.get(day, 0) + count
+        self.by_device[device_id] = self.by_device.get(device_id, 0) + count
+        self.by_severity[level] += count
+
+        minute = timestamp_ms // MINUTE_MS
+        slot = minute % self.window_minutes
+        occupied = self._minutes[slot]
+        if occupied != minute:
+            # Slot berisi menit yang lebih baru: alert ini sudah di luar jendela
+            if occupied > minute:
+                return
+            self._minutes[slot] = minute
+            self._counts[slot] = 0
+        self._counts[slot, level - 1] += count
+
+    # ==================== RIWAYAT ====================
+    def restore_alerts(self, rows):
+        """Isi alert terakhir dari riwayat tanpa mengubah penghitung (dipulihkan terpisah)
+
+        Grup deduplikasi dibuka lagi sehingga kemunculan berikutnya dalam
+        jendela deduplikasi menambah baris yang sama, bukan membuat alert baru.
+        Alert disimpan menurut urutan baris, tetapi grup dibuka menurut
+        kemunculan terakhir karena _expire_open() menganggap yang terlama di depan.
+        """
+        reopened = []
+        for ts, device, reason, severity, message, count, last_ts, group in rows:
+            last_ts = ts if last_ts is None else last_ts
+            alert = self._store(ts, device, reason, severity, message, count, last_ts, group)
+            reopened.append((last_ts, alert['seq'], (device, str(reason), severity_level(severity)), alert))
+        reopened.sort(key=lambda item: item[:2])
+        for last_ts, _, key, alert in reopened:
+            self._open[key] = [last_ts, alert]
+            self._open.move_to_end(key)
+
+    def restore_suppressed(self, rows):
+        """Pulihkan jumlah alert yang ditekan per device: (device, jumlah)"""
+        for device_id, count in rows:
+            self.suppressed[device_id] = self.suppressed.get(device_id, 0) + count
+
+    def restore_counts(self, rows):
+        """Pulihkan penghitung dari agregat SQL: (menit, device, severity, jumlah)"""
+        for minute, device_id, severity, count in rows:
+            self._count(minute * MINUTE_MS, device_id, severity_level(severity), count)
+
+    # ==================== PEMBACAAN ====================
+    def recent(self, limit=20):
+        """Alert terbaru dulu (urutan kedatangan, tanpa sort)"""
+        return [self.alerts[-i] for i in range(1, min(limit, len(self.alerts)) + 1)]
+
+    def window_counts(self, now_ms, minutes=None):
+        """Jumlah alert per severity dalam `minutes` menit terakhir (default seluruh jendela)"""
+        minutes = min(minutes or self.window_minutes, self.window_minutes)
+        current = now_ms // MINUTE_MS
+        mask = (self._minutes > current - minutes) & (self._minutes <= current)
+        counts = self._counts[mask].sum(axis=0).tolist()
+        return dict(zip(SEVERITY_LEVELS, counts))
+
+    def today(self, now_ms):
+        return self.by_day.get(day_of(now_ms), 0)
+
+    def top_devices(self, n=5):
+        """n device dengan alert terbanyak (heap, tanpa sort seluruh device)"""
+        return heapq.nlargest(n, self.by_device.items(), key=itemgetter(1))
+
+    def rate_series(self, now_ms, minutes=60, threshold=3.0, min_count=5):
+        """Deret jumlah alert per menit untuk `minutes` menit terakhir beserta tanda lonjakan
+
+        Menit dianggap lonjakan jika jumlahnya minimal `min_count` dan di atas
+        rata-rata + threshold x simpangan baku seluruh jendela 24 jam.
+        Mengembalikan (menit epoch, jumlah, lonjakan) sebagai array numpy.
+        """
+        current = now_ms // MINUTE_MS
+        window = np.arange(current - self.window_minutes + 1, current + 1, dtype=np.int64)
+        slots = window % self.window_minutes
+        totals = np.where(self._minutes[slots] == window, self._counts[slots].sum(axis=1), 0)
+        limit = max(min_count, totals.mean() + threshold * totals.std())
+        minutes = min(minutes, self.window_minutes)
+        series = totals[-minutes:]
+        return window[-minutes:], series, series >= limit
@@ -0,0 +1,219 @@
+"""Arsip foto content-addressed (sha256) dengan indeks SQLite dan cache thumbnail."""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from jmailbox.camera import make_thumbnail
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    thumb_size INTEGER NOT NULL,
+    refs INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS photos (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    device TEXT NOT NULL,
+    resi TEXT,
+    ts INTEGER NOT NULL,
+    purpose TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_photos_ts ON photos (ts, id);
+CREATE INDEX IF NOT EXISTS idx_photos_device ON photos (device, ts, id);
+CREATE INDEX IF NOT EXISTS idx_photos_resi ON photos (resi, ts, id);
+"""
+
+
+class SnapshotArchive:
+    """Arsip foto di disk: satu file per isi (deduplikasi hash), dibatasi total ukuran
+
+    File disimpan di <root>/objects/<2 hex>/<hash>.jpg dengan thumbnail yang dibuat
+    saat foto masuk di <root>/thumbs/. Thumbnail yang sering dibuka disimpan di
+    LRU memori sehingga galeri tidak pernah mendekode JPEG ukuran penuh.
+    """
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024, thumbnail_cache_size=500,
+                 thumbnail_size=(160, 120)):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        self.thumbnail_cache_size = thumbnail_cache_size
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "thumbs"), exist_ok=True)
+
+        path = os.path.join(root, "index.db")
+        self._write_conn = self._connect(path)
+        self._write_conn.executescript(SCHEMA)
+        self._read_conn = self._connect(path)
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+
+        self._thumbnails = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.total_bytes = self._write_conn.execute(
+            "SELECT COALESCE(SUM(size + thumb_size), 0) FROM blobs").fetchone()[0]
+
+    @staticmethod
+    def _connect(path):
+        """Buka koneksi SQLite dalam mode WAL"""
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def close(self):
+        self._write_conn.close()
+        self._read_conn.close()
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest + ".jpg")
+
+    def _thumbnail_path(self, digest):
+        return os.path.join(self.root, "thumbs", digest + ".jpg")
+
+    @staticmethod
+    def _write_file(path, data):
+        """Tulis file secara atomik (tmp lalu rename)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    # ==================== PENULISAN ====================
+    def add(self, device_id, data, timestamp_ms, resi=None, purpose=None):
+        """Simpan satu foto; isi yang sama hanya disimpan sekali. Mengembalikan hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._write_lock:
+            conn = self._write_conn
+            known = conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            thumb = None
+            if known is None:
+                thumb = make_thumbnail(data, self.thumbnail_size) or b''
+                self._write_file(self._object_path(digest), data)
+                if thumb:
+                    self._write_file(self._thumbnail_path(digest), thumb)
+
+            conn.execute("BEGIN")
+            try:
+                if known is None:
+                    conn.execute("INSERT INTO blobs VALUES (?, ?, ?, 1)", (digest, len(data), len(thumb)))
+                else:
+                    conn.execute("UPDATE blobs SET refs = refs + 1 WHERE hash = ?", (digest,))
+                conn.execute(
+                    "INSERT INTO photos (hash, device, resi, ts, purpose) VALUES (?, ?, ?, ?, ?)",
+                    (digest, device_id, resi, timestamp_ms, purpose))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            if known is None:
+                self.total_bytes += len(data) + len(thumb)
+                if thumb:
+                    self._cache_thumbnail(digest, thumb)
+                if self.total_bytes > self.max_bytes:
+                    self._evict()
+        return digest
+
+    def _evict(self, batch=64):
+        """Hapus foto terlama sampai total ukuran kembali di bawah batas"""
+        conn = self._write_conn
+        while self.total_bytes > self.max_bytes:
+            rows = conn.execute("SELECT id, hash FROM photos ORDER BY ts, id LIMIT ?", (batch,)).fetchall()
+            if not rows:
+                break
+            conn.execute("BEGIN")
+            freed = []
+            for photo_id, digest in rows:
+                conn.execute("DELETE FROM photos WHERE id = ?", (photo_id,))
+                conn.execute("UPDATE blobs SET refs = refs - 1 WHERE hash = ?", (digest,))
+                refs, size, thumb_size = conn.execute(
+                    "SELECT refs, size, thumb_size FROM blobs WHERE hash = ?", (digest,)).fetchone()
+                if refs <= 0:
+                    conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+                    freed.append(digest)
+                    self.total_bytes -= size + thumb_size
+                    if self.total_bytes <= self.max_bytes:
+                        break
+            conn.execute("COMMIT")
+
+            for digest in freed:
+                for path in (self._object_path(digest), self._thumbnail_path(digest)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                with self._cache_lock:
+                    self._thumbnails.pop(digest, None)
+
+    # ==================== PEMBACAAN ====================
+    def query(self, device_id=None, resi=None, before=None, limit=24):
+        """Foto terbaru yang cocok filter, mundur dari cursor (ts, id) `before`
+
+        Mengembalikan (list dict foto, cursor halaman berikutnya atau None).
+        """
+        clauses, params = [], []
+        if device_id:
+            clauses.append("device = ?")
+            params.append(device_id)
+        if resi:
+            clauses.append("resi = ?")
+            params.append(resi)
+        if before is not None:
+            clauses.append("(ts, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                f"SELECT id, hash, device, resi, ts, purpose FROM photos {where} "
+                "ORDER BY ts DESC, id DESC LIMIT ?", params + [limit]).fetchall()
+        photos = [
+            {'id': photo_id, 'hash': digest, 'device': device, 'resi': resi,
+             'timestamp': ts, 'purpose': purpose}
+            for photo_id, digest, device, resi, ts, purpose in rows
+        ]
+        cursor = (rows[-1][4], rows[-1][0]) if len(rows) == limit else None
+        return photos, cursor
+
+    def stats(self):
+        """Jumlah foto, jumlah isi unik dan total byte di disk"""
+        with self._read_lock:
+            photos = self._read_conn.execute("SELECT COUNT(*) FROM photos").fetchone()[0]
+            blobs = self._read_conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        return {'photos': photos, 'unique': blobs, 'bytes': self.total_bytes, 'max_bytes': self.max_bytes}
+
+    def image(self, digest):
+        """Isi JPEG penuh, atau None jika sudah dihapus"""
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def thumbnail(self, digest):
+        """Thumbnail dari LRU memori, atau dari disk lalu dimasukkan ke LRU"""
+        with self._cache_lock:
+            thumb = self._thumbnails.get(digest)
+            if thumb is not None:
+                self._thumbnails.move_to_end(digest)
+                return thumb
+        try:
+            with open(self._thumbnail_path(digest), "rb") as f:
+                thumb = f.read()
+        except FileNotFoundError:
+            return None
+        self._cache_thumbnail(digest, thumb)
+        return thumb
+
+    def _cache_thumbnail(self, digest, thumb):
+        with self._cache_lock:
+            self._thumbnails[digest] = thumb
+            self._thumbnails.move_to_end(digest)
+            while len(self._thumbnails) > self.thumbnail_cache_size:
+                self._thumbnails.popitem(last=False)
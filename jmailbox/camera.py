@@ -0,0 +1,177 @@
+"""Pipeline frame kamera: JPEG mentah atau terpotong (chunk) di topik jmailbox/+/camera."""
+import io
+import struct
+import threading
+from collections import deque
+
+from PIL import Image
+
+# Header chunk: magic, frame_id, indeks chunk, jumlah chunk, flags (little-endian)
+FRAME_HEADER = struct.Struct('<4sIHHB')
+FRAME_MAGIC = b'JMC1'
+JPEG_SOI = b'\xff\xd8'
+FLAG_CAPTURE = 0x01     # Frame hasil perintah capture (JPEG mentah: lihat IngestService._add_frame)
+MAX_FRAME_PIXELS = 4096 * 4096  # Frame lebih besar tidak didekode untuk thumbnail
+
+
+def is_frame_payload(payload):
+    """True jika payload adalah frame biner (JPEG atau chunk JMC1), bukan JSON"""
+    return payload[:4] == FRAME_MAGIC or payload[:2] == JPEG_SOI
+
+
+def frame_chunks(frame_id, data, chunk_size=4096, capture=False):
+    """Potong JPEG menjadi payload chunk JMC1 (format yang disusun FrameAssembler)"""
+    count = max(1, -(-len(data) // chunk_size))
+    flags = FLAG_CAPTURE if capture else 0
+    return [
+        FRAME_HEADER.pack(FRAME_MAGIC, frame_id, index, count, flags)
+        + data[index * chunk_size:(index + 1) * chunk_size]
+        for index in range(count)
+    ]
+
+
+def make_frame(device_id, frame_id, timestamp_ms, data, capture=False):
+    """Dict frame yang disimpan di ring kamera"""
+    return {
+        'device': device_id,
+        'frame_id': frame_id,
+        'timestamp': timestamp_ms,
+        'data': data,
+        'size': len(data),
+        'capture': capture,
+        'thumbnail': None
+    }
+
+
+class FrameAssembler:
+    """Menyusun frame dari chunk; hanya dipakai oleh thread jaringan MQTT
+
+    Chunk disimpan sebagai memoryview atas payload asli dan disalin tepat satu
+    kali saat frame lengkap.
+    """
+
+    def __init__(self, max_pending=8, timeout_ms=5000, max_frame_bytes=2 * 1024 * 1024):
+        self.max_pending = max_pending
+        self.timeout_ms = timeout_ms
+        self.max_frame_bytes = max_frame_bytes
+        self._pending = {}
+        self.incomplete = 0
+
+    def feed(self, device_id, payload, timestamp_ms):
+        """Masukkan satu payload; kembalikan frame jika sudah lengkap, selain itu None
+
+        ValueError jika header chunk tidak valid.
+        """
+        if payload[:2] == JPEG_SOI:
+            return make_frame(device_id, None, timestamp_ms, bytes(payload))
+
+        if len(payload) < FRAME_HEADER.size:
+            raise ValueError("Camera chunk shorter than header")
+        _, frame_id, index, count, flags = FRAME_HEADER.unpack_from(payload)
+        if count == 0 or index >= count:
+            raise ValueError(f"Invalid camera chunk {index}/{count}")
+        chunk = memoryview(payload)[FRAME_HEADER.size:]
+        capture = bool(flags & FLAG_CAPTURE)
+        if count == 1:
+            return make_frame(device_id, frame_id, timestamp_ms, bytes(chunk), capture)
+
+        key = (device_id, frame_id)
+        pending = self._pending.get(key)
+        if pending is None:
+            self._expire(timestamp_ms)
+            pending = self._pending[key] = {
+                'started': timestamp_ms,
+                'chunks': [None] * count,
+                'received': 0,
+                'size': 0
+            }
+        elif len(pending['chunks']) != count:
+            del self._pending[key]
+            self.incomplete += 1
+            raise ValueError(f"Camera frame {frame_id} changed chunk count")
+
+        chunks = pending['chunks']
+        if chunks[index] is None:
+            pending['received'] += 1
+            pending['size'] += len(chunk)
+        chunks[index] = chunk
+        if pending['size'] > self.max_frame_bytes:
+            del self._pending[key]
+            self.incomplete += 1
+            raise ValueError(f"Camera frame {frame_id} exceeds {self.max_frame_bytes} bytes")
+
+        if pending['received'] < count:
+            return None
+        del self._pending[key]
+        return make_frame(device_id, frame_id, timestamp_ms, b''.join(chunks), capture)
+
+    def _expire(self, timestamp_ms):
+        """Buang frame yang tidak lengkap karena terlalu lama atau antrean penuh"""
+        pending = self._pending
+        for key in list(pending):
+            if len(pending) < self.max_pending and timestamp_ms - pending[key]['started'] < self.timeout_ms:
+                break
+            del pending[key]
+            self.incomplete += 1
+
+
+class CameraStore:
+    """Ring frame terbaru per kamera, dibagi ke semua sesi"""
+
+    def __init__(self, frames_per_camera=8):
+        self.frames_per_camera = frames_per_camera
+        self._frames = {}
+        self._lock = threading.Lock()
+        self.received = 0
+        self.bytes_received = 0
+
+    def add(self, frame):
+        with self._lock:
+            ring = self._frames.get(frame['device'])
+            if ring is None:
+                ring = self._frames[frame['device']] = deque(maxlen=self.frames_per_camera)
+            ring.append(frame)
+            self.received += 1
+            self.bytes_received += frame['size']
+
+    def latest(self, device_id):
+        """Frame terbaru satu kamera, atau None"""
+        with self._lock:
+            ring = self._frames.get(device_id)
+            return ring[-1] if ring else None
+
+    def frames(self, device_id):
+        """Semua frame di ring satu kamera, terbaru dulu"""
+        with self._lock:
+            return list(reversed(self._frames.get(device_id, ())))
+
+    def remove(self, device_id):
+        with self._lock:
+            self._frames.pop(device_id, None)
+
+
+def make_thumbnail(data, size=(160, 120), max_pixels=MAX_FRAME_PIXELS):
+    """JPEG kecil dari data JPEG penuh, atau None jika gambar tidak bisa didekode
+
+    Ukuran dibaca dari header sebelum dekode; frame di atas `max_pixels`
+    (mis. bom dekompresi dari device yang disusupi) ditolak tanpa dialokasikan.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            if width * height > max_pixels:
+                return None
+            image.thumbnail(size)
+            output = io.BytesIO()
+            image.convert('RGB').save(output, format='JPEG', quality=70)
+        return output.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def thumbnail(frame, size=(160, 120)):
+    """Thumbnail frame untuk galeri; dibuat sekali per frame lalu disimpan di frame itu"""
+    if frame['thumbnail'] is None:
+        # Frame rusak ditandai b'' agar tidak didekode ulang
+        frame['thumbnail'] = make_thumbnail(frame['data'], size) or b''
+    return frame['thumbnail'] or None
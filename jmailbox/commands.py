@@ -0,0 +1,136 @@
+"""Perintah ke device dengan correlation ID, timeout/retry dan statistik latensi."""
+import uuid
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# Key di payload balasan device (status/log) yang membawa correlation ID
+REPLY_ID_KEYS = ("cmd_id", "correlation_id")
+# Nilai "result"/"status" balasan yang berarti perintah gagal dijalankan
+FAILED_RESULTS = frozenset({"error", "failed", "rejected"})
+
+
+def new_command_id():
+    """Correlation ID pendek dan unik"""
+    return uuid.uuid4().hex[:12]
+
+
+def reply_id(data):
+    """Correlation ID dari payload balasan, atau None"""
+    for key in REPLY_ID_KEYS:
+        value = data.get(key)
+        if value:
+            return str(value)
+    return None
+
+
+class CommandTracker:
+    """Tabel perintah yang menunggu balasan, diurutkan menurut deadline
+
+    Semua perintah memakai timeout yang sama, sehingga urutan masuk tabel juga
+    urutan deadline dan pemeriksaan timeout cukup melihat entri terdepan.
+    """
+
+    def __init__(self, timeout_ms=5000, max_retries=2, latency_window=1000, history_size=200):
+        self.timeout_ms = timeout_ms
+        self.max_retries = max_retries
+        self.latency_window = latency_window
+        self.pending = OrderedDict()
+        self.recent = deque(maxlen=history_size)
+        # (device, command) -> deque latensi (ms) dan penghitung hasil
+        self._latencies = {}
+        self._counts = {}
+        # id batch perintah massal -> penghitung hasil
+        self.job_counts = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def register(self, command_id, device_id, command, payload, sent_ms, job=None):
+        """Catat perintah yang baru dikirim, opsional sebagai bagian dari batch `job`"""
+        self.pending[command_id] = {
+            'job': job,
+            'id': command_id,
+            'device': device_id,
+            'command': command,
+            'payload': payload,
+            'first_sent': sent_ms,
+            'sent': sent_ms,
+            'attempts': 1,
+            'deadline': sent_ms + self.timeout_ms
+        }
+
+    def match(self, data, timestamp_ms):
+        """Cocokkan balasan device dengan perintah yang menunggu; kembalikan entri selesai atau None"""
+        command_id = reply_id(data)
+        if command_id is None:
+            return None
+        entry = self.pending.pop(command_id, None)
+        if entry is None:
+            return None
+        result = str(data.get('result', data.get('status', 'ok'))).lower()
+        status = 'failed' if result in FAILED_RESULTS else 'acked'
+        # Latensi dihitung dari pengiriman terakhir (retry sebelumnya dianggap hilang)
+        latency = max(0, timestamp_ms - entry['sent'])
+        key = (entry['device'], entry['command'])
+        window = self._latencies.get(key)
+        if window is None:
+            window = self._latencies[key] = deque(maxlen=self.latency_window)
+        window.append(latency)
+        self._finish(entry, status, timestamp_ms, latency)
+        return entry
+
+    def expire(self, now_ms):
+        """Proses perintah yang melewati deadline
+
+        Mengembalikan (retry, timed_out): entri yang harus dikirim ulang dan
+        entri yang sudah menyerah.
+        """
+        retry, timed_out = [], []
+        pending = self.pending
+        while pending:
+            command_id, entry = next(iter(pending.items()))
+            if entry['deadline'] > now_ms:
+                break
+            del pending[command_id]
+            if entry['attempts'] <= self.max_retries:
+                entry['attempts'] += 1
+                entry['sent'] = now_ms
+                entry['deadline'] = now_ms + self.timeout_ms
+                pending[command_id] = entry
+                retry.append(entry)
+            else:
+                self._finish(entry, 'timeout', now_ms, None)
+                timed_out.append(entry)
+        return retry, timed_out
+
+    def _finish(self, entry, status, finished_ms, latency):
+        entry['status'] = status
+        entry['finished'] = finished_ms
+        entry['latency'] = latency
+        self.recent.append(entry)
+        counts = self._counts.get((entry['device'], entry['command']))
+        if counts is None:
+            counts = self._counts[(entry['device'], entry['command'])] = {'acked': 0, 'failed': 0, 'timeout': 0}
+        counts[status] += 1
+        if entry['job'] is not None:
+            job_counts = self.job_counts.setdefault(entry['job'], {'acked': 0, 'failed': 0, 'timeout': 0})
+            job_counts[status] += 1
+
+    def job_stats(self, job):
+        """Penghitung hasil (acked/failed/timeout) satu batch"""
+        return dict(self.job_counts.get(job, {'acked': 0, 'failed': 0, 'timeout': 0}))
+
+    def latency_stats(self):
+        """Persentil latensi round-trip per (device, command) dari jendela terakhir"""
+        stats = []
+        for key, counts in self._counts.items():
+            window = self._latencies.get(key)
+            if window:
+                p50, p95, p99 = np.percentile(np.fromiter(window, dtype=np.float64, count=len(window)),
+                                              (50, 95, 99)).tolist()
+            else:
+                p50 = p95 = p99 = None
+            stats.append(dict(counts, device=key[0], command=key[1], p50=p50, p95=p95, p99=p99))
+        stats.sort(key=lambda row: (row['device'], row['command']))
+        return stats
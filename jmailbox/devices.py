@@ -0,0 +1,217 @@
+"""Registry device dengan indeks tipe/kemampuan/liveness dan timer transisi status."""
+import heapq
+
+from jmailbox.series import from_epoch_ms, now_ms
+
+ONLINE_SECONDS = 30     # Tanpa pesan lebih lama dari ini device dianggap idle
+IDLE_SECONDS = 120      # Tanpa pesan lebih lama dari ini device dianggap offline
+LIVENESS_STATES = ("online", "idle", "offline")
+
+# Kemampuan default per tipe jika payload status tidak menyebutkan "capabilities"
+TYPE_CAPABILITIES = {
+    "ESP32": ("delivery", "payment", "door"),
+    "ESP32-CAM": ("camera",),
+}
+
+
+def guess_type(device_id):
+    """Tebakan tipe dari nama device, dipakai sampai device mengirim status dengan "type" """
+    return 'ESP32-CAM' if 'cam' in device_id else 'ESP32'
+
+
+class DeviceRegistry:
+    """Daftar device beserta indeks tipe, kemampuan dan liveness
+
+    Setiap indeks adalah dict berurutan (dipakai sebagai ordered set) sehingga
+    pencarian device pertama dengan suatu peran O(1). Transisi online -> idle ->
+    offline dijadwalkan di min-heap berisi paling banyak satu timer per device.
+    """
+
+    def __init__(self, online_seconds=ONLINE_SECONDS, idle_seconds=IDLE_SECONDS):
+        self.online_ms = online_seconds * 1000
+        self.idle_ms = idle_seconds * 1000
+        self.devices = {}
+        self._last_seen_ms = {}
+        self._by_type = {}
+        self._by_capability = {}
+        self._by_tag = {}
+        self._by_liveness = {state: {} for state in LIVENESS_STATES}
+        self._timers = []
+        # Deadline timer aktif per device; entri heap lain untuk device itu sudah basi
+        self._armed = {}
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __contains__(self, device_id):
+        return device_id in self.devices
+
+    def get(self, device_id):
+        return self.devices.get(device_id)
+
+    # ==================== PEMBARUAN ====================
+    def touch(self, device_id, timestamp_ms, data=None):
+        """Catat pesan dari device: perbarui last_seen dan status, device kembali online"""
+        device = self.devices.get(device_id)
+        if device is None:
+            device = self.devices[device_id] = {
+                'id': device_id,
+                'type': None,
+                'capabilities': (),
+                'tags': (),
+                'liveness': None,
+                'last_seen': None,
+                'status': {}
+            }
+            self._set_type(device, guess_type(device_id), None)
+
+        if timestamp_ms >= self._last_seen_ms.get(device_id, timestamp_ms):
+            self._last_seen_ms[device_id] = timestamp_ms
+            device['last_seen'] = from_epoch_ms(timestamp_ms)
+        if data:
+            device['status'].update(data)
+        self._set_liveness(device, "online")
+        self._arm(device_id, self._last_seen_ms[device_id] + self.online_ms)
+        return device
+
+    def announce(self, device_id, status):
+        """Terapkan tipe, kemampuan dan tag eksplisit dari payload status device"""
+        device = self.devices[device_id]
+        device_type = status.get('type')
+        if not isinstance(device_type, str) or not device_type:
+            device_type = device['type']
+        capabilities = status.get('capabilities')
+        if isinstance(capabilities, str):
+            capabilities = [capabilities]
+        if not isinstance(capabilities, (list, tuple)):
+            capabilities = None
+        self._set_type(device, device_type, capabilities)
+
+        tags = status.get('tags')
+        if isinstance(tags, str):
+            tags = [tags]
+        if isinstance(tags, (list, tuple)):
+            self._reindex(self._by_tag, device, 'tags', tuple(dict.fromkeys(str(t) for t in tags)))
+
+    def remove(self, device_id):
+        """Hapus device dari registry dan semua indeks; False jika tidak ada"""
+        device = self.devices.pop(device_id, None)
+        if device is None:
+            return False
+        self._by_type[device['type']].pop(device_id, None)
+        for capability in device['capabilities']:
+            self._by_capability[capability].pop(device_id, None)
+        for tag in device['tags']:
+            self._by_tag[tag].pop(device_id, None)
+        self._by_liveness[device['liveness']].pop(device_id, None)
+        self._last_seen_ms.pop(device_id, None)
+        # Timer yang tersisa di heap diabaikan saat jatuh tempo
+        self._armed.pop(device_id, None)
+        return True
+
+    def advance(self, current_ms=None):
+        """Jalankan timer yang sudah jatuh tempo; kembalikan list (device_id, lama, baru)"""
+        current_ms = now_ms() if current_ms is None else current_ms
+        timers = self._timers
+        transitions = []
+        while timers and timers[0][0] <= current_ms:
+            deadline_ms, device_id = heapq.heappop(timers)
+            if self._armed.get(device_id) != deadline_ms:
+                continue
+            del self._armed[device_id]
+            device = self.devices[device_id]
+            elapsed = current_ms - self._last_seen_ms[device_id]
+            if elapsed < self.online_ms:
+                state, deadline = "online", self.online_ms
+            elif elapsed < self.idle_ms:
+                state, deadline = "idle", self.idle_ms
+            else:
+                state, deadline = "offline", None
+            old = device['liveness']
+            if state != old:
+                self._set_liveness(device, state)
+                transitions.append((device_id, old, state))
+            if deadline is not None:
+                self._arm(device_id, self._last_seen_ms[device_id] + deadline)
+        return transitions
+
+    # ==================== PENCARIAN ====================
+    def first(self, capability):
+        """Device pertama yang memiliki kemampuan tertentu, atau None"""
+        return next(iter(self._by_capability.get(capability, ())), None)
+
+    def with_capability(self, capability):
+        return list(self._by_capability.get(capability, ()))
+
+    def of_type(self, device_type):
+        return list(self._by_type.get(device_type, ()))
+
+    def with_liveness(self, state):
+        return list(self._by_liveness[state])
+
+    def select(self, types=None, liveness=None, tags=None):
+        """Device yang cocok semua filter (masing-masing None = semua), urut kedatangan
+
+        Setiap filter adalah gabungan id dari indeksnya; hasilnya irisan filter-filter itu.
+        """
+        selected = None
+        for index, keys in ((self._by_type, types), (self._by_liveness, liveness), (self._by_tag, tags)):
+            if keys is None:
+                continue
+            ids = set()
+            for key in keys:
+                ids.update(index.get(key, ()))
+            selected = ids if selected is None else selected & ids
+        if selected is None:
+            return list(self.devices)
+        return [device_id for device_id in self.devices if device_id in selected]
+
+    def index_snapshot(self):
+        """Salinan semua indeks sebagai dict list id, untuk snapshot sesi"""
+        return {
+            'type': {key: list(ids) for key, ids in self._by_type.items() if ids},
+            'capability': {key: list(ids) for key, ids in self._by_capability.items() if ids},
+            'tag': {key: list(ids) for key, ids in self._by_tag.items() if ids},
+            'liveness': {key: list(ids) for key, ids in self._by_liveness.items()}
+        }
+
+    # ==================== INDEKS ====================
+    def _arm(self, device_id, deadline_ms):
+        """Jadwalkan timer jika device belum punya timer aktif"""
+        if device_id not in self._armed:
+            self._armed[device_id] = deadline_ms
+            heapq.heappush(self._timers, (deadline_ms, device_id))
+
+    def _set_liveness(self, device, state):
+        old = device['liveness']
+        if old == state:
+            return
+        if old is not None:
+            self._by_liveness[old].pop(device['id'], None)
+        self._by_liveness[state][device['id']] = None
+        device['liveness'] = state
+
+    def _set_type(self, device, device_type, capabilities):
+        device_id = device['id']
+        if device_type != device['type']:
+            if device['type'] is not None:
+                self._by_type[device['type']].pop(device_id, None)
+            self._by_type.setdefault(device_type, {})[device_id] = None
+            device['type'] = device_type
+
+        if capabilities is None:
+            capabilities = TYPE_CAPABILITIES.get(device_type, ())
+        self._reindex(self._by_capability, device, 'capabilities',
+                      tuple(dict.fromkeys(str(c) for c in capabilities)))
+
+    @staticmethod
+    def _reindex(index, device, field, values):
+        """Ganti nilai multi-key device (kemampuan/tag) beserta indeksnya"""
+        if values == device[field]:
+            return
+        device_id = device['id']
+        for value in device[field]:
+            index[value].pop(device_id, None)
+        for value in values:
+            index.setdefault(value, {})[device_id] = None
+        device[field] = values
@@ -0,0 +1,231 @@
+"""Ekspor riwayat SQLite secara streaming per chunk: CSV gzip, NDJSON gzip atau Parquet.
+
+Parquet butuh paket pyarrow; tanpa pyarrow format itu tidak ditawarkan.
+"""
+import csv
+import io
+import json
+import tempfile
+import zlib
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from jmailbox.history import EXPORTS
+from jmailbox.series import from_epoch_ms, to_epoch_ms
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Format -> MIME type
+FORMATS = {
+    'csv.gz': "application/gzip",
+    'ndjson.gz': "application/gzip",
+    'parquet': "application/vnd.apache.parquet",
+}
+CHUNK_ROWS = 5000       # Baris per query SQLite dan per row group Parquet
+GZIP_LEVEL = 6
+
+
+def formats():
+    """Format yang bisa dipakai di instalasi ini"""
+    return [fmt for fmt in FORMATS if fmt != 'parquet' or pa is not None]
+
+
+def export_filename(dataset, fmt, start_ms=None, end_ms=None):
+    """Nama file ekspor, mis. jmailbox_logs_20240101-20240131.csv.gz"""
+    span = ""
+    if start_ms is not None and end_ms is not None:
+        # end_ms eksklusif: hari terakhir yang tercakup adalah sehari sebelumnya
+        span = f"_{from_epoch_ms(start_ms):%Y%m%d}-{from_epoch_ms(end_ms - 1):%Y%m%d}"
+    return f"jmailbox_{dataset}{span}.{fmt}"
+
+
+# ==================== ENCODER ====================
+def _time_text(timestamp_ms):
+    return None if timestamp_ms is None else from_epoch_ms(timestamp_ms).isoformat(timespec='milliseconds')
+
+
+def _text_rows(columns, chunks):
+    """Chunk baris dengan kolom waktu (epoch ms) diubah ke ISO 8601 waktu lokal"""
+    times = [i for i, (_, _, kind) in enumerate(columns) if kind == 'time']
+    for rows in chunks:
+        if times:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i in times:
+                    row[i] = _time_text(row[i])
+        yield rows
+
+
+def _csv_text(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow([name for name, _, _ in columns])
+    for rows in _text_rows(columns, chunks):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_text(columns, chunks):
+    names = [name for name, _, _ in columns]
+    for rows in _text_rows(columns, chunks):
+        if orjson is not None:
+            lines = [orjson.dumps(dict(zip(names, row))).decode() for row in rows]
+        else:
+            lines = [json.dumps(dict(zip(names, row)), ensure_ascii=False) for row in rows]
+        yield "\n".join(lines) + "\n"
+
+
+def _gzip(text_blocks):
+    """Kompres blok teks menjadi satu stream gzip tanpa menampung seluruh isi"""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for text in text_blocks:
+        data = compressor.compress(text.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _BlockSink(io.RawIOBase):
+    """File tujuan ParquetWriter yang menampung byte sampai diambil take()
+
+    Posisi (tell) tetap dihitung dari awal file karena footer Parquet
+    menyimpan offset absolut setiap row group.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet_schema(columns):
+    types = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string(), 'time': pa.timestamp('ms')}
+    return pa.schema([(name, types[kind]) for name, _, kind in columns])
+
+
+def _parquet_blocks(columns, chunks):
+    """Satu row group per chunk; byte yang sudah ditulis langsung diteruskan"""
+    if pa is None:
+        raise ValueError("Parquet export requires pyarrow")
+    schema = _parquet_schema(columns)
+    sink = _BlockSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in chunks:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+# ==================== EKSPOR ====================
+def export_stream(history, dataset, fmt, start_ms=None, end_ms=None, filters=None,
+                  chunk_rows=CHUNK_ROWS, stats=None):
+    """Blok bytes file ekspor satu dataset; memori dibatasi satu chunk baris
+
+    stats (dict, opsional) diisi jumlah baris 'rows' selama stream berjalan.
+    """
+    if dataset not in EXPORTS:
+        raise ValueError(f"Unknown dataset '{dataset}'")
+    if fmt not in formats():
+        raise ValueError(f"Unsupported export format '{fmt}'")
+    # Filter diperiksa sekarang, bukan saat chunk pertama dibaca (setelah header HTTP terkirim)
+    for name in filters or {}:
+        if name not in EXPORTS[dataset]['filters']:
+            raise ValueError(f"Unknown filter '{name}' for {dataset}")
+    columns = EXPORTS[dataset]['columns']
+    if stats is None:
+        stats = {}
+    stats['rows'] = 0
+
+    def chunks():
+        for rows in history.export_rows(dataset, start_ms, end_ms, filters, chunk_rows):
+            stats['rows'] += len(rows)
+            yield rows
+
+    if fmt == 'parquet':
+        return _parquet_blocks(columns, chunks())
+    text = _csv_text if fmt == 'csv.gz' else _ndjson_text
+    return _gzip(text(columns, chunks()))
+
+
+def write_export(history, dataset, fmt, fileobj, start_ms=None, end_ms=None, filters=None,
+                 chunk_rows=CHUNK_ROWS):
+    """Tulis ekspor ke file biner yang sudah terbuka; kembalikan jumlah baris"""
+    stats = {}
+    for block in export_stream(history, dataset, fmt, start_ms, end_ms, filters, chunk_rows, stats):
+        fileobj.write(block)
+    return stats['rows']
+
+
+def export_file(history, dataset, fmt, start_ms=None, end_ms=None, filters=None):
+    """Ekspor ke file sementara di disk (dihapus saat ditutup), posisi di awal file"""
+    fileobj = tempfile.TemporaryFile()
+    write_export(history, dataset, fmt, fileobj, start_ms, end_ms, filters)
+    fileobj.seek(0)
+    return fileobj
+
+
+def http_export(history, query):
+    """Route GET /export endpoint lokal: (header, blok bytes) dari parameter query
+
+    Parameter: dataset, format, start/end (tanggal ISO atau epoch ms; end
+    eksklusif) dan filter berulang device, level, metric, status.
+    """
+    params = parse_qs(query)
+    dataset = params.get('dataset', ['logs'])[0]
+    fmt = params.get('format', ['csv.gz'])[0]
+    start_ms = _query_time(params.get('start', [None])[0])
+    end_ms = _query_time(params.get('end', [None])[0])
+    filters = {}
+    for name, param in (('devices', 'device'), ('levels', 'level'), ('metrics', 'metric'),
+                        ('statuses', 'status')):
+        if param in params:
+            filters[name] = params[param]
+    blocks = export_stream(history, dataset, fmt, start_ms, end_ms, filters)
+    headers = {
+        "Content-Type": FORMATS[fmt],
+        "Content-Disposition": f'attachment; filename="{export_filename(dataset, fmt, start_ms, end_ms)}"'
+    }
+    return headers, blocks
+
+
+def _query_time(value):
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        return to_epoch_ms(datetime.fromisoformat(value))
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}'") from None
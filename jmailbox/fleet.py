@@ -0,0 +1,86 @@
+"""Perintah massal ke banyak device: publish berurutan dengan pembatas laju di thread latar."""
+import itertools
+import threading
+import time
+
+from jmailbox.ratelimit import TokenBucket
+from jmailbox.series import now_ms
+
+
+class FleetDispatcher:
+    """Menjalankan batch perintah (job) tanpa memblokir thread UI Streamlit
+
+    Setiap job punya thread daemon sendiri yang publish satu perintah per token
+    dari TokenBucket bersama. Publish QoS 1 paho tidak menunggu PUBACK, sehingga
+    perintah-perintah ter-pipeline ke broker; ack device dihitung oleh
+    CommandTracker per job.
+    """
+
+    def __init__(self, service, rate=20, burst=20, clock=time.monotonic, sleep=time.sleep):
+        self.service = service
+        self.bucket = TokenBucket(rate, burst, clock, sleep)
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Satu publisher pada satu waktu agar batas laju berlaku untuk seluruh armada
+        self._send_lock = threading.Lock()
+
+    def dispatch(self, command, device_ids, data=None):
+        """Mulai job baru di thread latar; kembalikan id job"""
+        device_ids = list(dict.fromkeys(device_ids))
+        with self._lock:
+            job_id = f"job-{next(self._ids)}"
+            self._jobs[job_id] = {
+                'id': job_id,
+                'command': command,
+                'total': len(device_ids),
+                'sent': 0,
+                'send_failed': 0,
+                'started': now_ms(),
+                'finished': None,
+                'cancelled': False
+            }
+        thread = threading.Thread(target=self._run, args=(job_id, command, device_ids, data),
+                                  name=f"fleet-{job_id}", daemon=True)
+        thread.start()
+        return job_id
+
+    def cancel(self, job_id):
+        """Hentikan pengiriman sisa perintah job (yang sudah terkirim tetap ditunggu balasannya)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job['finished'] is None:
+                job['cancelled'] = True
+
+    def _run(self, job_id, command, device_ids, data):
+        job = self._jobs[job_id]
+        store = self.service.store
+        for device_id in device_ids:
+            if job['cancelled']:
+                break
+            with self._send_lock:
+                self.bucket.take()
+                try:
+                    self.service.send_command(device_id, command, data, job=job_id)
+                    sent = True
+                except Exception as e:
+                    sent = False
+                    store.add_log("ERROR", f"Fleet {job_id}: failed to send '{command}' to {device_id}: {str(e)}")
+            with self._lock:
+                job['sent' if sent else 'send_failed'] += 1
+        with self._lock:
+            job['finished'] = now_ms()
+        store.add_log("INFO", f"Fleet {job_id}: '{command}' sent to {job['sent']}/{job['total']} devices")
+
+    def jobs(self):
+        """Salinan status semua job (terbaru dulu) digabung dengan hasil ack dari tracker"""
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values()]
+        store = self.service.store
+        with store.lock:
+            for job in jobs:
+                job.update(store.commands.job_stats(job['id']))
+        for job in jobs:
+            job['pending'] = max(0, job['sent'] - job['acked'] - job['failed'] - job['timeout'])
+        jobs.reverse()
+        return jobs
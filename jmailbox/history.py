@@ -0,0 +1,711 @@
+"""Riwayat persisten di SQLite dengan rollup 1 menit dan 1 jam."""
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from jmailbox.series import now_ms
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+
+# Resolusi rollup: nama tabel -> ukuran bucket (ms)
+ROLLUPS = (
+    ("rollup_1m", MINUTE_MS),
+    ("rollup_1h", HOUR_MS),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    device TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_samples_series ON samples (device, metric, ts);
+CREATE INDEX IF NOT EXISTS idx_samples_ts ON samples (ts);
+
+CREATE TABLE IF NOT EXISTS rollup_1m (
+    device TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (device, metric, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollup_1m_metric ON rollup_1m (metric, bucket);
+
+CREATE TABLE IF NOT EXISTS rollup_1h (
+    device TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (device, metric, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollup_1h_metric ON rollup_1h (metric, bucket);
+
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    level TEXT NOT NULL,
+    device TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs (ts);
+CREATE INDEX IF NOT EXISTS idx_logs_level ON logs (level, id);
+CREATE INDEX IF NOT EXISTS idx_logs_device ON logs (device, id);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    device TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    severity INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 1,
+    last_ts INTEGER,
+    group_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts (ts);
+
+-- Alert yang ditekan batas laju: hanya jumlahnya per (menit, device, severity)
+CREATE TABLE IF NOT EXISTS alert_suppressed (
+    minute INTEGER NOT NULL,
+    device TEXT NOT NULL,
+    severity INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (minute, device, severity)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS devices (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    last_seen INTEGER NOT NULL,
+    status TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS packages (
+    seq INTEGER PRIMARY KEY,
+    resi TEXT NOT NULL UNIQUE,
+    device TEXT NOT NULL,
+    status TEXT NOT NULL,
+    is_cod INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    paid REAL NOT NULL,
+    money_slot INTEGER,
+    created INTEGER NOT NULL,
+    updated INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_packages_device ON packages (device, seq);
+CREATE INDEX IF NOT EXISTS idx_packages_updated ON packages (updated);
+
+CREATE TABLE IF NOT EXISTS package_events (
+    id INTEGER PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_package_events_seq ON package_events (seq, id);
+
+CREATE TABLE IF NOT EXISTS payments (
+    seq INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    device TEXT NOT NULL,
+    resi TEXT,
+    slot INTEGER,
+    amount REAL NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_payments_ts ON payments (ts);
+"""
+
+# Dataset ekspor: tabel (dan indeks yang dipaksa), kolom waktu untuk rentang, kunci keyset
+# (unik, urutan halaman), kolom (nama, ekspresi SQL, tipe) dan filter (nama -> kolom)
+_ROLLUP_COLUMNS = (
+    ("device", "device", "str"),
+    ("metric", "metric", "str"),
+    ("time", "bucket", "time"),
+    ("count", "count", "int"),
+    ("min", "min", "float"),
+    ("mean", "sum / count", "float"),
+    ("max", "max", "float"),
+)
+EXPORTS = {
+    'logs': {
+        'table': "logs INDEXED BY idx_logs_ts",
+        'time': "ts",
+        'key': ("ts", "id"),
+        'columns': (
+            ("id", "id", "int"),
+            ("time", "ts", "time"),
+            ("level", "level", "str"),
+            ("device", "device", "str"),
+            ("message", "message", "str"),
+        ),
+        'filters': {'levels': "level", 'devices': "device"},
+    },
+    'alerts': {
+        'table': "alerts INDEXED BY idx_alerts_ts",
+        'time': "ts",
+        'key': ("ts", "id"),
+        'columns': (
+            ("id", "id", "int"),
+            ("time", "ts", "time"),
+            ("device", "device", "str"),
+            ("reason", "reason", "str"),
+            ("severity", "severity", "int"),
+            ("message", "message", "str"),
+            ("count", "count", "int"),
+            ("last_seen", "last_ts", "time"),
+        ),
+        'filters': {'devices': "device"},
+    },
+    'samples': {
+        'table': "samples INDEXED BY idx_samples_ts",
+        'time': "ts",
+        'key': ("ts", "rowid"),
+        'columns': (
+            ("device", "device", "str"),
+            ("metric", "metric", "str"),
+            ("time", "ts", "time"),
+            ("value", "value", "float"),
+        ),
+        'filters': {'devices': "device", 'metrics': "metric"},
+    },
+    'samples_1m': {
+        'table': "rollup_1m",
+        'time': "bucket",
+        'key': ("device", "metric", "bucket"),
+        'columns': _ROLLUP_COLUMNS,
+        'filters': {'devices': "device", 'metrics': "metric"},
+    },
+    'samples_1h': {
+        'table': "rollup_1h",
+        'time': "bucket",
+        'key': ("device", "metric", "bucket"),
+        'columns': _ROLLUP_COLUMNS,
+        'filters': {'devices': "device", 'metrics': "metric"},
+    },
+    'deliveries': {
+        'table': "packages",
+        'time': "created",
+        'key': ("seq",),
+        'columns': (
+            ("seq", "seq", "int"),
+            ("resi", "resi", "str"),
+            ("device", "device", "str"),
+            ("status", "status", "str"),
+            ("is_cod", "is_cod", "int"),
+            ("amount", "amount", "float"),
+            ("paid", "paid", "float"),
+            ("money_slot", "money_slot", "int"),
+            ("created", "created", "time"),
+            ("updated", "updated", "time"),
+        ),
+        'filters': {'devices': "device", 'statuses': "status"},
+    },
+}
+
+
+def _export_where(dataset, start_ms, end_ms, filters):
+    """Klausa WHERE dan parameter ekspor dataset, atau None jika filter kosong (tanpa baris)"""
+    spec = EXPORTS[dataset]
+    clauses = []
+    params = []
+    if start_ms is not None:
+        clauses.append(f"{spec['time']} >= ?")
+        params.append(start_ms)
+    if end_ms is not None:
+        clauses.append(f"{spec['time']} < ?")
+        params.append(end_ms)
+    for name, values in (filters or {}).items():
+        if values is None:
+            continue
+        if name not in spec['filters']:
+            raise ValueError(f"Unknown filter '{name}' for {dataset}")
+        if not values:
+            return None
+        clauses.append(f"{spec['filters'][name]} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    return clauses, params
+
+
+def _retention_ms(days):
+    return None if days is None else days * DAY_MS
+
+
+class HistoryStore:
+    """Penyimpanan riwayat on-disk; penulisan dikumpulkan lalu di-commit per batch"""
+
+    def __init__(self, path, raw_retention_days=2, rollup_1m_retention_days=30,
+                 log_retention_days=30, alert_retention_days=90, ledger_retention_days=365,
+                 prune_interval=600):
+        self.path = path
+        self.raw_retention_ms = raw_retention_days * DAY_MS
+        self.rollup_1m_retention_ms = rollup_1m_retention_days * DAY_MS
+        # None = simpan permanen
+        self.log_retention_ms = _retention_ms(log_retention_days)
+        self.alert_retention_ms = _retention_ms(alert_retention_days)
+        self.ledger_retention_ms = _retention_ms(ledger_retention_days)
+        self.prune_interval = prune_interval
+        self._last_prune = 0.0
+
+        # Satu koneksi untuk menulis dan satu untuk membaca (WAL: pembaca tidak diblok)
+        self._write_conn = self._connect()
+        self._write_conn.executescript(SCHEMA)
+        self._migrate()
+        self._read_conn = self._connect()
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+
+        # Baris yang menunggu flush()
+        self._pending_lock = threading.Lock()
+        self._samples = []
+        self._logs = []
+        self._alerts = {}
+        self._suppressed = {}
+        self._devices = {}
+        self._packages = {}
+        self._package_events = []
+        self._payments = []
+
+    def _connect(self):
+        """Buka koneksi SQLite dalam mode WAL"""
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _migrate(self):
+        """Tambahkan kolom baru ke database yang dibuat versi sebelumnya"""
+        columns = {row[1] for row in self._write_conn.execute("PRAGMA table_info(alerts)")}
+        if 'count' not in columns:
+            self._write_conn.execute("ALTER TABLE alerts ADD COLUMN count INTEGER NOT NULL DEFAULT 1")
+        if 'group_key' not in columns:
+            self._write_conn.execute("ALTER TABLE alerts ADD COLUMN last_ts INTEGER")
+            self._write_conn.execute("ALTER TABLE alerts ADD COLUMN group_key TEXT")
+        # Baris lama (group_key NULL) tidak bentrok di indeks unik
+        self._write_conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_group ON alerts (group_key)")
+
+    def close(self):
+        """Flush sisa data dan tutup koneksi"""
+        self.flush()
+        self._write_conn.close()
+        self._read_conn.close()
+
+    # ==================== PENULISAN ====================
+    def record_sample(self, device_id, metric, timestamp_ms, value):
+        """Antrekan satu sampel sensor untuk flush berikutnya"""
+        with self._pending_lock:
+            self._samples.append((device_id, metric, timestamp_ms, value))
+
+    def record_log(self, seq, timestamp_ms, level, device, message):
+        """Antrekan satu entri log (id = seq LogStore) untuk flush berikutnya"""
+        with self._pending_lock:
+            self._logs.append((seq, timestamp_ms, level, device, message))
+
+    def record_alert(self, group, first_ms, last_ms, device, reason, severity, message, count=1):
+        """Antrekan kemunculan alert grup deduplikasi `group` untuk flush berikutnya
+
+        Satu grup disimpan sebagai satu baris; flush menambahkan count ke baris
+        yang sudah ada dan memperbarui pesan serta waktu kemunculan terakhir.
+        """
+        with self._pending_lock:
+            row = self._alerts.get(group)
+            if row is None:
+                self._alerts[group] = [first_ms, last_ms, device, reason, severity, message, count, group]
+            else:
+                row[1] = max(row[1], last_ms)
+                row[5] = message
+                row[6] += count
+
+    def record_suppressed(self, timestamp_ms, device, severity, count=1):
+        """Antrekan alert yang ditekan batas laju (hanya dihitung per menit)"""
+        key = (timestamp_ms // MINUTE_MS, device, severity)
+        with self._pending_lock:
+            self._suppressed[key] = self._suppressed.get(key, 0) + count
+
+    def record_device(self, device_id, device_type, last_seen_ms, status):
+        """Antrekan status terbaru satu device (hanya yang terakhir per flush)"""
+        with self._pending_lock:
+            self._devices[device_id] = (device_type, last_seen_ms, status)
+
+    def record_package(self, package):
+        """Antrekan keadaan terbaru satu paket ledger (hanya yang terakhir per flush)"""
+        row = (package['seq'], package['resi'], package['device'], package['status'],
+               int(package['is_cod']), float(package['amount'] or 0), float(package['paid'] or 0),
+               package['money_slot'], package['created'], package['updated'])
+        with self._pending_lock:
+            self._packages[package['seq']] = row
+
+    def record_package_event(self, seq, timestamp_ms, source, status):
+        """Antrekan satu transisi paket"""
+        with self._pending_lock:
+            self._package_events.append((seq, timestamp_ms, source, status))
+
+    def record_payment(self, event):
+        """Antrekan satu event pembayaran (PaymentEvent)"""
+        with self._pending_lock:
+            self._payments.append(tuple(event))
+
+    def flush(self):
+        """Tulis semua baris yang tertunda dalam satu transaksi, termasuk rollup"""
+        with self._pending_lock:
+            samples, self._samples = self._samples, []
+            logs, self._logs = self._logs, []
+            alerts, self._alerts = list(self._alerts.values()), {}
+            suppressed, self._suppressed = self._suppressed, {}
+            devices, self._devices = self._devices, {}
+            packages, self._packages = self._packages, {}
+            package_events, self._package_events = self._package_events, []
+            payments, self._payments = self._payments, []
+
+        if not (samples or logs or alerts or suppressed or devices or packages or package_events
+                or payments):
+            return 0
+
+        rollups = [(table, self._rollup(samples, size)) for table, size in ROLLUPS] if samples else []
+        device_rows = [
+            (device_id, device_type, last_seen, json.dumps(status, default=str))
+            for device_id, (device_type, last_seen, status) in devices.items()
+        ]
+
+        with self._write_lock:
+            conn = self._write_conn
+            conn.execute("BEGIN")
+            try:
+                if samples:
+                    conn.executemany("INSERT INTO samples VALUES (?, ?, ?, ?)", samples)
+                for table, rows in rollups:
+                    conn.executemany(
+                        f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (device, metric, bucket) DO UPDATE SET "
+                        "count = count + excluded.count, sum = sum + excluded.sum, "
+                        "min = MIN(min, excluded.min), max = MAX(max, excluded.max)",
+                        rows
+                    )
+                if logs:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO logs (id, ts, level, device, message) "
+                        "VALUES (?, ?, ?, ?, ?)", logs)
+                if alerts:
+                    conn.executemany(
+                        "INSERT INTO alerts (ts, last_ts, device, reason, severity, message, count, group_key) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (group_key) DO UPDATE SET "
+                        "count = count + excluded.count, message = excluded.message, "
+                        "last_ts = MAX(last_ts, excluded.last_ts)",
+                        alerts)
+                if suppressed:
+                    conn.executemany(
+                        "INSERT INTO alert_suppressed VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (minute, device, severity) DO UPDATE SET count = count + excluded.count",
+                        [key + (count,) for key, count in suppressed.items()])
+                if device_rows:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO devices VALUES (?, ?, ?, ?)", device_rows)
+                if packages:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        list(packages.values()))
+                if package_events:
+                    conn.executemany(
+                        "INSERT INTO package_events (seq, ts, source, status) VALUES (?, ?, ?, ?)",
+                        package_events)
+                if payments:
+                    conn.executemany("INSERT INTO payments VALUES (?, ?, ?, ?, ?, ?, ?)", payments)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            if time.monotonic() - self._last_prune >= self.prune_interval:
+                self._prune()
+
+        return (len(samples) + len(logs) + len(alerts) + len(suppressed) + len(device_rows)
+                + len(packages) + len(package_events) + len(payments))
+
+    @staticmethod
+    def _rollup(samples, bucket_ms):
+        """Agregasi satu batch sampel ke bucket (count, sum, min, max)"""
+        buckets = {}
+        for device_id, metric, timestamp_ms, value in samples:
+            key = (device_id, metric, timestamp_ms - timestamp_ms % bucket_ms)
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = [1, value, value, value]
+            else:
+                agg[0] += 1
+                agg[1] += value
+                if value < agg[2]:
+                    agg[2] = value
+                if value > agg[3]:
+                    agg[3] = value
+        return [key + tuple(agg) for key, agg in buckets.items()]
+
+    def _prune(self):
+        """Hapus baris yang melewati masa simpan: sampel, rollup 1 menit, log, alert dan ledger
+
+        Paket dihapus bersama transisinya jika tidak diperbarui selama masa
+        simpan ledger; event pembayaran menurut waktunya sendiri.
+        """
+        now = now_ms()
+        conn = self._write_conn
+        conn.execute("DELETE FROM samples WHERE ts < ?", (now - self.raw_retention_ms,))
+        conn.execute("DELETE FROM rollup_1m WHERE bucket < ?", (now - self.rollup_1m_retention_ms,))
+        if self.log_retention_ms is not None:
+            conn.execute("DELETE FROM logs WHERE ts < ?", (now - self.log_retention_ms,))
+        if self.alert_retention_ms is not None:
+            conn.execute("DELETE FROM alerts WHERE ts < ?", (now - self.alert_retention_ms,))
+            conn.execute("DELETE FROM alert_suppressed WHERE minute < ?",
+                         ((now - self.alert_retention_ms) // MINUTE_MS,))
+        if self.ledger_retention_ms is not None:
+            horizon = now - self.ledger_retention_ms
+            conn.execute("DELETE FROM package_events WHERE seq IN "
+                         "(SELECT seq FROM packages WHERE updated < ?)", (horizon,))
+            conn.execute("DELETE FROM packages WHERE updated < ?", (horizon,))
+            conn.execute("DELETE FROM payments WHERE ts < ?", (horizon,))
+        self._last_prune = time.monotonic()
+
+    # ==================== PEMBACAAN ====================
+    def _query(self, sql, params=()):
+        """Jalankan query baca lewat koneksi baca bersama"""
+        with self._read_lock:
+            return self._read_conn.execute(sql, params).fetchall()
+
+    def query_series(self, metric, device_id=None, start_ms=None, end_ms=None):
+        """Deret satu metrik untuk rentang waktu, memakai rollup sesuai panjang rentang
+
+        Rentang hingga 2 jam membaca sampel mentah (hanya untuk satu device),
+        hingga 3 hari membaca rollup 1 menit, selebihnya rollup 1 jam.
+        Mengembalikan dict berisi array 'timestamp', 'min', 'mean', 'max' dan
+        'resolution', atau None jika tidak ada data.
+        """
+        end_ms = end_ms if end_ms is not None else now_ms()
+        start_ms = start_ms if start_ms is not None else end_ms - HOUR_MS
+        span = end_ms - start_ms
+
+        if device_id is not None and span <= 2 * HOUR_MS:
+            rows = self._query(
+                "SELECT ts, value, value, value FROM samples "
+                "WHERE device = ? AND metric = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                (device_id, metric, start_ms, end_ms)
+            )
+            resolution = "raw"
+        else:
+            table = "rollup_1m" if span <= 3 * DAY_MS else "rollup_1h"
+            resolution = "1m" if table == "rollup_1m" else "1h"
+            if device_id is not None:
+                rows = self._query(
+                    f"SELECT bucket, min, sum / count, max FROM {table} "
+                    "WHERE device = ? AND metric = ? AND bucket >= ? AND bucket < ? ORDER BY bucket",
+                    (device_id, metric, start_ms, end_ms)
+                )
+            else:
+                rows = self._query(
+                    f"SELECT bucket, MIN(min), SUM(sum) / SUM(count), MAX(max) FROM {table} "
+                    "WHERE metric = ? AND bucket >= ? AND bucket < ? GROUP BY bucket ORDER BY bucket",
+                    (metric, start_ms, end_ms)
+                )
+
+        if not rows:
+            return None
+        data = np.array(rows, dtype=np.float64)
+        return {
+            'timestamp': data[:, 0].astype(np.int64).view('datetime64[ms]'),
+            'min': data[:, 1],
+            'mean': data[:, 2],
+            'max': data[:, 3],
+            'resolution': resolution
+        }
+
+    def count_alerts(self, since_ms):
+        """Jumlah alert sejak since_ms, termasuk yang ditekan batas laju"""
+        return sum(row[3] for row in self.alert_counts(since_ms))
+
+    def alert_counts(self, since_ms):
+        """Agregat alert sejak since_ms per (menit, device, severity): list (menit, device, severity, jumlah)
+
+        Alert yang ditekan batas laju ikut dihitung, sama seperti penghitung AlertStore.
+        """
+        return self._query(
+            "SELECT minute, device, severity, SUM(count) FROM ("
+            "SELECT ts / 60000 AS minute, device, severity, count FROM alerts WHERE ts >= ? "
+            "UNION ALL SELECT minute, device, severity, count FROM alert_suppressed WHERE minute >= ?"
+            ") GROUP BY 1, 2, 3 ORDER BY 1", (since_ms, since_ms // MINUTE_MS))
+
+    def suppressed_counts(self, since_ms):
+        """Jumlah alert yang ditekan batas laju sejak since_ms per device: list (device, jumlah)"""
+        return self._query(
+            "SELECT device, SUM(count) FROM alert_suppressed WHERE minute >= ? GROUP BY 1",
+            (since_ms // MINUTE_MS,))
+
+    def load_devices(self):
+        """Semua device yang pernah terlihat: list (id, type, last_seen_ms, status)"""
+        rows = self._query("SELECT id, type, last_seen, status FROM devices")
+        return [(device_id, device_type, last_seen, json.loads(status))
+                for device_id, device_type, last_seen, status in rows]
+
+    def recent_logs(self, limit):
+        """limit log terakhir, urut dari yang terlama: list (id, ts, level, device, message)"""
+        rows = self._query(
+            "SELECT id, ts, level, device, message FROM logs ORDER BY id DESC LIMIT ?", (limit,))
+        rows.reverse()
+        return rows
+
+    def max_log_id(self):
+        """Id log terbesar yang sudah tersimpan (0 jika kosong)"""
+        return self._query("SELECT COALESCE(MAX(id), 0) FROM logs")[0][0]
+
+    def query_logs(self, levels=None, devices=None, since_ms=None, until_ms=None,
+                   before=None, limit=100):
+        """Log yang cocok filter, mundur dari id `before` (eksklusif), terbaru dulu
+
+        Dipakai untuk melanjutkan paginasi setelah log di memori habis.
+        Mengembalikan list tuple (id, ts, level, device, message).
+        """
+        if levels is not None and not levels:
+            return []
+        clauses = []
+        params = []
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        if levels is not None:
+            clauses.append(f"level IN ({', '.join('?' * len(levels))})")
+            params.extend(levels)
+        if devices:
+            clauses.append(f"device IN ({', '.join('?' * len(devices))})")
+            params.extend(devices)
+        if since_ms is not None:
+            clauses.append("ts >= ?")
+            params.append(since_ms)
+        if until_ms is not None:
+            clauses.append("ts < ?")
+            params.append(until_ms)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+        return self._query(
+            f"SELECT id, ts, level, device, message FROM logs {where} ORDER BY id DESC LIMIT ?",
+            params)
+
+    def recent_alerts(self, since_ms, limit):
+        """Alert sejak since_ms (maks. limit terbaru)
+
+        Mengembalikan list (ts, device, reason, severity, message, count,
+        last_ts, group_key); baris versi lama berisi None di dua kolom terakhir.
+        """
+        rows = self._query(
+            "SELECT ts, device, reason, severity, message, count, last_ts, group_key FROM alerts "
+            "WHERE ts >= ? ORDER BY id DESC LIMIT ?", (since_ms, limit))
+        rows.reverse()
+        return rows
+
+    def recent_packages(self, limit):
+        """limit paket terakhir beserta transisinya, urut seq naik
+
+        Mengembalikan list (seq, resi, device, status, is_cod, amount, paid,
+        money_slot, created, updated, events) dengan events list (ts, source, status).
+        """
+        rows = self._query("SELECT * FROM packages ORDER BY seq DESC LIMIT ?", (limit,))
+        if not rows:
+            return []
+        rows.reverse()
+        events = {}
+        for seq, ts, source, status in self._query(
+                "SELECT seq, ts, source, status FROM package_events WHERE seq >= ? ORDER BY id",
+                (rows[0][0],)):
+            events.setdefault(seq, []).append((ts, source, status))
+        return [row + (events.get(row[0], []),) for row in rows]
+
+    def find_package(self, resi):
+        """Satu paket berdasarkan resi (format sama dengan recent_packages), atau None"""
+        rows = self._query("SELECT * FROM packages WHERE resi = ?", (resi,))
+        if not rows:
+            return None
+        events = self._query(
+            "SELECT ts, source, status FROM package_events WHERE seq = ? ORDER BY id", (rows[0][0],))
+        return rows[0] + (events,)
+
+    def max_package_seq(self):
+        """Seq paket terbesar yang sudah tersimpan (0 jika kosong)"""
+        return self._query("SELECT COALESCE(MAX(seq), 0) FROM packages")[0][0]
+
+    def recent_payments(self, limit):
+        """limit event pembayaran terakhir, urut seq naik"""
+        rows = self._query("SELECT * FROM payments ORDER BY seq DESC LIMIT ?", (limit,))
+        rows.reverse()
+        return rows
+
+    def payment_totals(self):
+        """Agregat pembayaran per (hari, device, slot, status): jumlah event dan nominal"""
+        return self._query(
+            f"SELECT ts / {DAY_MS}, device, slot, status, COUNT(*), SUM(amount) FROM payments "
+            "GROUP BY 1, 2, 3, 4")
+
+    def cod_packages(self):
+        """Nominal setiap paket COD: list (resi, device, created, amount)"""
+        return self._query("SELECT resi, device, created, amount FROM packages WHERE is_cod ORDER BY seq")
+
+    def export_rows(self, dataset, start_ms=None, end_ms=None, filters=None, chunk_size=5000):
+        """Baris satu dataset EXPORTS dalam rentang waktu, per chunk dengan paginasi keyset
+
+        Setiap chunk adalah query pendek tersendiri yang dilanjutkan dari kunci
+        baris terakhir chunk sebelumnya, sehingga memori dan lama lock baca
+        tidak bergantung pada jumlah baris. filters: nama filter -> list nilai
+        (None = semua). Menghasilkan list tuple sesuai urutan kolom dataset.
+        """
+        spec = EXPORTS[dataset]
+        key = spec['key']
+        where = _export_where(dataset, start_ms, end_ms, filters)
+        if where is None:
+            return
+        clauses, params = where
+
+        order = ", ".join(key)
+        select = ", ".join(key + tuple(expr for _, expr, _ in spec['columns']))
+        last = None
+        while True:
+            where = list(clauses)
+            page_params = list(params)
+            if last is not None:
+                where.append(f"({order}) > ({', '.join('?' * len(key))})")
+                page_params.extend(last)
+            page_params.append(chunk_size)
+            rows = self._query(
+                f"SELECT {select} FROM {spec['table']} "
+                f"{'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {order} LIMIT ?",
+                page_params)
+            if not rows:
+                return
+            last = rows[-1][:len(key)]
+            yield [row[len(key):] for row in rows]
+            if len(rows) < chunk_size:
+                return
+
+    def count_export_rows(self, dataset, start_ms=None, end_ms=None, filters=None, limit=None):
+        """Jumlah baris export_rows() dengan argumen yang sama, dihitung paling banyak sampai limit"""
+        where = _export_where(dataset, start_ms, end_ms, filters)
+        if where is None:
+            return 0
+        clauses, params = where
+        sql = f"SELECT 1 FROM {EXPORTS[dataset]['table']} {'WHERE ' + ' AND '.join(clauses) if clauses else ''}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = params + [limit]
+        return self._query(f"SELECT COUNT(*) FROM ({sql})", params)[0][0]
+
+    def recent_samples(self, since_ms):
+        """Sampel mentah sejak since_ms: list (device, metric, ts, value) urut waktu"""
+        return self._query(
+            "SELECT device, metric, ts, value FROM samples WHERE ts >= ? ORDER BY ts", (since_ms,))
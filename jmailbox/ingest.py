@@ -0,0 +1,866 @@
+"""Layanan ingest MQTT bersama: satu event loop asyncio untuk seluruh proses, opsional dengan worker shard."""
+import asyncio
+import concurrent.futures
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import partial
+
+import paho.mqtt.client as mqtt
+
+from jmailbox.camera import FrameAssembler, is_frame_payload
+from jmailbox.commands import new_command_id, reply_id
+from jmailbox.metrics import MetricsRegistry
+from jmailbox.payloads import PayloadError, decode, parse_topic
+from jmailbox.series import now_ms, to_epoch_ms
+from jmailbox.shard import ShardPool
+from jmailbox.store import DashboardStore
+
+
+class IngestBuffer:
+    """Buffer ingest berkapasitas tetap dengan kebijakan drop dan coalesce"""
+
+    POLICIES = ("drop_oldest", "drop_newest")
+
+    def __init__(self, capacity=10000, policy="drop_oldest"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self._entries = deque()
+        # Entri yang masih menunggu, per kunci coalesce (mis. status per device)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_watermark = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, item, coalesce_key=None):
+        """Masukkan item; item dengan kunci coalesce yang sama digabung ke entri lama"""
+        with self._lock:
+            self.enqueued += 1
+
+            if coalesce_key is not None:
+                entry = self._pending.get(coalesce_key)
+                if entry is not None:
+                    # Gabungkan payload, nilai terbaru menang
+                    _, old_content = entry[1]
+                    msg_type, content = item
+                    merged = dict(content, data=dict(old_content["data"], **content["data"]))
+                    entry[1] = (msg_type, merged)
+                    self.coalesced += 1
+                    return True
+
+            if len(self._entries) >= self.capacity:
+                if self.policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+                old_key, _, _ = self._entries.popleft()
+                if old_key is not None:
+                    self._pending.pop(old_key, None)
+                self.dropped += 1
+
+            entry = [coalesce_key, item, time.monotonic()]
+            self._entries.append(entry)
+            if coalesce_key is not None:
+                self._pending[coalesce_key] = entry
+            if len(self._entries) > self.high_watermark:
+                self.high_watermark = len(self._entries)
+            return True
+
+    def get_batch(self, max_items):
+        """Ambil hingga max_items entri terlama beserta waktu masuknya"""
+        batch = []
+        with self._lock:
+            while self._entries and len(batch) < max_items:
+                key, item, enqueued_at = self._entries.popleft()
+                if key is not None:
+                    self._pending.pop(key, None)
+                batch.append((item, enqueued_at))
+        return batch
+
+
+class IngestService:
+    """Satu klien MQTT yang dijalankan event loop asyncio di thread sendiri
+
+    Event loop menangani koneksi, subscribe, reconnect dengan backoff
+    eksponensial dan I/O socket paho (add_reader/add_writer), sehingga callback
+    paho dan decode payload berjalan di thread event loop. Pesan dipindahkan ke
+    DashboardStore bersama oleh task drain berkala; script Streamlit cukup
+    membaca snapshot store yang dilindungi lock.
+
+    Dengan beberapa broker atau shards > 0, subscribe dan decode dipindahkan ke
+    proses worker ShardPool yang mengisi buffer yang sama; koneksi event loop
+    ke broker pertama tetap dipakai untuk perintah. Perintah ke device yang
+    pesannya datang dari broker lain dikirim lewat klien publish ke broker itu.
+    """
+
+    def __init__(self, broker, port, topics, store=None, buffer_size=10000,
+                 drop_policy="drop_oldest", coalesce_channels=("status",),
+                 drain_max_messages=2000, drain_max_ms=50, drain_interval_ms=100,
+                 reconnect_min_s=1, reconnect_max_s=60, connect_timeout_s=10, metrics=None,
+                 brokers=(), shards=0, shard_mode="share", share_group=None, capture_window_ms=10000):
+        self.broker = broker
+        self.port = port
+        self.topics = list(topics)
+        # Broker pertama adalah koneksi event loop; sisanya hanya lewat shard
+        self.brokers = [(broker, port)] + [endpoint for endpoint in brokers if endpoint != (broker, port)]
+        self.store = store or DashboardStore()
+        self.buffer = IngestBuffer(buffer_size, drop_policy)
+        self.coalesce_channels = frozenset(coalesce_channels)
+        self.drain_max_messages = drain_max_messages
+        self.drain_max_ms = drain_max_ms
+        self.drain_interval_ms = drain_interval_ms
+        self.reconnect_min_s = reconnect_min_s
+        self.reconnect_max_s = reconnect_max_s
+        self.connect_timeout_s = connect_timeout_s
+        self.drain_stats = {
+            'drained': 0,
+            'last_count': 0,
+            'last_ms': 0.0,
+            'last_lag_ms': 0.0,
+            'max_ms': 0.0
+        }
+        self.assembler = FrameAssembler()
+        # Perintah capture yang menunggu foto JPEG mentah: device -> (batas waktu ms, purpose)
+        self.capture_window_ms = capture_window_ms
+        self._capture_requests = {}
+        # Payload yang gagal decode/validasi per device (ditulis thread jaringan atau penerima shard)
+        self.decode_failures = {}
+        self.last_decode_error = {}
+        # channel -> handler pesan DATA di drain
+        self._channel_handlers = {
+            'sensor': self._apply_sensor,
+            'alert': self._apply_alert,
+            'log': self._apply_log,
+            'payment': self._apply_payment,
+            'status': self._apply_status,
+        }
+        self.client = None
+        self.connected = False
+        self.connection_stats = {
+            'attempts': 0,
+            'reconnects': 0,
+            'last_error': None,
+            'retry_at': None,
+            'connected_since': None
+        }
+        self._connected_event = threading.Event()
+        self._start_lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._loop_started = False
+        self._loop = None
+        self._thread = None
+        self._loop_thread_id = None
+        self._socket_fd = None
+        self._misc_task = None
+        # asyncio.Event milik event loop; dibuat di dalam loop
+        self._stopping = None
+        self._wake = None
+        self._connack = None
+        self._disconnected = None
+        # device -> indeks broker asal pesannya (ditulis thread penerima shard)
+        self.device_brokers = {}
+        self._publishers = {}
+        self.shard_pool = None
+        if shards or len(self.brokers) > 1:
+            self.shard_pool = ShardPool(
+                self.brokers, self.topics, max(shards, 1), mode=shard_mode, share_group=share_group,
+                coalesce_channels=coalesce_channels, capacity=buffer_size,
+                reconnect_min_s=reconnect_min_s, reconnect_max_s=reconnect_max_s
+            )
+        self.metrics = metrics or MetricsRegistry()
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """Daftarkan metrik pipeline ingest; nilai yang sudah dihitung di tempat lain dibaca saat ekspor"""
+        metrics = self.metrics
+        self._messages_total = metrics.counter(
+            'jmailbox_mqtt_messages_total', "MQTT messages received per topic channel", ('channel',))
+        self._decode_seconds = metrics.histogram(
+            'jmailbox_decode_seconds', "Payload decode and validation time per topic channel", ('channel',))
+        self._drain_seconds = metrics.histogram(
+            'jmailbox_drain_seconds', "Duration of drains that moved messages into the store")
+        metrics.callback('jmailbox_drained_messages_total', "Messages moved from the buffer into the store",
+                         lambda: self.drain_stats['drained'], kind='counter')
+        # Counter berjalan, bukan jumlah dari decode_failures yang sedang ditulis thread jaringan/shard
+        self._decode_failures_total = metrics.counter(
+            'jmailbox_decode_failures_total', "Payloads rejected by the decoder or validator")
+        metrics.callback('jmailbox_queue_depth', "Messages waiting in the ingest buffer",
+                         lambda: len(self.buffer))
+        metrics.callback('jmailbox_queue_dropped_total', "Messages dropped because the buffer was full",
+                         lambda: self.buffer.dropped, kind='counter')
+        metrics.callback('jmailbox_queue_coalesced_total', "Status messages merged into a pending one",
+                         lambda: self.buffer.coalesced, kind='counter')
+        metrics.callback('jmailbox_queue_lag_seconds', "Age of the oldest message in the last drain",
+                         lambda: self.drain_stats['last_lag_ms'] / 1000.0)
+        metrics.callback('jmailbox_mqtt_connected', "1 while connected to the MQTT broker",
+                         lambda: int(self.connected))
+        if self.shard_pool is not None:
+            self.shard_pool.register_metrics(metrics)
+
+    # ==================== KONEKSI (EVENT LOOP) ====================
+    def start(self, timeout=1.0):
+        """Jalankan event loop ingest di thread sendiri (hanya sekali per proses)
+
+        Hanya pemanggilan pertama yang menunggu koneksi hingga timeout; koneksi
+        yang gagal dicoba ulang di latar dengan backoff eksponensial.
+        """
+        with self._start_lock:
+            if self._loop_started:
+                return self.connected
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run_loop, name="jmailbox-ingest", daemon=True)
+            self._thread.start()
+            if self.shard_pool is not None:
+                self.shard_pool.start(self._on_shard_batch, self._on_shard_report)
+                # Klien publish broker tambahan tersambung sebelum perintah pertama
+                for broker in range(1, len(self.brokers)):
+                    self._publisher(broker)
+            self._loop_started = True
+
+        self._connected_event.wait(timeout)
+        return self.connected
+
+    def reconnect_now(self, timeout=1.0):
+        """Lewati sisa jeda backoff dan coba koneksi segera; tunggu hingga timeout"""
+        if not self.running:
+            return self.start(timeout)
+        if not self.connected:
+            self._loop.call_soon_threadsafe(self._wake.set)
+            self._connected_event.wait(timeout)
+        return self.connected
+
+    def set_broker(self, broker, port):
+        """Ganti alamat broker; koneksi aktif diputus dan event loop reconnect ke alamat baru"""
+        self.broker = broker
+        self.port = int(port)
+        self.brokers[0] = (self.broker, self.port)
+        if self.running:
+            self._loop.call_soon_threadsafe(self._switch_broker)
+        if self.shard_pool is not None:
+            self.device_brokers.clear()
+            self.shard_pool.restart(self.brokers)
+
+    def _switch_broker(self):
+        if self.connected:
+            self.client.disconnect()
+        self._wake.set()
+
+    def stop(self, timeout=5.0):
+        """Putuskan koneksi, hentikan worker shard dan event loop"""
+        if self.shard_pool is not None:
+            self.shard_pool.stop(timeout)
+        for publisher in self._publishers.values():
+            publisher.disconnect()
+            publisher.loop_stop()
+        if self.running:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        """True jika thread event loop ingest sedang berjalan"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run_loop(self):
+        self._loop_thread_id = threading.get_ident()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+
+    async def _main(self):
+        self._stopping = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._connack = asyncio.Event()
+        self._disconnected = asyncio.Event()
+        drainer = asyncio.create_task(self._drain_forever())
+        try:
+            await self._supervise()
+        finally:
+            drainer.cancel()
+            try:
+                await drainer
+            except asyncio.CancelledError:
+                pass
+
+    def _new_client(self):
+        """Klien paho tanpa thread sendiri; I/O socket dijalankan event loop"""
+        client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                             client_id=f"dashboard_{int(time.time())}")
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        return client
+
+    async def _supervise(self):
+        """Koneksi, tunggu sampai putus, lalu ulangi dengan backoff eksponensial (dengan jitter)"""
+        loop = asyncio.get_running_loop()
+        stats = self.connection_stats
+        delay = self.reconnect_min_s
+        if self.client is None:
+            self.client = self._new_client()
+        client = self.client
+        while not self._stopping.is_set():
+            self._connack.clear()
+            self._disconnected.clear()
+            stats['attempts'] += 1
+            stats['retry_at'] = None
+            try:
+                # connect() memakai DNS dan socket blocking; jalankan di luar event loop
+                await loop.run_in_executor(None, client.connect, self.broker, self.port, 60)
+                await asyncio.wait_for(self._wait_any(self._connack, self._disconnected),
+                                       self.connect_timeout_s)
+                if not self.connected:
+                    raise ConnectionError("Broker refused or dropped the connection")
+            except Exception as e:
+                stats['last_error'] = str(e) or type(e).__name__
+                self.buffer.put(("ERROR", f"MQTT connection failed: {stats['last_error']} "
+                                          f"(retrying in {delay:g}s)"))
+                client.disconnect()
+            else:
+                # Koneksi berhasil: jeda kembali ke minimum, tunggu sampai putus atau berhenti
+                delay = self.reconnect_min_s
+                await self._wait_any(self._disconnected, self._stopping)
+                if self._stopping.is_set():
+                    break
+                stats['reconnects'] += 1
+
+            wait = delay * random.uniform(0.8, 1.2)
+            stats['retry_at'] = time.time() + wait
+            self._wake.clear()
+            await self._wait_any(self._stopping, self._wake, timeout=wait)
+            delay = min(delay * 2, self.reconnect_max_s)
+
+        client.disconnect()
+        stats['retry_at'] = None
+
+    @staticmethod
+    async def _wait_any(*events, timeout=None):
+        """Tunggu sampai salah satu asyncio.Event diset (atau timeout)"""
+        waiters = [asyncio.ensure_future(event.wait()) for event in events]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def _drain_forever(self):
+        """Pindahkan buffer ke store secara berkala di thread event loop, per batch"""
+        while True:
+            await self._drain_async()
+            await asyncio.sleep(self.drain_interval_ms / 1000.0)
+
+    def _in_loop(self, func, *args):
+        """Jalankan func di thread event loop (langsung jika sudah di sana)"""
+        if threading.get_ident() == self._loop_thread_id:
+            func(*args)
+        else:
+            self._loop.call_soon_threadsafe(func, *args)
+
+    # Callback socket paho: daftarkan fd ke event loop
+    def _on_socket_open(self, client, userdata, sock):
+        self._socket_fd = fd = sock.fileno()
+        self._in_loop(self._watch_socket, fd)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._in_loop(self._unwatch_socket, self._socket_fd)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._in_loop(self._loop.add_writer, self._socket_fd, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._in_loop(self._loop.remove_writer, self._socket_fd)
+
+    def _watch_socket(self, fd):
+        self._loop.add_reader(fd, self.client.loop_read)
+        self._misc_task = self._loop.create_task(self._misc_forever())
+
+    def _unwatch_socket(self, fd):
+        self._loop.remove_reader(fd)
+        self._loop.remove_writer(fd)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+
+    async def _misc_forever(self):
+        """Keepalive dan retry QoS paho; berhenti ketika koneksi putus"""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    def publish(self, topic, payload, qos=1, broker=None):
+        """Publish pesan lewat koneksi bersama, atau ke broker lain (indeks di self.brokers)
+
+        Publish ke koneksi bersama selalu dijalankan di thread event loop; dari
+        thread lain (script, job fleet) pemanggil menunggu hasilnya.
+        """
+        if broker:
+            client = self._publisher(broker)
+            if not client.is_connected():
+                host, port = self.brokers[broker]
+                raise ConnectionError(f"MQTT client for {host}:{port} is not connected")
+            return client.publish(topic, payload, qos=qos)
+        if not self.running or threading.get_ident() == self._loop_thread_id:
+            return self._publish(topic, payload, qos)
+        future = concurrent.futures.Future()
+
+        def publish_in_loop():
+            try:
+                future.set_result(self._publish(topic, payload, qos))
+            except Exception as e:
+                future.set_exception(e)
+
+        self._loop.call_soon_threadsafe(publish_in_loop)
+        return future.result(self.connect_timeout_s)
+
+    def _publish(self, topic, payload, qos):
+        if self.client is None or not self.connected:
+            raise ConnectionError("MQTT client is not connected")
+        return self.client.publish(topic, payload, qos=qos)
+
+    def _publisher(self, broker):
+        """Klien publish ke broker selain yang pertama (dibuat saat start)
+
+        Klien ini memakai thread jaringan paho sendiri (loop_start) karena hanya
+        mengirim perintah; paho menyambung ulang sendiri jika putus.
+        """
+        client = self._publishers.get(broker)
+        if client is None:
+            host, port = self.brokers[broker]
+            client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2, 
+                                 client_id=f"dashboard_{int(time.time())}_pub{broker}")
+            client.reconnect_delay_set(self.reconnect_min_s, self.reconnect_max_s)
+            client.connect_async(host, port, 60)
+            client.loop_start()
+            client = self._publishers.setdefault(broker, client)
+        return client
+
+    def send_command(self, device_id, command, data=None, job=None):
+        """Kirim perintah dengan correlation ID dan catat di tabel pending; kembalikan ID"""
+        command_id = new_command_id()
+        payload = {
+            "command": command,
+            "cmd_id": command_id,
+            "timestamp": int(time.time() * 1000),
+            "source": "dashboard"
+        }
+        if data:
+            payload.update(data)
+
+        # Dicatat sebelum publish agar balasan yang sangat cepat tetap cocok
+        store = self.store
+        with store.lock:
+            store.commands.register(command_id, device_id, command, payload, now_ms(), job)
+            store.touch('commands')
+        if command == "capture":
+            self._capture_requests[device_id] = (now_ms() + self.capture_window_ms, payload.get('purpose'))
+        try:
+            self.publish(f"jmailbox/{device_id}/command", json.dumps(payload), qos=1,
+                         broker=self.device_brokers.get(device_id))
+        except Exception:
+            with store.lock:
+                store.commands.pending.pop(command_id, None)
+            if command == "capture":
+                self._capture_requests.pop(device_id, None)
+            raise
+        return command_id
+
+    def _expire_commands(self):
+        """Kirim ulang perintah yang belum dibalas dan catat yang menyerah"""
+        store = self.store
+        with store.lock:
+            retry, timed_out = store.commands.expire(now_ms())
+            if retry or timed_out:
+                store.touch('commands')
+        for entry in retry:
+            try:
+                self.publish(f"jmailbox/{entry['device']}/command",
+                             json.dumps(dict(entry['payload'], attempt=entry['attempts'])), qos=1,
+                             broker=self.device_brokers.get(entry['device']))
+            except Exception as e:
+                store.add_log("ERROR", f"Failed to resend command '{entry['command']}': {str(e)}")
+        for entry in timed_out:
+            store.add_log("WARNING", f"Command '{entry['command']}' to {entry['device']} timed out "
+                                     f"after {entry['attempts']} attempts")
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        """Callback ketika terkoneksi ke broker MQTT (thread event loop)"""
+        if not reason_code.is_failure:
+            self.connected = True
+            self.connection_stats['connected_since'] = time.time()
+            self.connection_stats['last_error'] = None
+            self._connected_event.set()
+            # Subscribe ke semua topik (juga setelah reconnect); dengan shard, worker yang subscribe
+            if self.shard_pool is None:
+                for topic in self.topics:
+                    client.subscribe(topic, qos=1)
+            self.buffer.put(("INFO", "Connected to MQTT Broker"))
+        else:
+            self.connection_stats['last_error'] = f"Connection refused: {reason_code}"
+            self.buffer.put(("ERROR", f"Connection failed: {reason_code}"))
+        if self._loop is not None:
+            self._in_loop(self._connack.set)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        """Callback ketika koneksi ke broker terputus; reconnect diatur _supervise"""
+        self.connected = False
+        self.connection_stats['connected_since'] = None
+        self._connected_event.clear()
+        if reason_code != 0:
+            self.buffer.put(("ERROR", f"Disconnected from MQTT Broker ({reason_code})"))
+        if self._loop is not None:
+            self._in_loop(self._disconnected.set)
+
+    def inject(self, topic, payload):
+        """Masukkan satu pesan seolah diterima dari broker (simulator, replay, benchmark)
+
+        Jika event loop berjalan, pesan dijadwalkan ke thread event loop seperti
+        callback paho; tanpa event loop pesan langsung didecode ke buffer.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if self.running and threading.get_ident() != self._loop_thread_id:
+            self._loop.call_soon_threadsafe(self._receive, topic, payload)
+        else:
+            self._receive(topic, payload)
+
+    def _on_message(self, client, userdata, msg):
+        """Callback ketika menerima pesan MQTT (decode sekali untuk semua sesi)"""
+        self._receive(msg.topic, msg.payload)
+
+    def _receive(self, topic, payload):
+        device_id = None
+        try:
+            parsed = parse_topic(topic)
+            if parsed is None:
+                raise PayloadError(f"Unexpected topic '{topic}'")
+            device_id, channel = parsed
+            self._messages_total.labels(channel).inc()
+            if channel == 'camera' and is_frame_payload(payload):
+                self._on_camera_frame(device_id, topic, payload)
+                return
+
+            started = time.perf_counter()
+            data = decode(channel, payload)
+            self._decode_seconds.labels(channel).observe(time.perf_counter() - started)
+
+            # Status yang belum diproses cukup disimpan versi terbarunya per device,
+            # kecuali status paket (ber-resi) dan balasan perintah yang harus diproses satu per satu
+            coalesce_key = None
+            if channel in self.coalesce_channels and not (data.get('resi') or reply_id(data)):
+                coalesce_key = (device_id, channel)
+
+            # Masukkan pesan ke buffer untuk diproses oleh drain()
+            self.buffer.put(("DATA", {
+                "topic": topic,
+                "device": device_id,
+                "channel": channel,
+                "data": data,
+                "timestamp": datetime.now()
+            }), coalesce_key)
+        except PayloadError as e:
+            self._count_decode_failure(device_id, e)
+        except Exception as e:
+            self.buffer.put(("ERROR", f"Error processing MQTT message: {str(e)}"))
+
+    def _count_decode_failure(self, device_id, error):
+        """Hitung payload tidak valid per device; hanya kegagalan pertama per device yang di-log"""
+        key = device_id or '(unknown)'
+        count = self.decode_failures.get(key, 0) + 1
+        self.decode_failures[key] = count
+        self._decode_failures_total.inc()
+        self.last_decode_error[key] = str(error)
+        if count == 1:
+            self.buffer.put(("ERROR", f"Invalid payload from {key}: {str(error)}"))
+
+    def decode_stats(self):
+        """Jumlah payload tidak valid dan error terakhir per device"""
+        return [
+            {'device': device_id, 'failures': count, 'last_error': self.last_decode_error.get(device_id)}
+            for device_id, count in list(self.decode_failures.items())
+        ]
+
+    def _on_camera_frame(self, device_id, topic, payload):
+        """Frame JPEG biner: disusun di thread jaringan tanpa decode JSON/base64"""
+        frame = self.assembler.feed(device_id, payload, now_ms())
+        if frame is not None:
+            self._add_frame(frame, topic)
+
+    def _add_frame(self, frame, topic):
+        """Frame yang sudah utuh: ring kamera, lalu notifikasi (dan foto capture) ke buffer"""
+        device_id = frame['device']
+        if frame['frame_id'] is None:
+            # JPEG mentah (firmware tanpa chunk JMC1) tidak punya flag capture: frame pertama
+            # setelah perintah capture dalam capture_window_ms dianggap foto capture
+            request = self._capture_requests.pop(device_id, None)
+            if request is not None and frame['timestamp'] <= request[0]:
+                frame['capture'] = True
+                frame['purpose'] = request[1]
+        self.store.cameras.add(frame)
+        if frame['capture']:
+            # Foto capture diarsipkan saat drain; tidak boleh digabung dengan frame lain
+            self.buffer.put(("CAPTURE", {"frame": frame}))
+        # Cukup satu notifikasi per kamera yang menunggu di buffer
+        self.buffer.put(("FRAME", {
+            "topic": topic,
+            "device": device_id,
+            "data": {"frame_id": frame['frame_id'], "size": frame['size']},
+            "timestamp": datetime.now()
+        }), (device_id, 'camera'))
+
+    # ==================== SHARD ====================
+    def _on_shard_batch(self, shard, entries):
+        """Entri yang sudah didecode worker shard masuk ke buffer yang sama (thread penerima)"""
+        for (msg_type, content), coalesce_key in entries:
+            if msg_type == "CAMERA":
+                frame = content["frame"]
+                self.device_brokers[frame['device']] = content["broker"]
+                self._add_frame(frame, content["topic"])
+                continue
+            if msg_type == "DATA":
+                self.device_brokers[content["device"]] = content.pop("broker")
+            self.buffer.put((msg_type, content), coalesce_key)
+
+    def _on_shard_report(self, shard, report):
+        """Gabungkan laporan worker ke metrik per channel dan hitungan payload tidak valid"""
+        for channel, count in report['channels'].items():
+            self._messages_total.labels(channel).inc(count)
+        for channel, snapshot in report['decode'].items():
+            self._decode_seconds.labels(channel).merge(snapshot)
+        for key, (count, error) in report['failures'].items():
+            self.decode_failures[key] = self.decode_failures.get(key, 0) + count
+            self.last_decode_error[key] = error
+            self._decode_failures_total.inc(count)
+
+    def shard_stats(self):
+        """Statistik per shard (list kosong jika ingest tidak di-shard)"""
+        return self.shard_pool.shard_stats() if self.shard_pool is not None else []
+
+    # ==================== PEMROSESAN ====================
+    def drain(self, max_messages=None, max_ms=None, batch_size=256):
+        """Pindahkan pesan dari buffer ke store bersama dalam batas budget per rerun
+
+        Dipakai script jika event loop tidak berjalan; hanya satu pemanggil yang
+        drain sekaligus dan sisa pesan diproses pada rerun berikutnya.
+        """
+        if not self._drain_lock.acquire(blocking=False):
+            return 0
+        try:
+            for write in self._drain_steps(max_messages, max_ms, batch_size):
+                if write is not None:
+                    write()
+        finally:
+            self._drain_lock.release()
+        return self.drain_stats['last_count']
+
+    async def _drain_async(self, batch_size=256):
+        """Drain di thread event loop: kembali ke loop setelah setiap batch
+
+        Tulis disk (arsip foto dan flush riwayat SQLite) dijalankan di thread
+        lain agar tidak menahan I/O socket; publish ulang perintah tetap di sini.
+        """
+        if not self._drain_lock.acquire(blocking=False):
+            return 0
+        try:
+            for write in self._drain_steps(None, None, batch_size):
+                if write is None:
+                    await asyncio.sleep(0)
+                else:
+                    await asyncio.to_thread(write)
+        finally:
+            self._drain_lock.release()
+        return self.drain_stats['last_count']
+
+    def _drain_steps(self, max_messages, max_ms, batch_size):
+        """Langkah satu drain (dengan _drain_lock)
+
+        Yield None setelah setiap batch diterapkan ke store, atau fungsi tulis
+        disk yang harus dijalankan pemanggil sebelum langkah berikutnya.
+        """
+        max_messages = max_messages or self.drain_max_messages
+        max_ms = max_ms or self.drain_max_ms
+        started = time.monotonic()
+        deadline = started + max_ms / 1000.0
+        processed = 0
+        oldest_enqueued = None
+        captures = []
+        while processed < max_messages:
+            batch = self.buffer.get_batch(min(batch_size, max_messages - processed))
+            if not batch:
+                break
+            if oldest_enqueued is None:
+                oldest_enqueued = batch[0][1]
+            with self.store.lock:
+                changed = set()
+                for (msg_type, content), _ in batch:
+                    if msg_type == "CAPTURE":
+                        captures.append(self._capture_entry(content["frame"]))
+                        continue
+                    changed.update(self._apply(msg_type, content))
+                self.store.touch(*changed)
+            processed += len(batch)
+            if time.monotonic() >= deadline:
+                break
+            yield None
+
+        if captures:
+            yield partial(self._archive, captures)
+        self.store.advance_liveness()
+        self._expire_commands()
+
+        # Satu transaksi riwayat untuk seluruh batch drain ini
+        if self.store.history is not None:
+            yield self._flush_history
+
+        finished = time.monotonic()
+        elapsed_ms = (finished - started) * 1000.0
+        stats = self.drain_stats
+        stats['drained'] += processed
+        stats['last_count'] = processed
+        stats['last_ms'] = elapsed_ms
+        stats['last_lag_ms'] = (finished - oldest_enqueued) * 1000.0 if oldest_enqueued else 0.0
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        if processed:
+            self._drain_seconds.observe(elapsed_ms / 1000.0)
+
+    def _flush_history(self):
+        try:
+            self.store.history.flush()
+        except Exception as e:
+            self.store.add_log("ERROR", f"Failed to write history: {str(e)}")
+
+    def _capture_entry(self, frame):
+        """Pasangkan foto capture dengan resi yang sedang diproses device (dengan store.lock)"""
+        device = self.store.registry.get(frame['device'])
+        resi = device['status'].get('resi') if device is not None else None
+        return frame, str(resi) if resi else None
+
+    def _archive(self, captures):
+        """Tulis foto capture ke arsip di luar store.lock (I/O disk dan thumbnail)"""
+        archive = self.store.archive
+        if archive is None:
+            return
+        for frame, resi in captures:
+            try:
+                archive.add(frame['device'], frame['data'], frame['timestamp'], resi=resi,
+                            purpose=frame.get('purpose'))
+            except Exception as e:
+                self.store.add_log("ERROR", f"Failed to archive photo: {str(e)}", device=frame['device'])
+        with self.store.lock:
+            self.store.touch('archive')
+
+    def buffer_stats(self):
+        """Ringkasan backpressure: kedalaman buffer, drop, coalesce dan latensi drain"""
+        buffer = self.buffer
+        return dict(
+            self.drain_stats,
+            depth=len(buffer),
+            capacity=buffer.capacity,
+            policy=buffer.policy,
+            high_watermark=buffer.high_watermark,
+            enqueued=buffer.enqueued,
+            dropped=buffer.dropped,
+            coalesced=buffer.coalesced
+        )
+
+    def _apply(self, msg_type, content):
+        """Terapkan satu pesan ke store (dipanggil dengan store.lock)
+
+        Mengembalikan domain store yang berubah selain log (add_log menandai sendiri).
+        """
+        store = self.store
+
+        if msg_type == "INFO" or msg_type == "ERROR":
+            # Tambahkan ke log
+            store.add_log(msg_type, content)
+
+        elif msg_type == "FRAME":
+            # Frame sudah ada di ring kamera; cukup tandai device masih hidup
+            store.registry.touch(content["device"], to_epoch_ms(content["timestamp"]))
+            return ('devices', 'camera')
+
+        elif msg_type == "DATA":
+            device_id = content["device"]
+            channel = content["channel"]
+            data = content["data"]
+            timestamp = content["timestamp"]
+
+            # Update device info; payload status membawa tipe dan kemampuan device
+            timestamp_ms = to_epoch_ms(timestamp)
+            device = store.registry.touch(device_id, timestamp_ms, data)
+            if channel == 'status':
+                store.registry.announce(device_id, device['status'])
+
+            history = store.history
+            if history is not None:
+                history.record_device(device_id, device['type'], timestamp_ms, dict(device['status']))
+            changed = ['devices']
+
+            # Balasan perintah membawa correlation ID di topik status/log
+            if (channel in ('status', 'log') and store.commands.pending
+                    and store.commands.match(data, timestamp_ms) is not None):
+                changed.append('commands')
+
+            # Proses berdasarkan channel topik
+            handler = self._channel_handlers.get(channel)
+            if handler is not None:
+                changed.extend(handler(device_id, data, timestamp_ms, timestamp))
+            return changed
+        return ()
+
+    def _apply_sensor(self, device_id, data, timestamp_ms, timestamp):
+        """Simpan setiap field numerik ke ring buffer per device"""
+        store = self.store
+        recorded = store.sensors.record(device_id, timestamp_ms, data)
+        if store.history is not None:
+            for metric, value in recorded:
+                store.history.record_sample(device_id, metric, timestamp_ms, value)
+        return ('sensors',)
+
+    def _apply_alert(self, device_id, data, timestamp_ms, timestamp):
+        """Tambahkan alert keamanan"""
+        self.store.record_alert(device_id, timestamp_ms, data)
+        return ('alerts',)
+
+    def _apply_log(self, device_id, data, timestamp_ms, timestamp):
+        """Tambahkan log sistem (add_log menandai domain logs sendiri)"""
+        self.store.add_log(data.get('level', 'INFO'), data.get('message', ''),
+                           device=device_id, timestamp=timestamp)
+        return ()
+
+    def _apply_payment(self, device_id, data, timestamp_ms, timestamp):
+        """Pembayaran COD: event ledger pembayaran dan transisi paket"""
+        store = self.store
+        store.record_payment(device_id, timestamp_ms, data)
+        if not data.get('resi'):
+            return ('payments',)
+        store.record_package(str(data['resi']), device_id, timestamp_ms, 'payment', data)
+        return ('payments', 'package')
+
+    def _apply_status(self, device_id, data, timestamp_ms, timestamp):
+        """Update status paket jika ada"""
+        if not data.get('resi'):
+            return ()
+        store = self.store
+        recorded = store.record_package(str(data['resi']), device_id, timestamp_ms, 'status', data)
+        package = store.current_package
+        package['resi'] = data['resi']
+        package['status'] = data.get('status', 'In Progress')
+        package['timestamp'] = timestamp
+        package['is_cod'] = data.get('is_cod', False)
+        package['amount'] = recorded['amount']
+        return ('package',)
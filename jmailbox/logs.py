@@ -0,0 +1,205 @@
+"""Log store berkapasitas tetap dengan indeks level/device/waktu dan paginasi cursor."""
+import heapq
+import sys
+from bisect import bisect_left
+
+import pandas as pd
+
+from jmailbox.series import from_epoch_ms
+
+# Warna per level log untuk tampilan
+LEVEL_COLORS = {
+    "DEBUG": "#888",
+    "INFO": "#4B8DFF",
+    "WARNING": "#FFA500",
+    "ERROR": "#FF4B4B",
+    "ALERT": "#FF1493"
+}
+
+
+class _SeqIndex:
+    """Daftar seq terurut naik; pemangkasan dari depan O(1) teramortisasi"""
+
+    def __init__(self):
+        self._seqs = []
+        self._start = 0
+
+    def __len__(self):
+        return len(self._seqs) - self._start
+
+    def append(self, seq):
+        self._seqs.append(seq)
+
+    def evict_below(self, seq):
+        """Buang semua seq yang lebih kecil dari seq"""
+        seqs = self._seqs
+        while self._start < len(seqs) and seqs[self._start] < seq:
+            self._start += 1
+        # Padatkan list jika lebih dari separuhnya sudah terbuang
+        if self._start > 1024 and self._start * 2 > len(seqs):
+            del seqs[:self._start]
+            self._start = 0
+
+    def iter_before(self, before):
+        """Iterasi seq < before dari yang terbaru"""
+        seqs = self._seqs
+        i = bisect_left(seqs, before, self._start)
+        for j in range(i - 1, self._start - 1, -1):
+            yield seqs[j]
+
+
+class LogStore:
+    """Ring log berkapasitas tetap, diindeks per (level, device) dan urutan waktu
+
+    Setiap entri mendapat seq yang naik monoton; seq juga menjadi cursor
+    paginasi dan id baris di riwayat SQLite.
+    """
+
+    def __init__(self, capacity=200000, next_seq=1):
+        self.capacity = capacity
+        self.next_seq = next_seq
+        self._first_seq = None
+        # Entri disimpan sebagai tuple (seq, ts_ms, level, device, message) di slot seq % capacity
+        self._slots = [None] * capacity
+        self._index = {}
+
+    def __len__(self):
+        return min(self.next_seq - self.oldest_seq, self.capacity)
+
+    @property
+    def oldest_seq(self):
+        """Seq terlama yang masih ada di memori"""
+        if self._first_seq is None:
+            return self.next_seq
+        return max(self._first_seq, self.next_seq - self.capacity)
+
+    def append(self, timestamp_ms, level, device, message, seq=None):
+        """Tambahkan satu entri; entri terlama dibuang jika kapasitas penuh"""
+        if seq is None:
+            seq = self.next_seq
+        if self._first_seq is None:
+            self._first_seq = seq
+        self.next_seq = seq + 1
+
+        slot = seq % self.capacity
+        evicted = self._slots[slot]
+        if evicted is not None:
+            key = (evicted[2], evicted[3])
+            index = self._index[key]
+            index.evict_below(evicted[0] + 1)
+            if not len(index):
+                del self._index[key]
+
+        level = sys.intern(str(level))
+        device = sys.intern(str(device))
+        self._slots[slot] = (seq, timestamp_ms, level, device, message)
+        index = self._index.get((level, device))
+        if index is None:
+            index = self._index[(level, device)] = _SeqIndex()
+        index.append(seq)
+        return seq
+
+    def _entry(self, seq):
+        """Entri dengan seq tertentu, atau None jika sudah terbuang"""
+        entry = self._slots[seq % self.capacity]
+        if entry is None or entry[0] != seq:
+            return None
+        return entry
+
+    def _timestamp_at(self, seq):
+        """Timestamp entri seq, atau entri berikutnya jika seq kosong (celah setelah restart)"""
+        while seq < self.next_seq:
+            entry = self._entry(seq)
+            if entry is not None:
+                return entry[1]
+            seq += 1
+        return float('inf')
+
+    def seq_at(self, timestamp_ms):
+        """Seq pertama dengan timestamp >= timestamp_ms (pencarian biner atas urutan seq)"""
+        lo, hi = self.oldest_seq, self.next_seq
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamp_at(mid) < timestamp_ms:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def levels(self):
+        """Level log yang ada di memori"""
+        return sorted({level for level, _ in self._index})
+
+    def devices(self):
+        """Device yang memiliki log di memori"""
+        return sorted({device for _, device in self._index})
+
+    def query(self, levels=None, devices=None, since_ms=None, until_ms=None, before=None, limit=100):
+        """Entri terbaru yang cocok dengan filter, mundur dari cursor `before` (eksklusif)
+
+        levels/devices None berarti semua. Mengembalikan list tuple
+        (seq, ts_ms, level, device, message) dari yang terbaru.
+        """
+        if levels is not None and not levels:
+            return []
+
+        upper = self.next_seq if before is None else min(before, self.next_seq)
+        if until_ms is not None:
+            upper = min(upper, self.seq_at(until_ms))
+        lower = self.oldest_seq
+        if since_ms is not None:
+            lower = max(lower, self.seq_at(since_ms))
+        if upper <= lower:
+            return []
+
+        if levels is None and not devices:
+            seqs = range(upper - 1, lower - 1, -1)
+        else:
+            level_set = None if levels is None else set(levels)
+            device_set = set(devices) if devices else None
+            iters = [
+                index.iter_before(upper)
+                for (level, device), index in self._index.items()
+                if (level_set is None or level in level_set)
+                and (device_set is None or device in device_set)
+            ]
+            seqs = heapq.merge(*iters, reverse=True)
+
+        results = []
+        for seq in seqs:
+            if seq < lower or len(results) >= limit:
+                break
+            entry = self._entry(seq)
+            if entry is not None:
+                results.append(entry)
+        return results
+
+
+def to_log_dict(entry):
+    """Ubah tuple entri log ke dict yang dipakai tampilan"""
+    seq, timestamp_ms, level, device, message = entry
+    return {
+        "seq": seq,
+        "timestamp": from_epoch_ms(timestamp_ms),
+        "level": level,
+        "message": message,
+        "device": device
+    }
+
+
+def log_frame(logs):
+    """DataFrame satu halaman log untuk grid tampilan (kolom Time, Level, Device, Message)"""
+    return pd.DataFrame({
+        "Time": [log['timestamp'] for log in logs],
+        "Level": [log['level'] for log in logs],
+        "Device": [log['device'] for log in logs],
+        "Message": [log['message'] for log in logs]
+    })
+
+
+def style_log_frame(df):
+    """Styler yang mewarnai kolom Level sesuai LEVEL_COLORS"""
+    return df.style.map(
+        lambda level: f"color: {LEVEL_COLORS.get(level, '#888')}; font-weight: bold;",
+        subset=["Level"]
+    )
@@ -0,0 +1,401 @@
+"""Instrumentasi pipeline dashboard: counter, gauge dan histogram ringan dengan ekspor teks Prometheus."""
+import bisect
+import socket
+import sys
+import threading
+import time
+import types
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+
+# Batas bucket histogram waktu (detik): 1 us hingga ~8 s, berlipat dua
+SECONDS_BUCKETS = tuple(1e-6 * 2 ** i for i in range(24))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Objek yang tidak ditelusuri isinya saat menghitung ukuran sesi
+_LEAF_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None))
+_SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+
+class Counter:
+    """Nilai yang hanya bertambah"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """Nilai terakhir yang di-set beserta waktu pembaruannya"""
+
+    def __init__(self):
+        self.value = 0
+        self.updated = time.monotonic()
+
+    def set(self, value):
+        self.value = value
+        self.updated = time.monotonic()
+
+
+class Histogram:
+    """Jumlah observasi per bucket tetap beserta total, jumlah dan nilai maksimum
+
+    Observasi hanya bisect dan penambahan di bawah lock, tanpa menyimpan sampel;
+    kuantil diperkirakan dengan interpolasi linear di dalam bucket.
+    """
+
+    def __init__(self, bounds=SECONDS_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self):
+        """(jumlah per bucket, jumlah observasi, total, maksimum) yang konsisten"""
+        with self._lock:
+            return list(self.counts), self.count, self.sum, self.max
+
+    def merge(self, snapshot):
+        """Tambahkan snapshot histogram lain dengan bucket yang sama (mis. dari proses worker)"""
+        counts, count, total, maximum = snapshot
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.count += count
+            self.sum += total
+            if maximum > self.max:
+                self.max = maximum
+
+    def quantile(self, q, snapshot=None):
+        """Perkiraan kuantil q (0..1), atau None jika belum ada observasi"""
+        counts, count, _, maximum = snapshot or self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        cumulative = 0
+        for i, n in enumerate(counts):
+            if n and cumulative + n >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else maximum
+                return min(lower + (upper - lower) * (rank - cumulative) / n, maximum)
+            cumulative += n
+        return maximum
+
+    def summary(self):
+        """Jumlah, rata-rata, p50/p95/p99 dan maksimum untuk ditampilkan"""
+        snapshot = self.snapshot()
+        _, count, total, maximum = snapshot
+        return {
+            'count': count,
+            'mean': total / count if count else None,
+            'p50': self.quantile(0.5, snapshot),
+            'p95': self.quantile(0.95, snapshot),
+            'p99': self.quantile(0.99, snapshot),
+            'max': maximum if count else None
+        }
+
+
+class MetricFamily:
+    """Satu metrik bernama dengan satu anak per kombinasi nilai label"""
+
+    def __init__(self, name, help_text, kind, labels, factory):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label_names = tuple(labels)
+        self.factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self.factory())
+        return child
+
+    def remove(self, *values):
+        with self._lock:
+            self._children.pop(values, None)
+
+    def prune(self, max_age_s):
+        """Buang gauge yang tidak diperbarui selama max_age_s (mis. sesi yang sudah ditutup)"""
+        horizon = time.monotonic() - max_age_s
+        with self._lock:
+            for values in [values for values, child in self._children.items() if child.updated < horizon]:
+                del self._children[values]
+
+    def children(self):
+        """List (nilai label, anak) saat ini"""
+        with self._lock:
+            return list(self._children.items())
+
+    # Jalan pintas untuk metrik tanpa label
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class CallbackFamily:
+    """Metrik yang nilainya dibaca dari fungsi saat diekspor (mis. panjang buffer)
+
+    func mengembalikan satu angka, atau dict nilai label (tuple) -> angka.
+    """
+
+    def __init__(self, name, help_text, kind, labels, func):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label_names = tuple(labels)
+        self.func = func
+
+    def children(self):
+        value = self.func()
+        if isinstance(value, dict):
+            return [(values, _fixed(number)) for values, number in value.items()]
+        return [((), _fixed(value))]
+
+
+def _fixed(value):
+    gauge = Gauge()
+    gauge.value = value
+    return gauge
+
+
+class MetricsRegistry:
+    """Kumpulan metrik satu proses; pendaftaran dengan nama yang sama mengembalikan metrik yang ada"""
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name, create):
+        family = self._families.get(name)
+        if family is None:
+            with self._lock:
+                family = self._families.get(name)
+                if family is None:
+                    family = self._families[name] = create()
+        return family
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(name, lambda: MetricFamily(name, help_text, 'counter', labels, Counter))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(name, lambda: MetricFamily(name, help_text, 'gauge', labels, Gauge))
+
+    def histogram(self, name, help_text, labels=(), bounds=SECONDS_BUCKETS):
+        return self._register(name, lambda: MetricFamily(name, help_text, 'histogram', labels,
+                                                         lambda: Histogram(bounds)))
+
+    def callback(self, name, help_text, func, kind='gauge', labels=()):
+        return self._register(name, lambda: CallbackFamily(name, help_text, kind, labels, func))
+
+    def get(self, name):
+        return self._families.get(name)
+
+    def render(self):
+        """Seluruh metrik dalam format teks eksposisi Prometheus 0.0.4"""
+        lines = []
+        for family in list(self._families.values()):
+            lines.append(f"# HELP {family.name} {_escape_help(family.help)}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, child in family.children():
+                labels = list(zip(family.label_names, values))
+                if family.kind == 'histogram':
+                    lines.extend(_histogram_lines(family.name, labels, child))
+                else:
+                    lines.append(f"{family.name}{_label_text(labels)} {_number(child.value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name, labels, histogram):
+    counts, count, total, _ = histogram.snapshot()
+    cumulative = 0
+    for bound, n in zip(histogram.bounds + (float('inf'),), counts):
+        cumulative += n
+        yield f"{name}_bucket{_label_text(labels + [('le', _number(bound))])} {cumulative}"
+    yield f"{name}_sum{_label_text(labels)} {_number(total)}"
+    yield f"{name}_count{_label_text(labels)} {count}"
+
+
+def _escape_help(text):
+    return str(text).replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    pairs = (f'{name}="{_escape_label(value)}"' for name, value in labels)
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape_label(value):
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _number(value):
+    value = float(value)
+    if value == float('inf'):
+        return "+Inf"
+    if value == float('-inf'):
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+
+
+# ==================== UKURAN SESI ====================
+def deep_sizeof(obj):
+    """Perkiraan ukuran objek beserta seluruh isinya dalam byte
+
+    DataFrame dan array numpy dihitung dari buffer datanya, figure Plotly dari
+    isi to_plotly_json(); objek lain ditelusuri lewat isi container dan
+    __dict__. Objek yang dirujuk berkali-kali hanya dihitung sekali.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            total += obj.nbytes
+        elif isinstance(obj, pd.DataFrame):
+            total += int(obj.memory_usage(index=True, deep=True).sum())
+        elif isinstance(obj, pd.Series):
+            total += int(obj.memory_usage(index=True, deep=True))
+        elif isinstance(obj, _SKIPPED_TYPES):
+            continue
+        elif hasattr(obj, 'to_plotly_json'):
+            stack.append(obj.to_plotly_json())
+        else:
+            total += sys.getsizeof(obj)
+            if isinstance(obj, _LEAF_TYPES):
+                continue
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+                stack.extend(obj)
+            elif hasattr(obj, '__dict__'):
+                stack.append(vars(obj))
+    return total
+
+
+# ==================== ENDPOINT PROMETHEUS ====================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path in self.server.routes:
+            self._stream(self.server.routes[path], query)
+            return
+        if path not in ('/', '/metrics') or self.server.registry is None:
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, route, query):
+        """Kirim (header, blok bytes) dari route tanpa Content-Length
+
+        Respons HTTP/1.0: akhir body ditandai dengan menutup koneksi, sehingga
+        blok bisa dikirim begitu dihasilkan tanpa menampung seluruh isi.
+        """
+        try:
+            headers, blocks = route(query)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            for block in blocks:
+                if block:
+                    self.wfile.write(block)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            close = getattr(blocks, 'close', None)
+            if close is not None:
+                close()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """Endpoint HTTP lokal (GET /metrics) yang menyajikan registry dalam format teks Prometheus
+
+    routes: path tambahan -> fungsi(query string) yang mengembalikan (dict header,
+    iterable blok bytes) untuk respons streaming; ValueError menjadi 400. Tanpa
+    registry hanya routes yang disajikan. public_url adalah alamat dasar untuk
+    link() jika server diakses lewat nama lain (mis. bind 0.0.0.0 atau proxy).
+    """
+
+    def __init__(self, registry, host="127.0.0.1", port=9108, routes=None, public_url=None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.routes = dict(routes or {})
+        self.public_url = public_url
+        self._server = None
+
+    def start(self):
+        """Mulai server di thread daemon; OSError jika port sudah dipakai"""
+        server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        server.daemon_threads = True
+        server.registry = self.registry
+        server.routes = self.routes
+        self.port = server.server_address[1]
+        self._server = server
+        threading.Thread(target=server.serve_forever, name="jmailbox-metrics", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def url(self):
+        return self.link("/metrics")
+
+    def link(self, path, params=None):
+        """URL path di server ini, params (dict atau list pasangan) menjadi query string"""
+        query = f"?{urlencode(params, doseq=True)}" if params else ""
+        if self.public_url:
+            return f"{self.public_url.rstrip('/')}{path}{query}"
+        host = socket.gethostname() if self.host in ("", "0.0.0.0", "::") else self.host
+        return f"http://{host}:{self.port}{path}{query}"
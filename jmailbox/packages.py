@@ -0,0 +1,173 @@
+"""Ledger paket per resi: setiap transisi dari pesan status dan payment dicatat."""
+import heapq
+import math
+from bisect import bisect_left, insort
+
+# Status akhir; paket dengan status ini tidak lagi dianggap aktif
+FINAL_STATUSES = frozenset({"Delivered", "Completed", "Cancelled", "Failed", "Returned"})
+
+
+def parse_amount(value):
+    """Nominal dari payload sebagai float (kosong = 0), atau None jika bukan angka"""
+    try:
+        amount = float(value or 0)
+    except (TypeError, ValueError):
+        return None
+    return amount if math.isfinite(amount) else None
+
+
+class PackageLedger:
+    """Paket diindeks hash per resi dan per device dalam urutan waktu kedatangan
+
+    Setiap paket mendapat seq yang naik monoton saat pertama terlihat; seq juga
+    menjadi cursor paginasi (terbaru dulu), seperti seq di LogStore.
+
+    Hanya `capacity` paket yang disimpan di memori: jika penuh, paket berstatus
+    akhir dengan seq terkecil dibuang lebih dulu, baru paket tertua yang masih
+    aktif. Paket lengkap tetap ada di riwayat SQLite.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.packages = {}
+        self.next_seq = 1
+        self.evicted = 0
+        self._by_seq = {}
+        self._seqs = []
+        self._by_device = {}
+        # Heap seq paket yang pernah mencapai status akhir (entri basi dilewati saat evict)
+        self._closed = []
+
+    def __len__(self):
+        return len(self.packages)
+
+    def get(self, resi):
+        return self.packages.get(resi)
+
+    def _create(self, resi, device_id, timestamp_ms, seq=None):
+        if seq is None:
+            seq = self.next_seq
+        self.next_seq = max(self.next_seq, seq + 1)
+        package = self.packages[resi] = {
+            'seq': seq,
+            'resi': resi,
+            'device': device_id,
+            'status': 'Pending',
+            'is_cod': False,
+            'amount': 0.0,
+            'paid': 0.0,
+            'money_slot': None,
+            'created': timestamp_ms,
+            'updated': timestamp_ms,
+            'events': []
+        }
+        self._by_seq[seq] = resi
+        # Paket lama yang dipulihkan dari riwayat bisa punya seq lebih kecil
+        insort(self._seqs, seq)
+        insort(self._by_device.setdefault(device_id, []), seq)
+        while len(self.packages) > self.capacity:
+            self._evict(keep=seq)
+        return package
+
+    def _evict(self, keep):
+        """Buang satu paket: status akhir dengan seq terkecil, atau paket tertua (selain `keep`)"""
+        seq = None
+        while self._closed:
+            candidate = heapq.heappop(self._closed)
+            resi = self._by_seq.get(candidate)
+            if candidate != keep and resi is not None and self.packages[resi]['status'] in FINAL_STATUSES:
+                seq = candidate
+                break
+        if seq is None:
+            seq = self._seqs[0] if self._seqs[0] != keep else self._seqs[1]
+        package = self.packages.pop(self._by_seq.pop(seq))
+        del self._seqs[bisect_left(self._seqs, seq)]
+        seqs = self._by_device[package['device']]
+        del seqs[bisect_left(seqs, seq)]
+        if not seqs:
+            del self._by_device[package['device']]
+        self.evicted += 1
+
+    def _closed_check(self, package):
+        if package['status'] in FINAL_STATUSES:
+            heapq.heappush(self._closed, package['seq'])
+
+    def record(self, resi, device_id, timestamp_ms, source, data):
+        """Catat satu pesan status/payment untuk resi; kembalikan (paket, event baru)
+
+        Nominal disimpan sebagai float; nominal yang bukan angka diabaikan
+        sehingga nilai sebelumnya tetap dipakai.
+        """
+        package = self.packages.get(resi)
+        if package is None:
+            package = self._create(resi, device_id, timestamp_ms)
+
+        if source == 'payment':
+            status = str(data.get('status', 'Paid'))
+            paid = parse_amount(data.get('amount'))
+            if 'amount' in data and paid is not None:
+                package['paid'] = paid
+            if data.get('money_slot') is not None:
+                package['money_slot'] = data['money_slot']
+        else:
+            status = str(data.get('status', 'In Progress'))
+            if status != package['status']:
+                package['status'] = status
+                self._closed_check(package)
+            if 'is_cod' in data:
+                package['is_cod'] = bool(data['is_cod'])
+            amount = parse_amount(data.get('amount'))
+            if 'amount' in data and amount is not None:
+                package['amount'] = amount
+        package['updated'] = max(package['updated'], timestamp_ms)
+
+        event = (timestamp_ms, source, status)
+        events = package['events']
+        # Status berulang dari sumber yang sama bukan transisi baru
+        if events and events[-1][1:] == event[1:]:
+            return package, None
+        events.append(event)
+        return package, event
+
+    def restore(self, seq, resi, device_id, status, is_cod, amount, paid, money_slot,
+                created, updated, events):
+        """Isi ulang satu paket dari riwayat (dipanggil urut seq naik)"""
+        package = self._create(resi, device_id, created, seq)
+        package.update(status=status, is_cod=bool(is_cod), amount=amount, paid=paid,
+                       money_slot=money_slot, updated=updated, events=list(events))
+        self._closed_check(package)
+        return package
+
+    def query(self, device_id=None, status=None, before=None, limit=50):
+        """Paket terbaru dulu, mundur dari cursor seq `before` (eksklusif)
+
+        Mengembalikan (list paket, cursor halaman berikutnya atau None).
+        """
+        seqs = self._seqs if device_id is None else self._by_device.get(device_id, [])
+        end = len(seqs) if before is None else bisect_left(seqs, before)
+        results = []
+        for i in range(end - 1, -1, -1):
+            package = self.packages[self._by_seq[seqs[i]]]
+            if status is not None and package['status'] != status:
+                continue
+            results.append(package)
+            if len(results) >= limit:
+                break
+        cursor = results[-1]['seq'] if len(results) == limit else None
+        return results, cursor
+
+    def active(self):
+        """Paket terakhir per device yang belum mencapai status akhir"""
+        active = []
+        for seqs in self._by_device.values():
+            package = self.packages[self._by_seq[seqs[-1]]]
+            if package['status'] not in FINAL_STATUSES:
+                active.append(package)
+        active.sort(key=lambda package: package['updated'], reverse=True)
+        return active
+
+    def statuses(self):
+        return sorted({package['status'] for package in self.packages.values()})
+
+    def devices(self):
+        return list(self._by_device)
@@ -0,0 +1,168 @@
+"""Parsing topik dan decode payload MQTT per channel.
+
+JSON didecode dengan orjson jika terpasang. Device juga boleh mengirim payload
+MessagePack (butuh paket msgpack) atau CBOR (butuh paket cbor2); formatnya
+dikenali dari byte pertama karena objek JSON selalu diawali '{' atau spasi.
+"""
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+TOPIC_PREFIX = "jmailbox"
+# Byte pertama map MessagePack (fixmap, map16, map32) dan CBOR (major type 5)
+MSGPACK_MAP_BYTES = frozenset(range(0x80, 0x90)) | {0xde, 0xdf}
+CBOR_MAP_BYTES = frozenset(range(0xa0, 0xc0))
+
+
+class PayloadError(ValueError):
+    """Payload tidak bisa didecode atau tidak sesuai skema channel"""
+
+
+def parse_topic(topic):
+    """'jmailbox/<device>/<channel>' menjadi (device_id, channel), atau None jika bukan format itu"""
+    parts = topic.split('/')
+    if len(parts) != 3 or parts[0] != TOPIC_PREFIX or not parts[1] or not parts[2]:
+        return None
+    return parts[1], parts[2]
+
+
+def _loads_json(payload):
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def _loads_msgpack(payload):
+    if msgpack is None:
+        raise PayloadError("MessagePack payload received but msgpack is not installed")
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+def _loads_cbor(payload):
+    if cbor2 is None:
+        raise PayloadError("CBOR payload received but cbor2 is not installed")
+    return cbor2.loads(payload)
+
+
+def loads(payload):
+    """Decode payload JSON, MessagePack atau CBOR (bytes) menjadi objek Python"""
+    if not payload:
+        raise PayloadError("Empty payload")
+    first = payload[0]
+    try:
+        if first in MSGPACK_MAP_BYTES:
+            return _loads_msgpack(payload)
+        if first in CBOR_MAP_BYTES:
+            return _loads_cbor(payload)
+        return _loads_json(payload)
+    except PayloadError:
+        raise
+    except Exception as e:
+        raise PayloadError(f"Malformed payload: {str(e)}") from e
+
+
+def backends():
+    """Nama decoder yang aktif, untuk ditampilkan di dashboard"""
+    return {
+        'json': 'orjson' if orjson is not None else 'json',
+        'msgpack': msgpack is not None,
+        'cbor': cbor2 is not None
+    }
+
+
+# ==================== VALIDASI PER CHANNEL ====================
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _validate_object(data):
+    if not isinstance(data, dict):
+        raise PayloadError(f"Expected an object, got {type(data).__name__}")
+    return data
+
+
+def _validate_sensor(data):
+    _validate_object(data)
+    if not any(_is_number(value) for value in data.values()):
+        raise PayloadError("Sensor payload has no numeric fields")
+    return data
+
+
+def _validate_alert(data):
+    _validate_object(data)
+    severity = data.get('severity', 1)
+    if not (_is_number(severity) or isinstance(severity, str)):
+        raise PayloadError("Alert severity must be a number")
+    return data
+
+
+def _amount(value):
+    """'amount' (angka atau teks angka) sebagai float, atau None jika bukan angka berhingga"""
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def _validate_status(data):
+    """Nominal status tidak menolak pesan: transisi resi dan status device tetap diproses
+
+    Teks kosong berarti 0; nominal yang bukan angka dibuang sehingga nilai
+    sebelumnya di PackageLedger tetap dipakai.
+    """
+    _validate_object(data)
+    amount = data.get('amount')
+    if amount is None:
+        return data
+    if amount == "":
+        data['amount'] = 0.0
+        return data
+    value = _amount(amount)
+    if value is None:
+        del data['amount']
+    else:
+        data['amount'] = value
+    return data
+
+
+def _validate_payment(data):
+    _validate_object(data)
+    amount = data.get('amount')
+    if amount is not None:
+        value = _amount(amount)
+        if value is None:
+            raise PayloadError("Payment amount must be a number")
+        data['amount'] = value
+    return data
+
+
+# channel -> validator; channel yang tidak terdaftar cukup harus berupa objek
+VALIDATORS = {
+    'status': _validate_status,
+    'sensor': _validate_sensor,
+    'alert': _validate_alert,
+    'log': _validate_object,
+    'payment': _validate_payment,
+}
+
+
+def decode(channel, payload):
+    """Decode dan validasi payload untuk channel; PayloadError jika gagal"""
+    return VALIDATORS.get(channel, _validate_object)(loads(payload))
@@ -0,0 +1,182 @@
+"""Ledger pembayaran COD append-only dengan total berjalan per slot, device dan hari."""
+import math
+from collections import deque, namedtuple
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+PaymentEvent = namedtuple('PaymentEvent', 'seq timestamp device resi slot amount status')
+
+# Status pembayaran yang menambah / mengurangi uang di slot; status lain hanya dicatat
+COLLECTED_STATUSES = frozenset({"paid", "success", "completed", "collected"})
+REFUNDED_STATUSES = frozenset({"refund", "refunded"})
+
+
+def day_of(timestamp_ms):
+    """Nomor hari (lokal) dari timestamp epoch ms"""
+    return timestamp_ms // DAY_MS
+
+
+def signed_amount(status, amount):
+    """Kontribusi satu event ke total uang: positif, negatif (refund) atau 0"""
+    status = status.lower()
+    if status in COLLECTED_STATUSES:
+        return amount
+    if status in REFUNDED_STATUSES:
+        return -amount
+    return 0
+
+
+class PaymentLedger:
+    """Event pembayaran yang tidak pernah diubah, plus total yang diperbarui per event
+
+    Rekonsiliasi harian membaca total per (hari, device) sehingga tidak perlu
+    memindai event. Hanya `capacity` event terakhir yang disimpan di memori;
+    event lengkap ada di riwayat SQLite.
+
+    Total hanya mencakup `retention_days` hari terakhir (sama dengan retensi
+    ledger di riwayat; None = selamanya): saat hari berganti, total hari yang
+    keluar jendela dikurangkan dari total per slot/device dan resi-nya dilupakan,
+    sehingga memori tidak tumbuh terus pada dashboard yang berjalan lama.
+    """
+
+    def __init__(self, capacity=10000, retention_days=365):
+        self.events = deque(maxlen=capacity)
+        self.next_seq = 1
+        self.retention_days = retention_days
+        # Total [jumlah event, nominal] per kunci
+        self.by_slot = {}
+        self.by_device = {}
+        self.collected = {}
+        self.expected = {}
+        # Nominal COD yang sudah dihitung per resi: (hari, device, nominal)
+        self._expected_by_resi = {}
+        # Per hari: total per (device, slot) dan resi yang diharapkan, untuk dikurangkan saat kedaluwarsa
+        self._slot_days = {}
+        self._resi_days = {}
+        self._today = None
+
+    def __len__(self):
+        return self.next_seq - 1
+
+    @staticmethod
+    def _add(totals, key, count, amount):
+        entry = totals.get(key)
+        if entry is None:
+            totals[key] = [count, amount]
+        else:
+            entry[0] += count
+            entry[1] += amount
+
+    @staticmethod
+    def _subtract(totals, key, count, amount):
+        entry = totals[key]
+        entry[0] -= count
+        entry[1] -= amount
+        if entry[0] <= 0:
+            del totals[key]
+
+    def _in_window(self, day):
+        """Majukan hari berjalan (buang hari kedaluwarsa); False jika `day` di luar retensi"""
+        if self.retention_days is None:
+            return True
+        if self._today is None or day > self._today:
+            self._today = day
+            self._expire(day - self.retention_days)
+        return day > self._today - self.retention_days
+
+    def _expire(self, horizon):
+        """Buang total dan resi semua hari <= horizon"""
+        for day in [day for day in self._slot_days if day <= horizon]:
+            for (device_id, slot), (count, amount) in self._slot_days.pop(day).items():
+                self._subtract(self.by_slot, (device_id, slot), count, amount)
+                self._subtract(self.by_device, device_id, count, amount)
+            self.collected.pop(day, None)
+        for day in [day for day in self._resi_days if day <= horizon]:
+            for resi in self._resi_days.pop(day):
+                del self._expected_by_resi[resi]
+            self.expected.pop(day, None)
+
+    def append(self, timestamp_ms, device_id, resi, slot, amount, status):
+        """Tambahkan satu event pembayaran dan perbarui semua total; kembalikan event"""
+        event = PaymentEvent(self.next_seq, timestamp_ms, device_id, resi, slot, amount, status)
+        self.next_seq += 1
+        self.events.append(event)
+        self._apply(event.timestamp, event.device, event.slot, 1, signed_amount(status, amount))
+        return event
+
+    def _apply(self, timestamp_ms, device_id, slot, count, amount):
+        day = day_of(timestamp_ms)
+        if not self._in_window(day):
+            return
+        self._add(self.by_slot, (device_id, slot), count, amount)
+        self._add(self.by_device, device_id, count, amount)
+        self._add(self.collected.setdefault(day, {}), device_id, count, amount)
+        self._add(self._slot_days.setdefault(day, {}), (device_id, slot), count, amount)
+
+    def expect(self, resi, device_id, created_ms, amount):
+        """Catat nominal COD yang harus ditagih untuk resi; perubahan nominal dihitung sebagai selisih
+
+        Nominal dikonversi ke float; ValueError jika bukan angka.
+        """
+        try:
+            value = float(amount or 0)
+        except (TypeError, ValueError):
+            value = math.nan
+        if not math.isfinite(value):
+            raise ValueError(f"Invalid COD amount {amount!r} for {resi}")
+        amount = value
+        day = day_of(created_ms)
+        if not self._in_window(day):
+            return
+        previous = self._expected_by_resi.get(resi)
+        if previous == (day, device_id, amount):
+            return
+        if previous is not None:
+            self._add(self.expected.setdefault(previous[0], {}), previous[1], -1, -previous[2])
+            self._resi_days[previous[0]].discard(resi)
+        self._add(self.expected.setdefault(day, {}), device_id, 1, amount)
+        self._expected_by_resi[resi] = (day, device_id, amount)
+        self._resi_days.setdefault(day, set()).add(resi)
+
+    # ==================== RIWAYAT ====================
+    def restore_events(self, rows):
+        """Isi event terakhir dari riwayat tanpa mengubah total (total dipulihkan terpisah)"""
+        for row in rows:
+            self.events.append(PaymentEvent(*row))
+            self.next_seq = max(self.next_seq, row[0] + 1)
+
+    def restore_collected(self, rows):
+        """Pulihkan total dari agregat SQL: (hari, device, slot, status, jumlah, nominal)"""
+        for day, device_id, slot, status, count, amount in rows:
+            self._apply(day * DAY_MS, device_id, slot, count, signed_amount(status, amount))
+
+    def restore_expected(self, rows):
+        """Pulihkan nominal COD per resi: (resi, device, created, amount)"""
+        for resi, device_id, created_ms, amount in rows:
+            self.expect(resi, device_id, created_ms, amount)
+
+    # ==================== PEMBACAAN ====================
+    def recent(self, limit=20):
+        """Event terbaru dulu"""
+        return [self.events[-i] for i in range(1, min(limit, len(self.events)) + 1)]
+
+    def reconcile(self, day):
+        """Rekonsiliasi COD satu hari per device dari total berjalan
+
+        Mengembalikan list dict device, expected/collected (jumlah dan nominal) dan selisih.
+        """
+        expected = self.expected.get(day, {})
+        collected = self.collected.get(day, {})
+        rows = []
+        for device_id in sorted(set(expected) | set(collected)):
+            expected_count, expected_amount = expected.get(device_id, (0, 0))
+            collected_count, collected_amount = collected.get(device_id, (0, 0))
+            rows.append({
+                'device': device_id,
+                'expected_count': expected_count,
+                'expected_amount': expected_amount,
+                'collected_count': collected_count,
+                'collected_amount': collected_amount,
+                'difference': collected_amount - expected_amount
+            })
+        return rows
@@ -0,0 +1,37 @@
+"""Token bucket untuk membatasi laju publish dan pesan masuk."""
+import time
+
+
+class TokenBucket:
+    """Token terisi `rate` per detik hingga `burst`; satu token per aksi"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_take(self, now=None):
+        """Ambil satu token jika ada; False berarti aksi harus ditolak"""
+        self._refill(self.clock() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now=None):
+        """Detik sampai satu token tersedia (0 jika sudah ada)"""
+        self._refill(self.clock() if now is None else now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        """Tunggu (sleep) sampai satu token tersedia lalu ambil"""
+        while not self.try_take():
+            self.sleep(self.wait_time())
@@ -0,0 +1,321 @@
+"""Penyimpanan deret waktu sensor berbasis ring buffer numpy."""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_ms(timestamp):
+    """Konversi datetime (waktu lokal naif) ke milidetik epoch"""
+    return int((timestamp - EPOCH).total_seconds() * 1000)
+
+
+def from_epoch_ms(timestamp_ms):
+    """Konversi milidetik epoch kembali ke datetime lokal naif"""
+    return EPOCH + timedelta(milliseconds=timestamp_ms)
+
+
+def now_ms():
+    """Waktu sekarang dalam milidetik epoch (skala yang sama dengan to_epoch_ms)"""
+    return to_epoch_ms(datetime.now())
+
+
+class RingBuffer:
+    """Ring buffer berkapasitas tetap untuk satu deret (timestamp + nilai)
+
+    Setiap sampel ditulis dua kali (di posisi i dan i + capacity) sehingga
+    jendela sepanjang apa pun selalu kontigu dan bisa dikembalikan sebagai
+    view numpy tanpa salinan. Append tetap O(1).
+    """
+
+    def __init__(self, capacity, dtype=np.float64):
+        self.capacity = capacity
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros(2 * capacity, dtype=dtype)
+        # Jumlah sampel yang pernah ditulis (tidak ikut terpotong kapasitas)
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, timestamp_ms, value):
+        """Tambahkan satu sampel, menimpa sampel terlama jika penuh"""
+        i = self.total % self.capacity
+        self._timestamps[i] = self._timestamps[i + self.capacity] = timestamp_ms
+        self._values[i] = self._values[i + self.capacity] = value
+        self.total += 1
+
+    def view(self, last_n=None):
+        """View (timestamps datetime64[ms], values) untuk last_n sampel terbaru
+
+        View berbagi memori dengan buffer: pakai segera, karena sampel terlama
+        di jendela penuh bisa tertimpa oleh append berikutnya.
+        """
+        n = len(self) if last_n is None else min(last_n, len(self))
+        start = (self.total - n) % self.capacity
+        timestamps = self._timestamps[start:start + n].view('datetime64[ms]')
+        return timestamps, self._values[start:start + n]
+
+    def latest(self):
+        """Sampel terakhir sebagai (timestamp_ms, value), atau None jika kosong"""
+        if self.total == 0:
+            return None
+        i = (self.total - 1) % self.capacity
+        return int(self._timestamps[i]), self._values[i].item()
+
+
+class SeriesRegistry:
+    """Ring buffer per (device, metrik); metrik numerik baru terdaftar otomatis"""
+
+    # Field payload yang bukan metrik sensor
+    IGNORED_FIELDS = frozenset(('timestamp', 'ts'))
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._series = {}
+        # Registry metrik: nama metrik -> set device yang mengirimnya
+        self.metrics = {}
+        # Jumlah sampel per metrik sejak awal (versi data untuk cache grafik)
+        self.totals = {}
+
+    def record(self, device_id, timestamp_ms, payload):
+        """Simpan semua field numerik dari satu payload sensor; kembalikan (metrik, nilai) yang disimpan"""
+        recorded = []
+        for metric, value in payload.items():
+            if metric in self.IGNORED_FIELDS:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            series = self._series.get((device_id, metric))
+            if series is None:
+                series = self._series[(device_id, metric)] = RingBuffer(self.capacity)
+                self.metrics.setdefault(metric, set()).add(device_id)
+            series.append(timestamp_ms, value)
+            self.totals[metric] = self.totals.get(metric, 0) + 1
+            recorded.append((metric, value))
+        return recorded
+
+    def devices(self, metric):
+        """Daftar device yang memiliki data untuk metrik ini"""
+        return sorted(self.metrics.get(metric, ()))
+
+    def get(self, device_id, metric):
+        """RingBuffer satu device dan metrik, atau None jika belum ada"""
+        return self._series.get((device_id, metric))
+
+    def view(self, device_id, metric, last_n=None):
+        """View zero-copy deret satu device, atau None jika belum ada"""
+        series = self._series.get((device_id, metric))
+        if series is None:
+            return None
+        return series.view(last_n)
+
+    def latest(self, metric):
+        """Sampel terbaru metrik ini di seluruh device sebagai (device, timestamp_ms, value)"""
+        latest = None
+        for device_id in self.metrics.get(metric, ()):
+            sample = self._series[(device_id, metric)].latest()
+            if sample and (latest is None or sample[0] > latest[1]):
+                latest = (device_id,) + sample
+        return latest
+
+    def aggregate(self, metric, bucket_ms=None, max_buckets=300):
+        """Agregat min/mean/max seluruh device per bucket waktu (vektorisasi numpy)
+
+        Mengembalikan dict berisi array 'timestamp', 'min', 'mean', 'max' dan 'count'.
+        """
+        views = [self._series[(device_id, metric)].view() for device_id in self.metrics.get(metric, ())]
+        if not views:
+            return None
+        timestamps = np.concatenate([ts for ts, _ in views]).view(np.int64)
+        values = np.concatenate([v for _, v in views])
+        if len(values) == 0:
+            return None
+
+        if bucket_ms is None:
+            span = int(timestamps.max() - timestamps.min())
+            bucket_ms = max(1000, span // max_buckets + 1)
+
+        buckets = timestamps // bucket_ms
+        order = np.argsort(buckets, kind='stable')
+        buckets = buckets[order]
+        values = values[order]
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        counts = np.diff(np.r_[starts, len(values)])
+
+        return {
+            'timestamp': (buckets[starts] * bucket_ms).view('datetime64[ms]'),
+            'min': np.minimum.reduceat(values, starts),
+            'mean': np.add.reduceat(values, starts) / counts,
+            'max': np.maximum.reduceat(values, starts),
+            'count': counts
+        }
+
+
+def decimate_minmax(timestamps, values, max_points):
+    """Decimasi min/max: setiap bin diwakili titik minimum dan maksimumnya
+
+    Bentuk garis (puncak dan lembah) tetap terlihat meskipun jumlah titik
+    dipangkas ke kira-kira lebar grafik dalam piksel.
+    """
+    n = len(values)
+    if n <= max_points:
+        return timestamps, values
+    size = -(-n // (max_points // 2))
+    bins = -(-n // size)
+    offsets = np.arange(bins) * size
+
+    padded = np.full(bins * size, np.inf)
+    padded[:n] = values
+    imin = padded.reshape(bins, size).argmin(axis=1) + offsets
+    padded[n:] = -np.inf
+    imax = padded.reshape(bins, size).argmax(axis=1) + offsets
+
+    idx = np.unique(np.concatenate((imin, imax)))
+    return timestamps[idx], values[idx]
+
+
+class MinMaxDecimator:
+    """Decimasi min/max inkremental untuk satu RingBuffer
+
+    Sampel dikelompokkan per bin berukuran tetap (menurut indeks global
+    sampel); update() hanya memproses sampel baru sejak panggilan terakhir.
+    Jika jumlah bin melebihi batas, bin bertetangga digabung dan ukuran bin
+    digandakan, sehingga keluaran selalu <= max_points titik.
+    """
+
+    def __init__(self, max_points=1500):
+        self.max_bins = max(1, max_points // 2 - 1)
+        self.seen = None
+        self.version = 0
+
+    def _reset(self, oldest, count):
+        """Mulai ulang dari sampel terlama yang masih ada di buffer"""
+        size = 1
+        while count > size * self.max_bins:
+            size *= 2
+        self.bin_size = size
+        self.first_bin = oldest // size
+        empty_i = np.empty(0, dtype=np.int64)
+        empty_f = np.empty(0, dtype=np.float64)
+        self.xmin, self.ymin, self.xmax, self.ymax = empty_i, empty_f, empty_i.copy(), empty_f.copy()
+        # Bin yang belum lengkap: [jumlah, xmin, ymin, xmax, ymax]; sampel sebelum `oldest` dihitung kosong
+        self.tail = [oldest % size, 0, np.inf, 0, -np.inf]
+        self.seen = oldest
+
+    def update(self, buffer):
+        """Proses sampel baru di buffer; True jika keluaran berubah"""
+        total = buffer.total
+        oldest = total - len(buffer)
+        if self.seen is None or self.seen < oldest:
+            self._reset(oldest, len(buffer))
+        new = total - self.seen
+        if new <= 0:
+            return False
+
+        timestamps, values = buffer.view(new)
+        timestamps = timestamps.view(np.int64)
+        size = self.bin_size
+        pos = 0
+
+        # Lengkapi bin yang belum penuh
+        tail = self.tail
+        take = min(size - tail[0], new)
+        if take:
+            self._merge_into_tail(timestamps[:take], values[:take])
+            pos = take
+        if self.tail[0] == size:
+            self._append_bins(*[np.array([v]) for v in self.tail[1:]])
+            self.tail = [0, 0, np.inf, 0, -np.inf]
+
+        # Bin penuh diproses sekaligus dengan reshape
+        full = (new - pos) // size
+        if full:
+            seg_t = timestamps[pos:pos + full * size].reshape(full, size)
+            seg_v = values[pos:pos + full * size].reshape(full, size)
+            rows = np.arange(full)
+            imin = seg_v.argmin(axis=1)
+            imax = seg_v.argmax(axis=1)
+            self._append_bins(seg_t[rows, imin], seg_v[rows, imin], seg_t[rows, imax], seg_v[rows, imax])
+            pos += full * size
+
+        # Sisa sampel menjadi bin yang belum penuh
+        if pos < new:
+            self._merge_into_tail(timestamps[pos:], values[pos:])
+        self.seen = total
+
+        # Buang bin yang sampelnya sudah tertimpa di ring buffer
+        first_valid = -(-oldest // self.bin_size)
+        drop = first_valid - self.first_bin
+        if drop > 0:
+            self.xmin, self.ymin = self.xmin[drop:], self.ymin[drop:]
+            self.xmax, self.ymax = self.xmax[drop:], self.ymax[drop:]
+            self.first_bin += drop
+
+        while len(self.ymin) + 1 > self.max_bins:
+            self._double()
+        self.version += 1
+        return True
+
+    def _merge_into_tail(self, timestamps, values):
+        """Gabungkan potongan sampel ke bin yang belum penuh"""
+        tail = self.tail
+        i = int(values.argmin())
+        if values[i] < tail[2]:
+            tail[1], tail[2] = int(timestamps[i]), float(values[i])
+        i = int(values.argmax())
+        if values[i] > tail[4]:
+            tail[3], tail[4] = int(timestamps[i]), float(values[i])
+        tail[0] += len(values)
+
+    def _append_bins(self, xmin, ymin, xmax, ymax):
+        self.xmin = np.concatenate((self.xmin, xmin))
+        self.ymin = np.concatenate((self.ymin, ymin))
+        self.xmax = np.concatenate((self.xmax, xmax))
+        self.ymax = np.concatenate((self.ymax, ymax))
+
+    def _double(self):
+        """Gabungkan pasangan bin bertetangga dan gandakan ukuran bin"""
+        xmin, ymin, xmax, ymax = self.xmin, self.ymin, self.xmax, self.ymax
+        # Sejajarkan ke indeks bin genap dengan bin kosong di depan
+        if self.first_bin % 2:
+            xmin = np.r_[0, xmin]
+            ymin = np.r_[np.inf, ymin]
+            xmax = np.r_[0, xmax]
+            ymax = np.r_[-np.inf, ymax]
+        # Bin terakhir tanpa pasangan dilebur ke bin yang belum penuh
+        if len(ymin) % 2:
+            tail = self.tail
+            merged = [self.bin_size + tail[0], tail[1], tail[2], tail[3], tail[4]]
+            if ymin[-1] < merged[2]:
+                merged[1], merged[2] = int(xmin[-1]), float(ymin[-1])
+            if ymax[-1] > merged[4]:
+                merged[3], merged[4] = int(xmax[-1]), float(ymax[-1])
+            self.tail = merged
+            xmin, ymin, xmax, ymax = xmin[:-1], ymin[:-1], xmax[:-1], ymax[:-1]
+
+        pairs = len(ymin) // 2
+        pick_min = np.where(ymin[0::2] <= ymin[1::2], 0, 1) + np.arange(pairs) * 2
+        pick_max = np.where(ymax[0::2] >= ymax[1::2], 0, 1) + np.arange(pairs) * 2
+        self.xmin, self.ymin = xmin[pick_min], ymin[pick_min]
+        self.xmax, self.ymax = xmax[pick_max], ymax[pick_max]
+        self.first_bin //= 2
+        self.bin_size *= 2
+
+    def points(self):
+        """Titik hasil decimasi (timestamps datetime64[ms], values) urut waktu"""
+        xmin, ymin, xmax, ymax = self.xmin, self.ymin, self.xmax, self.ymax
+        tail = self.tail
+        if tail[2] != np.inf:
+            xmin, ymin = np.r_[xmin, tail[1]], np.r_[ymin, tail[2]]
+            xmax, ymax = np.r_[xmax, tail[3]], np.r_[ymax, tail[4]]
+
+        min_first = xmin <= xmax
+        x = np.empty(2 * len(xmin), dtype=np.int64)
+        y = np.empty(2 * len(ymin), dtype=np.float64)
+        x[0::2] = np.where(min_first, xmin, xmax)
+        y[0::2] = np.where(min_first, ymin, ymax)
+        x[1::2] = np.where(min_first, xmax, xmin)
+        y[1::2] = np.where(min_first, ymax, ymin)
+        return x.view('datetime64[ms]'), y
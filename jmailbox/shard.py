@@ -0,0 +1,447 @@
+"""Ingest MQTT terbagi ke proses worker: decode paralel per partisi device ke satu store gabungan.
+
+Setiap worker menjalankan klien paho sendiri ke semua broker, mendecode dan
+memvalidasi payload, lalu mengirim entri buffer yang sudah jadi ke proses
+dashboard lewat pipe miliknya sendiri (tanpa lock antar proses, sehingga
+worker yang mati tidak mengunci worker lain). Dua mode pembagian:
+
+- share (default): subscription bersama MQTT 5 / EMQX / HiveMQ / Mosquitto 2
+  ($share/<group>/<topik>), broker mengirim setiap pesan ke tepat satu worker.
+  Trafik jaringan dan parse topik tidak berlipat, tetapi pesan satu device
+  bisa diproses worker berbeda sehingga urutan antar worker tidak dijamin
+  (status dan log satu device bisa tiba terbalik dalam satu drain). Group
+  harus unik per dashboard: dua dashboard dengan group sama saling membagi
+  pesan. Topik kamera tetap langsung dan hanya di shard 0 karena potongan
+  satu frame harus dirakit satu assembler. Dengan satu shard topik di-
+  subscribe langsung tanpa $share.
+- hash: untuk broker tanpa $share. Setiap worker subscribe semua topik dan
+  hanya memproses device dengan crc32(device) % shards == nomor shard, jadi
+  urutan pesan per device terjaga. Harganya, broker mengirim setiap pesan ke
+  semua worker: trafik jaringan, parse topik dan callback paho berlipat
+  sebanyak jumlah shard, dan hanya decode yang benar-benar terbagi.
+
+Pada kedua mode setiap pesan diproses tepat satu worker.
+"""
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from multiprocessing.connection import wait
+
+import paho.mqtt.client as mqtt
+
+from jmailbox.camera import FrameAssembler, is_frame_payload
+from jmailbox.commands import reply_id
+from jmailbox.metrics import Histogram
+from jmailbox.payloads import PayloadError, decode, parse_topic
+from jmailbox.series import now_ms
+
+MODES = ("share", "hash")
+BATCH_SIZE = 256            # Entri per kiriman ke proses dashboard
+FLUSH_INTERVAL_S = 0.02     # Jeda kirim batch dari worker
+REPORT_INTERVAL_S = 1.0     # Jeda laporan statistik worker dan cek proses mati
+
+
+def shard_of(device_id, shards):
+    """Shard pemilik device; crc32 stabil antar proses (hash() str diacak per proses)"""
+    return zlib.crc32(device_id.encode()) % shards
+
+
+def parse_brokers(text, default_port=1883):
+    """'host[:port],host2[:port]' -> list (host, port); ValueError jika port tidak valid"""
+    brokers = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, separator, port = item.rpartition(':')
+        if not separator:
+            host, port = item, str(default_port)
+        if not host or not port.isdigit():
+            raise ValueError(f"Invalid broker '{item}' (expected host:port)")
+        brokers.append((host, int(port)))
+    return brokers
+
+
+def shard_topics(topics, shard, shards, mode, share_group):
+    """Filter topik yang di-subscribe satu shard"""
+    if mode == 'hash' or shards == 1:
+        return list(topics)
+    subscriptions = []
+    for topic in topics:
+        if topic.rsplit('/', 1)[-1] == 'camera':
+            if shard == 0:
+                subscriptions.append(topic)
+        else:
+            subscriptions.append(f"$share/{share_group}/{topic}")
+    return subscriptions
+
+
+# ==================== PROSES WORKER ====================
+class ShardWorker:
+    """Isi satu proses worker: klien paho per broker, decode, dan batch ke proses dashboard
+
+    Callback paho setiap broker berjalan di thread klien masing-masing dan
+    diserialkan dengan satu lock (decode terikat GIL, assembler tidak
+    thread-safe). Thread utama mengirim batch dan laporan statistik lewat conn
+    sampai proses dashboard mengirim tanda berhenti atau menutup pipe.
+    """
+
+    def __init__(self, shard, shards, brokers, topics, mode, share_group, coalesce_channels,
+                 conn, capacity=10000, reconnect_min_s=1, reconnect_max_s=60):
+        self.shard = shard
+        self.shards = shards
+        self.brokers = list(brokers)
+        self.topics = shard_topics(topics, shard, shards, mode, share_group)
+        self.mode = mode
+        self.coalesce_channels = frozenset(coalesce_channels)
+        self.conn = conn
+        self.reconnect_min_s = reconnect_min_s
+        self.reconnect_max_s = reconnect_max_s
+        # (item, kunci coalesce) yang belum dikirim; yang terlama dibuang jika penuh
+        self.pending = deque()
+        self.capacity = capacity
+        self.assembler = FrameAssembler()
+        self.clients = []
+        self.connected = [False] * len(self.brokers)
+        self._lock = threading.Lock()
+        self._logged_failures = set()
+        # mid SUBSCRIBE -> (indeks broker, topik) sampai SUBACK datang
+        self._subscribing = {}
+        self._reset_report()
+
+    def _reset_report(self):
+        # Selisih sejak laporan sebelumnya
+        self.counts = {'received': 0, 'skipped': 0, 'forwarded': 0, 'dropped': 0}
+        self.channels = {}
+        self.decode_seconds = {}
+        self.failures = {}
+
+    def run(self):
+        for index, (host, port) in enumerate(self.brokers):
+            client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2, 
+                                 client_id=f"dashboard_{int(time.time())}_s{self.shard}b{index}")
+            client.user_data_set(index)
+            client.on_connect = self._on_connect
+            client.on_disconnect = self._on_disconnect
+            client.on_subscribe = self._on_subscribe
+            client.on_message = self._on_message
+            client.reconnect_delay_set(self.reconnect_min_s, self.reconnect_max_s)
+            client.connect_async(host, port, 60)
+            client.loop_start()
+            self.clients.append(client)
+
+        # poll() juga True saat pipe tertutup, mis. proses dashboard mati
+        next_report = time.monotonic() + REPORT_INTERVAL_S
+        try:
+            while not self.conn.poll(FLUSH_INTERVAL_S):
+                self.flush()
+                if time.monotonic() >= next_report:
+                    self.conn.send(('REPORT', self.shard, self.report()))
+                    next_report += REPORT_INTERVAL_S
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            for client in self.clients:
+                client.disconnect()
+                client.loop_stop()
+
+    def _put(self, item, coalesce_key=None):
+        if len(self.pending) >= self.capacity:
+            self.pending.popleft()
+            self.counts['dropped'] += 1
+        self.pending.append((item, coalesce_key))
+
+    def flush(self):
+        """Kirim entri tertunda ke proses dashboard per batch"""
+        while True:
+            with self._lock:
+                batch = [self.pending.popleft() for _ in range(min(BATCH_SIZE, len(self.pending)))]
+                self.counts['forwarded'] += len(batch)
+            if not batch:
+                return
+            self.conn.send(('BATCH', self.shard, batch))
+
+    def report(self):
+        """Statistik sejak laporan sebelumnya (histogram decode sebagai snapshot)"""
+        with self._lock:
+            report = dict(
+                self.counts,
+                pid=os.getpid(),
+                connected=list(self.connected),
+                channels=self.channels,
+                decode={channel: histogram.snapshot() for channel, histogram in self.decode_seconds.items()},
+                failures=self.failures
+            )
+            self._reset_report()
+        return report
+
+    def _broker_name(self, index):
+        host, port = self.brokers[index]
+        return f"{host}:{port}"
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        with self._lock:
+            if not reason_code.is_failure:
+                self.connected[userdata] = True
+                for topic in self.topics:
+                    _, mid = client.subscribe(topic, qos=1)
+                    self._subscribing[mid] = (userdata, topic)
+                self._put(("INFO", f"Shard {self.shard} connected to {self._broker_name(userdata)}"))
+            else:
+                self._put(("ERROR", f"Shard {self.shard} connection to {self._broker_name(userdata)} "
+                                    f"failed: {reason_code}"))
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        with self._lock:
+            self.connected[userdata] = False
+            if reason_code != 0:
+                self._put(("ERROR", f"Shard {self.shard} disconnected from {self._broker_name(userdata)} "
+                                    f"({reason_code})"))
+
+    def _on_subscribe(self, client, userdata, mid, reason_codes, properties):
+        with self._lock:
+            index, topic = self._subscribing.pop(mid, (userdata, "?"))
+            # Broker menolak (0x80 di MQTT 3.1.1), mis. $share tidak didukung
+            if any(code.is_failure for code in reason_codes):
+                hint = " (broker may not support $share; set JMAILBOX_INGEST_SHARD_MODE=hash)" \
+                    if topic.startswith("$share/") else ""
+                self._put(("ERROR", f"Shard {self.shard} subscription to '{topic}' rejected by "
+                                    f"{self._broker_name(index)}{hint}"))
+
+    def _on_message(self, client, userdata, msg):
+        with self._lock:
+            self.counts['received'] += 1
+            device_id = None
+            try:
+                parsed = parse_topic(msg.topic)
+                if parsed is None:
+                    raise PayloadError(f"Unexpected topic '{msg.topic}'")
+                device_id, channel = parsed
+                if self.mode == 'hash' and shard_of(device_id, self.shards) != self.shard:
+                    self.counts['skipped'] += 1
+                    return
+                self.channels[channel] = self.channels.get(channel, 0) + 1
+                if channel == 'camera' and is_frame_payload(msg.payload):
+                    frame = self.assembler.feed(device_id, msg.payload, now_ms())
+                    if frame is not None:
+                        self._put(("CAMERA", {"topic": msg.topic, "frame": frame, "broker": userdata}))
+                    return
+
+                started = time.perf_counter()
+                data = decode(channel, msg.payload)
+                histogram = self.decode_seconds.get(channel)
+                if histogram is None:
+                    histogram = self.decode_seconds[channel] = Histogram()
+                histogram.observe(time.perf_counter() - started)
+
+                # Aturan coalesce sama dengan IngestService._on_message
+                coalesce_key = None
+                if channel in self.coalesce_channels and not (data.get('resi') or reply_id(data)):
+                    coalesce_key = (device_id, channel)
+                self._put(("DATA", {
+                    "topic": msg.topic,
+                    "device": device_id,
+                    "channel": channel,
+                    "data": data,
+                    "timestamp": datetime.now(),
+                    "broker": userdata
+                }), coalesce_key)
+            except PayloadError as e:
+                key = device_id or '(unknown)'
+                count, _ = self.failures.get(key, (0, None))
+                self.failures[key] = (count + 1, str(e))
+                if key not in self._logged_failures:
+                    self._logged_failures.add(key)
+                    self._put(("ERROR", f"Invalid payload from {key}: {str(e)}"))
+            except Exception as e:
+                self._put(("ERROR", f"Error processing MQTT message: {str(e)}"))
+
+
+def run_worker(*args):
+    """Entry point proses worker (harus fungsi modul agar bisa dipakai start method spawn)"""
+    try:
+        ShardWorker(*args).run()
+    except KeyboardInterrupt:
+        pass
+
+
+# ==================== PROSES DASHBOARD ====================
+class ShardPool:
+    """Proses worker ingest beserta thread penerima di proses dashboard
+
+    on_batch(shard, list (item, kunci coalesce)) dan on_report(shard, laporan)
+    dipanggil dari thread penerima. Worker yang mati dijalankan ulang dengan
+    pipe baru.
+    """
+
+    def __init__(self, brokers, topics, shards, mode="share", share_group=None,
+                 coalesce_channels=("status",), capacity=10000, reconnect_min_s=1, reconnect_max_s=60):
+        if mode not in MODES:
+            raise ValueError(f"Unknown shard mode: {mode}")
+        if shards < 1:
+            raise ValueError("At least one shard is required")
+        self.brokers = list(brokers)
+        self.topics = list(topics)
+        self.shards = shards
+        self.mode = mode
+        # Group unik per proses agar dua dashboard di broker yang sama tidak saling membagi pesan
+        self.share_group = share_group or f"jmailbox-{socket.gethostname()}-{os.getpid()}"
+        self.coalesce_channels = tuple(coalesce_channels)
+        self.capacity = capacity
+        self.reconnect_min_s = reconnect_min_s
+        self.reconnect_max_s = reconnect_max_s
+        self.stats = [self._new_stats(shard) for shard in range(shards)]
+        # spawn: proses dashboard sudah punya thread (event loop, paho), fork tidak aman
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = [None] * shards
+        self._conns = [None] * shards
+        self._stopping = None
+        self._thread = None
+        self._on_batch = None
+        self._on_report = None
+
+    @staticmethod
+    def _new_stats(shard):
+        return {
+            'shard': shard,
+            'pid': None,
+            'connected': [],
+            'received': 0,
+            'skipped': 0,
+            'forwarded': 0,
+            'dropped': 0,
+            'restarts': 0,
+            'reported_at': None
+        }
+
+    def start(self, on_batch, on_report):
+        self._on_batch = on_batch
+        self._on_report = on_report
+        self._stopping = threading.Event()
+        for shard in range(self.shards):
+            self._spawn(shard)
+        self._thread = threading.Thread(target=self._receive, args=(self._stopping,),
+                                        name="jmailbox-shards", daemon=True)
+        self._thread.start()
+        return self
+
+    def _spawn(self, shard):
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=run_worker,
+            args=(shard, self.shards, self.brokers, self.topics, self.mode, self.share_group,
+                  self.coalesce_channels, child_conn, self.capacity,
+                  self.reconnect_min_s, self.reconnect_max_s),
+            name=f"jmailbox-shard-{shard}",
+            daemon=True
+        )
+        process.start()
+        # Ujung milik worker ditutup di sini agar EOF terdeteksi saat worker mati
+        child_conn.close()
+        if self._conns[shard] is not None:
+            self._conns[shard].close()
+        self._processes[shard] = process
+        self._conns[shard] = conn
+        self.stats[shard]['pid'] = process.pid
+
+    def stop(self, timeout=5.0):
+        """Hentikan worker (terminate jika tidak berhenti dalam timeout) dan thread penerima"""
+        if self._stopping is None:
+            return
+        self._stopping.set()
+        self._thread.join(REPORT_INTERVAL_S * 2)
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        for process, conn in zip(self._processes, self._conns):
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self._processes = [None] * self.shards
+        self._conns = [None] * self.shards
+        self._stopping = None
+
+    def restart(self, brokers=None):
+        """Jalankan ulang semua worker, mis. setelah daftar broker berubah"""
+        if brokers is not None:
+            self.brokers = list(brokers)
+        if self._stopping is not None:
+            self.stop()
+            self.start(self._on_batch, self._on_report)
+
+    @property
+    def running(self):
+        return self._stopping is not None
+
+    def _receive(self, stopping):
+        closed = set()
+        next_check = time.monotonic() + REPORT_INTERVAL_S
+        while not stopping.is_set():
+            conns = [conn for conn in self._conns if conn not in closed]
+            for conn in wait(conns, timeout=REPORT_INTERVAL_S):
+                try:
+                    kind, shard, payload = conn.recv()
+                except (EOFError, OSError):
+                    # Worker mati; dijalankan ulang saat cek berikutnya
+                    closed.add(conn)
+                    continue
+                if kind == 'BATCH':
+                    self._on_batch(shard, payload)
+                else:
+                    self._merge_report(shard, payload)
+                    self._on_report(shard, payload)
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + REPORT_INTERVAL_S
+                self._restart_dead()
+
+    def _merge_report(self, shard, report):
+        stats = self.stats[shard]
+        for key in ('received', 'skipped', 'forwarded', 'dropped'):
+            stats[key] += report[key]
+        stats['pid'] = report['pid']
+        stats['connected'] = report['connected']
+        stats['reported_at'] = time.time()
+
+    def _restart_dead(self):
+        for shard, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            self.stats[shard]['restarts'] += 1
+            self.stats[shard]['connected'] = []
+            self._on_batch(shard, [(("ERROR", f"Ingest shard {shard} exited with code {process.exitcode}; "
+                                              f"restarting"), None)])
+            self._spawn(shard)
+
+    def alive(self, shard):
+        process = self._processes[shard]
+        return process is not None and process.is_alive()
+
+    def shard_stats(self):
+        """Salinan statistik kumulatif per shard beserta status prosesnya"""
+        return [dict(stats, alive=self.alive(stats['shard'])) for stats in self.stats]
+
+    def register_metrics(self, metrics):
+        """Metrik per shard (label shard) yang dibaca dari statistik saat ekspor"""
+        def per_shard(func):
+            return lambda: {(str(stats['shard']),): func(stats) for stats in self.shard_stats()}
+
+        for key, help_text in (('received', "MQTT messages received by each ingest shard"),
+                               ('skipped', "Messages discarded by a shard because another shard owns the device"),
+                               ('forwarded', "Buffer entries sent from each shard to the dashboard process"),
+                               ('dropped', "Entries dropped in a shard because the dashboard process fell behind"),
+                               ('restarts', "Times each shard worker process was restarted")):
+            metrics.callback(f'jmailbox_shard_{key}_total', help_text,
+                             per_shard(lambda stats, key=key: stats[key]), kind='counter', labels=('shard',))
+        metrics.callback('jmailbox_shard_up', "1 while the shard worker process is running",
+                         per_shard(lambda stats: int(stats['alive'])), labels=('shard',))
+        metrics.callback('jmailbox_shard_connected_brokers', "Brokers each shard is connected to",
+                         per_shard(lambda stats: sum(stats['connected'])), labels=('shard',))
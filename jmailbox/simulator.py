@@ -0,0 +1,454 @@
+"""Simulator armada J-MAILBOX serta perekam/pemutar ulang lalu lintas MQTT (NDJSON).
+
+Contoh:
+    python -m jmailbox.simulator simulate --mailboxes 200 --rate 2000 --duration 60 --broker localhost
+    python -m jmailbox.simulator simulate --mailboxes 50 --rate 500 --duration 30 --record traffic.ndjson
+    python -m jmailbox.simulator record --broker localhost --duration 60 --out traffic.ndjson
+    python -m jmailbox.simulator replay traffic.ndjson --speed 10 --broker localhost
+"""
+import argparse
+import base64
+import io
+import json
+import random
+import threading
+import time
+
+from jmailbox.camera import frame_chunks
+
+MIN_SPEED = 1
+MAX_SPEED = 100
+
+# Bobot channel per tipe device (proporsi pesan yang dikirim)
+MAILBOX_CHANNELS = (("sensor", 60), ("status", 20), ("log", 12), ("alert", 3), ("payment", 5))
+CAMERA_CHANNELS = (("camera", 70), ("status", 20), ("log", 10))
+
+PACKAGE_FLOW = ("Pending", "In Progress", "Delivered")
+LOG_MESSAGES = (
+    ("INFO", "Door closed"),
+    ("INFO", "Package detected"),
+    ("DEBUG", "Sensor loop tick"),
+    ("WARNING", "WiFi signal weak"),
+    ("ERROR", "Servo timeout"),
+)
+ALERT_REASONS = (("Door forced open", 3), ("Tamper detected", 3), ("Unexpected motion", 2),
+                 ("Low battery", 1))
+
+
+def _test_jpeg(seed, size=(320, 240)):
+    """JPEG sintetis kecil untuk frame kamera (berbeda per kamera)"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    pixels = image.load()
+    for _ in range(400):
+        pixels[rng.randrange(size[0]), rng.randrange(size[1])] = (255, 255, 255)
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=70)
+    return out.getvalue()
+
+
+class FleetSimulator:
+    """Lalu lintas realistis untuk sejumlah mailbox virtual (ESP32) dan kamera (ESP32-CAM)
+
+    Setiap mailbox menjalankan siklus paket Pending -> In Progress -> Delivered;
+    paket COD menghasilkan pesan payment saat terkirim. Hasilnya deterministik
+    untuk seed yang sama.
+    """
+
+    def __init__(self, mailboxes=10, cameras=None, seed=None, chunk_size=4096, prefix="sim"):
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        cameras = max(1, mailboxes // 4) if cameras is None else cameras
+        self.devices = []
+        for i in range(mailboxes):
+            self.devices.append({
+                'id': f"{prefix}-mb{i:04d}",
+                'type': 'ESP32',
+                'tags': [f"zone-{i % 5}"],
+                'distance': self.rng.uniform(5, 60),
+                'temperature': self.rng.uniform(24, 32),
+                'package': None,
+                'packages': 0
+            })
+        for i in range(cameras):
+            self.devices.append({
+                'id': f"{prefix}-cam{i:04d}",
+                'type': 'ESP32-CAM',
+                'tags': [f"zone-{i % 5}"],
+                'frame_id': 0,
+                'jpeg': _test_jpeg(i)
+            })
+        self._mailbox_channels = self._weights(MAILBOX_CHANNELS)
+        self._camera_channels = self._weights(CAMERA_CHANNELS)
+
+    @staticmethod
+    def _weights(table):
+        return [channel for channel, _ in table], [weight for _, weight in table]
+
+    def messages(self, rate, duration=None, count=None):
+        """Pesan (offset detik, topic, payload bytes) dengan laju total `rate` per detik
+
+        Berhenti setelah `duration` detik atau `count` pesan (salah satu wajib,
+        kecuali generator dihentikan pemanggil).
+        """
+        i = 0
+        while (count is None or i < count) and (duration is None or i / rate < duration):
+            offset = i / rate
+            for topic, payload in self.next_messages():
+                yield offset, topic, payload
+                i += 1
+
+    def next_messages(self):
+        """Satu kejadian dari device acak: list (topic, payload), lebih dari satu untuk frame terpotong"""
+        device = self.rng.choice(self.devices)
+        channels, weights = self._camera_channels if device['type'] == 'ESP32-CAM' else self._mailbox_channels
+        channel = self.rng.choices(channels, weights)[0]
+        topic = f"jmailbox/{device['id']}/{channel}"
+        if channel == 'camera':
+            return [(topic, chunk) for chunk in self._camera(device)]
+        data = getattr(self, f"_{channel}")(device)
+        if data is None:
+            data = self._status(device)
+            topic = f"jmailbox/{device['id']}/status"
+        return [(topic, json.dumps(data).encode())]
+
+    def _sensor(self, device):
+        rng = self.rng
+        device['distance'] = min(80.0, max(2.0, device['distance'] + rng.gauss(0, 1.5)))
+        device['temperature'] += rng.gauss(0, 0.05)
+        return {
+            "distance": round(device['distance'], 1),
+            "temperature": round(device['temperature'], 2),
+            "humidity": round(rng.uniform(55, 80), 1),
+            "weight": round(rng.uniform(0, 5), 2) if device['package'] else 0.0
+        }
+
+    def _status(self, device):
+        rng = self.rng
+        data = {
+            "type": device['type'],
+            "tags": device['tags'],
+            "free_heap": rng.randrange(80000, 200000),
+            "rssi": rng.randrange(-90, -40)
+        }
+        if device['type'] != 'ESP32':
+            return data
+        package = device['package']
+        if package is None or package['status'] == PACKAGE_FLOW[-1]:
+            # Paket baru setelah paket sebelumnya selesai
+            device['packages'] += 1
+            package = device['package'] = {
+                "resi": f"JM{device['id'][-4:]}{device['packages']:06d}",
+                "status": PACKAGE_FLOW[0],
+                "is_cod": rng.random() < 0.4,
+                "amount": rng.choice((15000, 25000, 50000, 75000, 100000))
+            }
+        else:
+            package['status'] = PACKAGE_FLOW[PACKAGE_FLOW.index(package['status']) + 1]
+        data.update(package)
+        return data
+
+    def _log(self, device):
+        level, message = self.rng.choice(LOG_MESSAGES)
+        return {"level": level, "message": message}
+
+    def _alert(self, device):
+        reason, severity = self.rng.choice(ALERT_REASONS)
+        return {"reason": reason, "severity": severity, "message": f"{reason} at {device['id']}"}
+
+    def _payment(self, device):
+        """Pembayaran untuk paket COD yang sudah terkirim; None jika tidak ada yang ditagih"""
+        package = device['package']
+        if not package or not package['is_cod'] or package['status'] != PACKAGE_FLOW[-1] \
+                or package.get('paid'):
+            return None
+        package['paid'] = True
+        return {
+            "resi": package['resi'],
+            "amount": package['amount'],
+            "money_slot": self.rng.randrange(1, 4),
+            "status": "paid"
+        }
+
+    def _camera(self, device):
+        device['frame_id'] += 1
+        capture = self.rng.random() < 0.02
+        return frame_chunks(device['frame_id'], device['jpeg'], self.chunk_size, capture)
+
+
+# ==================== TUJUAN PESAN ====================
+class ServiceSink:
+    """Kirim pesan langsung ke IngestService di proses yang sama (tanpa broker)
+
+    Dengan drain_every, sink sendiri yang drain buffer layanan setiap sekian
+    pesan dan saat ditutup, untuk layanan terpisah yang event loop-nya tidak
+    pernah dijalankan.
+    """
+
+    def __init__(self, service, drain_every=None):
+        self.service = service
+        self.drain_every = drain_every
+        self._unsent = 0
+
+    def send(self, topic, payload):
+        self.service.inject(topic, payload)
+        if self.drain_every:
+            self._unsent += 1
+            if self._unsent >= self.drain_every:
+                self._unsent = 0
+                self.service.drain()
+
+    def close(self):
+        if self.drain_every:
+            while len(self.service.buffer) and self.service.drain():
+                pass
+
+
+class MqttSink:
+    """Publish pesan ke broker MQTT dengan klien paho sendiri"""
+
+    def __init__(self, broker, port=1883, qos=0, timeout=5.0):
+        import paho.mqtt.client as mqtt
+
+        self.qos = qos
+        self.client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                                  client_id=f"jmailbox_sim_{int(time.time())}")
+        connected = threading.Event()
+        self.client.on_connect = lambda client, userdata, flags, reason_code, properties: (
+            not reason_code.is_failure and connected.set())
+        self.client.connect(broker, port, 60)
+        self.client.loop_start()
+        if not connected.wait(timeout):
+            self.close()
+            raise ConnectionError(f"Could not connect to MQTT broker {broker}:{port}")
+
+    def send(self, topic, payload):
+        self.client.publish(topic, payload, qos=self.qos)
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+class RecordingSink:
+    """Tulis setiap pesan ke file NDJSON (dan teruskan ke sink lain jika ada)
+
+    Satu baris per pesan: {"t": offset detik, "topic": ..., "payload": teks} atau
+    "payload_b64" untuk payload biner (frame kamera, MessagePack, CBOR).
+    """
+
+    def __init__(self, path, inner=None):
+        self.file = open(path, "w", encoding="utf-8")
+        self.inner = inner
+        self.started = time.monotonic()
+        self.offset = None
+
+    def send(self, topic, payload, offset=None):
+        record = {"t": round(time.monotonic() - self.started if offset is None else offset, 6),
+                  "topic": topic}
+        try:
+            record["payload"] = payload.decode("utf-8") if payload[:1] in (b"{", b"[") else None
+        except UnicodeDecodeError:
+            record["payload"] = None
+        if record["payload"] is None:
+            del record["payload"]
+            record["payload_b64"] = base64.b64encode(payload).decode("ascii")
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        if self.inner is not None:
+            self.inner.send(topic, payload)
+
+    def close(self):
+        self.file.close()
+        if self.inner is not None:
+            self.inner.close()
+
+
+def read_recording(path):
+    """Pesan dari file NDJSON rekaman: (offset detik, topic, payload bytes)"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "payload_b64" in record:
+                payload = base64.b64decode(record["payload_b64"])
+            else:
+                payload = record["payload"].encode("utf-8")
+            yield record["t"], record["topic"], payload
+
+
+# ==================== PENGGERAK ====================
+def run(messages, sink, speed=1.0, stop_event=None, stats=None):
+    """Kirim pesan (offset, topic, payload) ke sink sesuai jadwal offset / speed
+
+    Tidur hanya jika pengiriman mendahului jadwal, sehingga laju tinggi tidak
+    dibatasi resolusi sleep. Mengembalikan jumlah pesan terkirim.
+    """
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        raise ValueError(f"Speed must be between {MIN_SPEED}x and {MAX_SPEED}x")
+    stats = stats if stats is not None else {}
+    stats.update(sent=0, started=time.monotonic(), behind_ms=0.0)
+    started = stats['started']
+    recording = isinstance(sink, RecordingSink)
+    for offset, topic, payload in messages:
+        if stop_event is not None and stop_event.is_set():
+            break
+        delay = started + offset / speed - time.monotonic()
+        if delay > 0.002:
+            time.sleep(delay)
+        else:
+            stats['behind_ms'] = max(0.0, -delay * 1000.0)
+        if recording:
+            sink.send(topic, payload, offset)
+        else:
+            sink.send(topic, payload)
+        stats['sent'] += 1
+    stats['finished'] = time.monotonic()
+    return stats['sent']
+
+
+class LoadRunner:
+    """Satu simulasi atau replay di thread latar, dengan statistik untuk dashboard"""
+
+    def __init__(self):
+        self.stats = {}
+        self.description = None
+        self.error = None
+        self.sink = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, description, messages, sink, speed=1.0):
+        """Mulai pengiriman di thread daemon; ValueError jika masih ada yang berjalan"""
+        if self.running:
+            raise ValueError("A load run is already in progress")
+        self.description = description
+        self.error = None
+        self.sink = sink
+        self.stats = {'sent': 0}
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(messages, sink, speed),
+                                        name="jmailbox-load", daemon=True)
+        self._thread.start()
+
+    def _run(self, messages, sink, speed):
+        try:
+            run(messages, sink, speed, self._stop, self.stats)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            sink.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def summary(self):
+        """Status run terakhir: pesan terkirim, laju rata-rata dan tertinggal dari jadwal"""
+        stats = dict(self.stats)
+        started = stats.get('started')
+        elapsed = (stats.get('finished') or time.monotonic()) - started if started else 0.0
+        return {
+            'description': self.description,
+            'running': self.running,
+            'sent': stats.get('sent', 0),
+            'elapsed_s': elapsed,
+            'rate': stats.get('sent', 0) / elapsed if elapsed > 0 else 0.0,
+            'behind_ms': stats.get('behind_ms', 0.0),
+            'error': self.error
+        }
+
+
+# ==================== CLI ====================
+def record_broker(broker, port, path, duration, topics=("jmailbox/#",)):
+    """Rekam lalu lintas broker ke NDJSON selama `duration` detik; kembalikan jumlah pesan"""
+    import paho.mqtt.client as mqtt
+
+    sink = RecordingSink(path)
+    count = [0]
+
+    def on_connect(client, userdata, flags, reason_code, properties):
+        for topic in topics:
+            client.subscribe(topic, qos=0)
+
+    def on_message(client, userdata, msg):
+        sink.send(msg.topic, msg.payload)
+        count[0] += 1
+
+    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                         client_id=f"jmailbox_rec_{int(time.time())}")
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(broker, port, 60)
+    client.loop_start()
+    try:
+        time.sleep(duration)
+    finally:
+        client.disconnect()
+        client.loop_stop()
+        sink.close()
+    return count[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m jmailbox.simulator",
+                                     description="J-MAILBOX fleet simulator and traffic replay")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    simulate = commands.add_parser("simulate", help="Publish synthetic fleet traffic")
+    simulate.add_argument("--mailboxes", type=int, default=20)
+    simulate.add_argument("--cameras", type=int, default=None)
+    simulate.add_argument("--rate", type=float, default=200, help="Messages per second")
+    simulate.add_argument("--duration", type=float, default=60, help="Seconds")
+    simulate.add_argument("--seed", type=int, default=None)
+    simulate.add_argument("--record", help="Also write the traffic to this NDJSON file")
+
+    replay = commands.add_parser("replay", help="Replay an NDJSON recording")
+    replay.add_argument("path")
+    replay.add_argument("--speed", type=float, default=1.0, help=f"{MIN_SPEED}-{MAX_SPEED}x")
+
+    record = commands.add_parser("record", help="Record broker traffic to NDJSON")
+    record.add_argument("--out", required=True)
+    record.add_argument("--duration", type=float, default=60)
+
+    for sub in (simulate, replay, record):
+        sub.add_argument("--broker", default="localhost")
+        sub.add_argument("--port", type=int, default=1883)
+    simulate.add_argument("--dry-run", action="store_true", help="Do not publish (with --record)")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        count = record_broker(args.broker, args.port, args.out, args.duration)
+        print(f"Recorded {count} messages to {args.out}")
+        return
+
+    if args.command == "simulate":
+        simulator = FleetSimulator(args.mailboxes, args.cameras, args.seed)
+        messages = simulator.messages(args.rate, args.duration)
+        sink = None if args.dry_run else MqttSink(args.broker, args.port)
+        if args.record:
+            sink = RecordingSink(args.record, sink)
+        elif sink is None:
+            parser.error("--dry-run requires --record")
+        speed = 1.0
+    else:
+        messages = read_recording(args.path)
+        sink = MqttSink(args.broker, args.port)
+        speed = args.speed
+
+    stats = {}
+    try:
+        run(messages, sink, speed, stats=stats)
+    finally:
+        sink.close()
+    elapsed = stats['finished'] - stats['started']
+    print(f"Sent {stats['sent']} messages in {elapsed:.1f}s ({stats['sent'] / max(elapsed, 1e-9):.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""State bersama yang dibaca oleh semua sesi dashboard."""
+import threading
+from datetime import datetime
+
+from jmailbox.alerts import AlertStore, severity_level
+from jmailbox.camera import CameraStore
+from jmailbox.commands import CommandTracker
+from jmailbox.devices import DeviceRegistry
+from jmailbox.logs import LogStore, to_log_dict
+from jmailbox.packages import PackageLedger
+from jmailbox.payments import PaymentLedger, day_of
+from jmailbox.series import SeriesRegistry, now_ms, to_epoch_ms
+
+
+class DashboardStore:
+    """Penyimpanan in-memory bersama yang diisi oleh layanan ingest MQTT"""
+
+    DOMAINS = ('devices', 'logs', 'alerts', 'sensors', 'package', 'camera', 'archive', 'payments',
+               'commands')
+
+    def __init__(self, sensor_retention=20000, history=None, log_capacity=200000, camera_frames=8,
+                 archive=None, command_timeout_ms=5000, command_retries=2, alert_capacity=10000,
+                 alert_dedup_ms=60000, alert_rate=5, alert_burst=20, ledger_retention_days=365,
+                 package_capacity=10000):
+        self.lock = threading.RLock()
+        self.history = history
+        self.archive = archive
+        self.version = 0
+        # Versi per domain agar sesi hanya menyalin bagian state yang berubah
+        self.versions = dict.fromkeys(self.DOMAINS, 0)
+        self.registry = DeviceRegistry()
+        self.logs = LogStore(log_capacity)
+        self.alerts = AlertStore(alert_capacity, dedup_window_ms=alert_dedup_ms,
+                                 rate=alert_rate, burst=alert_burst)
+        self.sensors = SeriesRegistry(sensor_retention)
+        self.cameras = CameraStore(camera_frames)
+        self.packages = PackageLedger(package_capacity)
+        self.payments = PaymentLedger(retention_days=ledger_retention_days)
+        self.commands = CommandTracker(command_timeout_ms, command_retries)
+        self.current_package = {
+            'resi': None,
+            'status': 'No active delivery',
+            'timestamp': None,
+            'is_cod': False,
+            'amount': 0
+        }
+
+    def touch(self, *domains):
+        """Tandai domain yang berubah (dipanggil dengan lock)"""
+        for domain in domains:
+            self.versions[domain] += 1
+        self.version += 1
+
+    def add_log(self, level, message, device="Dashboard", timestamp=None):
+        """Tambahkan satu entri log sistem"""
+        timestamp_ms = to_epoch_ms(timestamp or datetime.now())
+        level = str(level)
+        device = str(device)
+        message = str(message)
+        with self.lock:
+            seq = self.logs.append(timestamp_ms, level, device, message)
+            self.touch('logs')
+            # Direkam di dalam lock agar urutan id di riwayat sama dengan seq
+            if self.history is not None:
+                self.history.record_log(seq, timestamp_ms, level, device, message)
+        return seq
+
+    def query_logs(self, levels=None, devices=None, since=None, until=None, before=None, limit=100):
+        """Satu halaman log yang cocok filter, terbaru dulu, dengan cursor halaman berikutnya
+
+        Log di memori dibaca lewat indeks LogStore; jika habis, paginasi
+        dilanjutkan ke riwayat SQLite. Mengembalikan (list dict log, cursor)
+        dengan cursor None jika tidak ada halaman lebih lama.
+        """
+        since_ms = to_epoch_ms(since) if since else None
+        until_ms = to_epoch_ms(until) if until else None
+        with self.lock:
+            entries = self.logs.query(levels, devices, since_ms, until_ms, before, limit)
+            oldest = self.logs.oldest_seq
+
+        if len(entries) < limit and self.history is not None:
+            history_before = oldest if before is None else min(before, oldest)
+            entries.extend(self.history.query_logs(
+                levels, devices, since_ms, until_ms, history_before, limit - len(entries)))
+
+        cursor = entries[-1][0] if len(entries) == limit else None
+        return [to_log_dict(entry) for entry in entries], cursor
+
+    def log_devices(self):
+        """Device yang memiliki log di memori"""
+        with self.lock:
+            return self.logs.devices()
+
+    def load_history(self, log_limit=10000, alert_hours=24, alert_limit=10000, sample_hours=1,
+                     package_limit=10000, payment_limit=10000):
+        """Isi ulang state dari riwayat on-disk setelah proses dimulai ulang"""
+        history = self.history
+        if history is None:
+            return
+        now = now_ms()
+        with self.lock:
+            for device_id, device_type, last_seen, status in history.load_devices():
+                self.registry.touch(device_id, last_seen, status)
+                self.registry.announce(device_id, dict(status, type=device_type))
+            self.registry.advance(now)
+            for seq, ts, level, device, message in history.recent_logs(log_limit):
+                self.logs.append(ts, level, device, message, seq=seq)
+            self.logs.next_seq = max(self.logs.next_seq, history.max_log_id() + 1)
+            alerts_since = now - alert_hours * 3600 * 1000
+            self.alerts.restore_alerts(history.recent_alerts(alerts_since, alert_limit))
+            self.alerts.restore_counts(history.alert_counts(alerts_since))
+            self.alerts.restore_suppressed(history.suppressed_counts(alerts_since))
+            for device_id, metric, ts, value in history.recent_samples(now - sample_hours * 3600 * 1000):
+                self.sensors.record(device_id, ts, {metric: value})
+            for row in history.recent_packages(min(package_limit, self.packages.capacity)):
+                self.packages.restore(*row)
+            self.packages.next_seq = max(self.packages.next_seq, history.max_package_seq() + 1)
+            self.payments.restore_events(history.recent_payments(payment_limit))
+            self.payments.restore_collected(history.payment_totals())
+            self.payments.restore_expected(history.cod_packages())
+            self.touch(*self.DOMAINS)
+
+    def record_package(self, resi, device_id, timestamp_ms, source, data):
+        """Catat pesan status/payment ke ledger paket dan riwayat"""
+        with self.lock:
+            if self.packages.get(resi) is None and self.history is not None:
+                # Paket yang sudah dibuang dari memori dilanjutkan dengan seq lamanya (resi unik di riwayat)
+                row = self.history.find_package(resi)
+                if row is not None:
+                    self.packages.restore(*row)
+            package, event = self.packages.record(resi, device_id, timestamp_ms, source, data)
+            if package['is_cod']:
+                self.payments.expect(resi, package['device'], package['created'], package['amount'])
+            if self.history is not None:
+                self.history.record_package(package)
+                if event is not None:
+                    self.history.record_package_event(package['seq'], *event)
+            return package
+
+    def record_payment(self, device_id, timestamp_ms, data):
+        """Tambahkan event pembayaran ke ledger append-only dan riwayat"""
+        try:
+            amount = float(data.get('amount', 0) or 0)
+        except (TypeError, ValueError):
+            amount = 0.0
+        slot = data.get('money_slot', data.get('slot'))
+        try:
+            slot = int(slot) if slot is not None else None
+        except (TypeError, ValueError):
+            slot = None
+        resi = str(data['resi']) if data.get('resi') else None
+        with self.lock:
+            event = self.payments.append(timestamp_ms, device_id, resi, slot, amount,
+                                         str(data.get('status', 'paid')))
+            if self.history is not None:
+                self.history.record_payment(event)
+            return event
+
+    def record_alert(self, device_id, timestamp_ms, data):
+        """Tambahkan alert keamanan ke AlertStore dan riwayat
+
+        Duplikat digabung ke baris grup yang sama; alert yang ditekan batas laju
+        hanya dihitung, di memori maupun di riwayat. Mengembalikan alert atau None.
+        """
+        reason = data.get('reason', 'Unknown')
+        severity = data.get('severity', 1)
+        message = data.get('message', '')
+        with self.lock:
+            alert, _ = self.alerts.append(timestamp_ms, device_id, reason, severity, message)
+            history = self.history
+            if history is not None:
+                if alert is None:
+                    history.record_suppressed(timestamp_ms, device_id, severity_level(severity))
+                else:
+                    history.record_alert(alert['group'], to_epoch_ms(alert['timestamp']), timestamp_ms,
+                                         device_id, str(reason), severity, str(message))
+            return alert
+
+    def alert_summary(self, recent=20, top=5):
+        """Ringkasan alert dari penghitung berjalan: jumlah 24 jam, hari ini, per severity, terbaru"""
+        now = now_ms()
+        with self.lock:
+            alerts = self.alerts
+            window = alerts.window_counts(now)
+            return {
+                'total': alerts.total,
+                'count_24h': sum(window.values()),
+                'severity_24h': window,
+                'today': alerts.today(now),
+                'top_devices': alerts.top_devices(top),
+                'deduplicated': alerts.deduplicated,
+                'suppressed': sum(alerts.suppressed.values()),
+                'recent': [dict(alert) for alert in alerts.recent(recent)]
+            }
+
+    def alert_rate(self, minutes=60):
+        """Deret alert per menit dan tanda lonjakan untuk `minutes` menit terakhir"""
+        with self.lock:
+            return self.alerts.rate_series(now_ms(), minutes)
+
+    def reconcile_cod(self, day=None):
+        """Rekonsiliasi COD per device untuk satu hari (default hari ini) dari total berjalan"""
+        with self.lock:
+            return self.payments.reconcile(day_of(now_ms()) if day is None else day)
+
+    def payment_totals(self):
+        """Salinan total berjalan per (device, slot) dan per device"""
+        with self.lock:
+            return (
+                {key: tuple(value) for key, value in self.payments.by_slot.items()},
+                {key: tuple(value) for key, value in self.payments.by_device.items()}
+            )
+
+    def recent_payments(self, limit=20):
+        with self.lock:
+            return self.payments.recent(limit)
+
+    def command_stats(self, recent=20):
+        """Persentil latensi per (device, command), jumlah pending dan perintah terakhir yang selesai"""
+        with self.lock:
+            commands = self.commands
+            finished = [dict(entry) for entry in list(commands.recent)[-recent:]]
+            finished.reverse()
+            return commands.latency_stats(), len(commands), finished
+
+    def get_package(self, resi):
+        """Salinan satu paket berdasarkan resi; paket lama dicari di riwayat"""
+        with self.lock:
+            package = self.packages.get(resi)
+            if package is not None:
+                return dict(package, events=list(package['events']))
+        if self.history is not None:
+            row = self.history.find_package(resi)
+            if row is not None:
+                return PackageLedger().restore(*row)
+        return None
+
+    def select_devices(self, types=None, liveness=None, tags=None):
+        """Id device yang cocok filter tipe, liveness dan tag (None = semua)"""
+        with self.lock:
+            return self.registry.select(types, liveness, tags)
+
+    def query_packages(self, device_id=None, status=None, before=None, limit=50):
+        """Satu halaman paket (salinan tanpa events) terbaru dulu beserta cursor berikutnya"""
+        with self.lock:
+            packages, cursor = self.packages.query(device_id, status, before, limit)
+            return [dict(package, events=None) for package in packages], cursor
+
+    def active_packages(self):
+        """Paket yang sedang berjalan, satu per device"""
+        with self.lock:
+            return [dict(package, events=None) for package in self.packages.active()]
+
+    def package_filters(self):
+        """Device dan status yang ada di ledger, untuk pilihan filter"""
+        with self.lock:
+            return self.packages.devices(), self.packages.statuses()
+
+    def remove_device(self, device_id):
+        """Hapus device dari daftar device"""
+        with self.lock:
+            if self.registry.remove(device_id):
+                self.cameras.remove(device_id)
+                self.touch('devices', 'camera')
+
+    def advance_liveness(self):
+        """Proses transisi online/idle/offline yang jatuh tempo"""
+        with self.lock:
+            transitions = self.registry.advance()
+            if transitions:
+                self.touch('devices')
+            return transitions
+
+    def sensor_view(self, device_id, metric, last_n=None):
+        """Deret sensor satu device, atau None jika belum ada"""
+        with self.lock:
+            return self.sensors.view(device_id, metric, last_n)
+
+    def sensor_version(self, metric):
+        """Jumlah sampel metrik ini sejak awal; berubah setiap ada sampel baru"""
+        with self.lock:
+            return self.sensors.totals.get(metric, 0)
+
+    def update_decimator(self, device_id, metric, decimator):
+        """Masukkan sampel baru satu deret ke decimator; None jika deret belum ada"""
+        with self.lock:
+            series = self.sensors.get(device_id, metric)
+            if series is None:
+                return None
+            return decimator.update(series)
+
+    def sensor_aggregate(self, metric, bucket_ms=None):
+        """Agregat min/mean/max metrik sensor di seluruh device"""
+        with self.lock:
+            return self.sensors.aggregate(metric, bucket_ms)
+
+    def sensor_latest(self, metric):
+        """Sampel terbaru suatu metrik di seluruh device"""
+        with self.lock:
+            return self.sensors.latest(metric)
+
+    def snapshot(self, previous=None):
+        """Salinan state untuk dibaca satu sesi tanpa lock
+
+        Domain yang versinya sama dengan snapshot sebelumnya dipakai ulang
+        tanpa disalin.
+        """
+        with self.lock:
+            if previous is None:
+                previous, seen = {}, {}
+            else:
+                seen = previous['versions']
+            changed = {domain for domain in self.DOMAINS if seen.get(domain) != self.versions[domain]}
+            snapshot = dict(previous, version=self.version, versions=dict(self.versions),
+                            changed=changed, log_count=len(self.logs))
+            if 'devices' in changed:
+                snapshot['devices'] = {
+                    device_id: dict(info, status=dict(info['status']))
+                    for device_id, info in self.registry.devices.items()
+                }
+                snapshot['device_index'] = self.registry.index_snapshot()
+            if 'sensors' in changed:
+                snapshot['sensor_metrics'] = {
+                    metric: self.sensors.devices(metric) for metric in self.sensors.metrics
+                }
+            if 'package' in changed:
+                snapshot['current_package'] = dict(self.current_package)
+            return snapshot
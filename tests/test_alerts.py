@@ -0,0 +1,121 @@
+from jmailbox.alerts import AlertStore
+from jmailbox.history import HistoryStore
+from jmailbox.series import now_ms
+from jmailbox.store import DashboardStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_repeats_within_window_merge_into_one_alert():
+    alerts = AlertStore(dedup_window_ms=1000)
+    first, new = alerts.append(0, "dev-1", "tamper", 3, "first")
+    assert new
+    for ts in (500, 1200, 2100):
+        alert, new = alerts.append(ts, "dev-1", "tamper", 3, f"at {ts}")
+        assert alert is first and not new
+    assert first['count'] == 4 and first['message'] == "at 2100"
+    assert alerts.deduplicated == 3
+
+    # Jendela dihitung dari kemunculan terakhir; setelah lewat, grup baru dibuka
+    alert, new = alerts.append(3200, "dev-1", "tamper", 3, "again")
+    assert new and alert is not first and alert['group'] != first['group']
+
+
+def test_dedup_key_includes_reason_and_severity_level():
+    alerts = AlertStore()
+    a, _ = alerts.append(0, "dev-1", "tamper", 3, "")
+    assert alerts.append(1, "dev-1", "tamper", "5", "")[0] is a
+    assert alerts.append(2, "dev-1", "tamper", 1, "")[0] is not a
+    assert alerts.append(3, "dev-1", "door", 3, "")[0] is not a
+    assert len(alerts) == 3
+
+
+def test_rate_limit_suppresses_but_still_counts():
+    clock = FakeClock()
+    alerts = AlertStore(rate=1, burst=2, clock=clock)
+    results = [alerts.append(i, "dev-1", f"reason {i}", 1, "")[0] for i in range(5)]
+    assert [alert is not None for alert in results] == [True, True, False, False, False]
+    assert alerts.suppressed == {"dev-1": 3}
+    assert alerts.total == 5 and alerts.by_device["dev-1"] == 5
+    assert len(alerts) == 2
+
+    clock.now += 1.0
+    assert alerts.append(10, "dev-1", "reason 10", 1, "")[0] is not None
+    # Batas laju per device
+    assert alerts.append(11, "dev-2", "reason 0", 1, "")[0] is not None
+
+
+def test_idle_buckets_are_evicted_after_refill_window():
+    clock = FakeClock()
+    alerts = AlertStore(rate=1, burst=2, clock=clock)
+    for i in range(50):
+        alerts.append(i, f"dev-{i}", "tamper", 1, "")
+    assert len(alerts._buckets) == 50
+
+    clock.now += 1.5
+    alerts.append(100, "dev-0", "door", 1, "")
+    assert len(alerts._buckets) == 50
+
+    clock.now += 1.0
+    alerts.append(200, "dev-new", "door", 1, "")
+    assert set(alerts._buckets) == {"dev-0", "dev-new"}
+
+
+def test_zero_rate_disables_rate_limit():
+    alerts = AlertStore(rate=0, burst=2, clock=FakeClock())
+    results = [alerts.append(i, "dev-1", f"reason {i}", 1, "")[0] for i in range(50)]
+    assert all(alert is not None for alert in results)
+    assert alerts.suppressed == {} and alerts._buckets == {}
+
+
+def test_restored_groups_expire_by_last_seen_not_row_order():
+    alerts = AlertStore(dedup_window_ms=1000)
+    # Baris riwayat urut ts; grup pertama justru yang terakhir muncul
+    alerts.restore_alerts([
+        (0, "dev-1", "tamper", 3, "a", 4, 5000, "g1"),
+        (1000, "dev-2", "door", 1, "b", 2, 1500, "g2"),
+    ])
+    assert [alert['group'] for alert in alerts.alerts] == ["g1", "g2"]
+    assert [key[0] for key in alerts._open] == ["dev-2", "dev-1"]
+
+    alert, new = alerts.append(5500, "dev-2", "door", 1, "later")
+    assert new and alert['group'] != "g2"
+    alert, new = alerts.append(5600, "dev-1", "tamper", 3, "repeat")
+    assert not new and alert['group'] == "g1" and alert['count'] == 5
+
+
+def test_history_keeps_one_row_per_group_across_flushes_and_restart(tmp_path):
+    path = str(tmp_path / "history.db")
+    history = HistoryStore(path)
+    store = DashboardStore(history=history, alert_rate=1, alert_burst=1)
+    start = now_ms()
+    store.record_alert("dev-1", start, {'reason': "tamper", 'severity': 3, 'message': "a"})
+    history.flush()
+    store.record_alert("dev-1", start + 10, {'reason': "tamper", 'severity': 3, 'message': "b"})
+    store.record_alert("dev-1", start + 20, {'reason': "door", 'severity': 1, 'message': "suppressed"})
+    history.flush()
+
+    (row,) = history.recent_alerts(0, 10)
+    assert row[:6] == (start, "dev-1", "tamper", 3, "b", 2)
+    assert row[6] == start + 10
+    assert history.count_alerts(0) == 3
+    history.close()
+
+    # Setelah restart grup yang masih terbuka dilanjutkan, dan penghitung sama dengan sebelumnya
+    history = HistoryStore(path)
+    restarted = DashboardStore(history=history, alert_rate=1, alert_burst=1)
+    restarted.load_history()
+    assert restarted.alerts.total == 3
+    assert restarted.alerts.suppressed == {"dev-1": 1}
+    restarted.record_alert("dev-1", start + 30, {'reason': "tamper", 'severity': 3, 'message': "c"})
+    history.flush()
+    (row,) = history.recent_alerts(0, 10)
+    assert row[4:6] == ("c", 3)
+    assert restarted.alerts.recent(1)[0]['count'] == 3
+    history.close()
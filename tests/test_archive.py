@@ -0,0 +1,99 @@
+import io
+import os
+
+from PIL import Image
+
+from jmailbox.archive import SnapshotArchive
+
+
+def jpeg(color, size=(64, 48)):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format="JPEG")
+    return out.getvalue()
+
+
+def files(root, folder):
+    return sorted(name for _, _, names in os.walk(os.path.join(root, folder)) for name in names)
+
+
+def test_identical_photos_are_stored_once_and_refcounted(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    data = jpeg((200, 10, 10))
+    first = archive.add("cam-1", data, 1000, resi="R1", purpose="delivery")
+    second = archive.add("cam-2", data, 2000)
+    assert first == second
+
+    stats = archive.stats()
+    assert stats['photos'] == 2 and stats['unique'] == 1
+    assert archive.total_bytes == len(data) + len(archive.thumbnail(first))
+    assert files(str(tmp_path), "objects") == [first + ".jpg"]
+    assert archive._write_conn.execute("SELECT refs FROM blobs").fetchone() == (2,)
+
+    photos, cursor = archive.query(resi="R1")
+    assert [(photo['device'], photo['purpose']) for photo in photos] == [("cam-1", "delivery")]
+    assert cursor is None
+    assert archive.image(first) == data
+    archive.close()
+
+
+def test_eviction_keeps_total_bytes_under_the_limit(tmp_path):
+    photos = [jpeg((i * 40, 255 - i * 40, 0)) for i in range(5)]
+    probe = SnapshotArchive(str(tmp_path / "probe"))
+    probe.add("cam-1", photos[0], 0)
+    per_photo = probe.total_bytes
+    probe.close()
+
+    archive = SnapshotArchive(str(tmp_path / "archive"), max_bytes=int(per_photo * 2.5))
+    digests = [archive.add("cam-1", data, 1000 * i) for i, data in enumerate(photos)]
+    assert archive.total_bytes <= archive.max_bytes
+    remaining = [photo['hash'] for photo in archive.query()[0]]
+    # Foto terlama dibuang lebih dulu beserta file dan thumbnail-nya
+    assert remaining == digests[:-3:-1]
+    assert files(archive.root, "objects") == sorted(digest + ".jpg" for digest in remaining)
+    assert files(archive.root, "thumbs") == sorted(digest + ".jpg" for digest in remaining)
+    assert archive.image(digests[0]) is None and archive.thumbnail(digests[0]) is None
+    archive.close()
+
+    # Total dihitung ulang dari indeks saat dibuka lagi
+    reopened = SnapshotArchive(str(tmp_path / "archive"), max_bytes=int(per_photo * 2.5))
+    assert reopened.total_bytes == archive.total_bytes
+    reopened.close()
+
+
+def test_shared_blob_survives_until_last_reference_is_evicted(tmp_path):
+    data = jpeg((10, 10, 200))
+    other = jpeg((10, 200, 10))
+    archive = SnapshotArchive(str(tmp_path), max_bytes=10 ** 9)
+    shared = archive.add("cam-1", data, 1000)
+    archive.add("cam-1", data, 3000)
+    archive.max_bytes = archive.total_bytes
+    archive.add("cam-2", other, 2000)
+
+    # Foto ts 1000 hanya melepas satu referensi; baru foto ts 2000 yang membebaskan ruang
+    assert archive.image(shared) == data
+    assert [photo['timestamp'] for photo in archive.query()[0]] == [3000]
+    assert archive.stats()['unique'] == 1
+    archive.close()
+
+
+def test_thumbnail_cache_is_lru(tmp_path):
+    archive = SnapshotArchive(str(tmp_path), thumbnail_cache_size=2)
+    a, b, c = (archive.add("cam-1", jpeg(color), i) for i, color in enumerate(((255, 0, 0), (0, 255, 0),
+                                                                              (0, 0, 255))))
+    assert list(archive._thumbnails) == [b, c]
+
+    # Dibaca dari disk lalu masuk cache; yang paling lama tidak dipakai keluar
+    thumb = archive.thumbnail(a)
+    assert Image.open(io.BytesIO(thumb)).size[0] <= 160
+    assert list(archive._thumbnails) == [c, a]
+    archive.thumbnail(c)
+    assert list(archive._thumbnails) == [a, c]
+    archive.close()
+
+
+def test_undecodable_photo_is_archived_without_thumbnail(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    digest = archive.add("cam-1", b"\xff\xd8not a jpeg", 0)
+    assert archive.thumbnail(digest) is None
+    assert archive.image(digest) == b"\xff\xd8not a jpeg"
+    archive.close()
@@ -0,0 +1,98 @@
+import io
+
+import pytest
+from PIL import Image
+
+from jmailbox.camera import FRAME_HEADER, FRAME_MAGIC, FrameAssembler, frame_chunks, make_thumbnail
+
+JPEG = b'\xff\xd8' + bytes(range(256)) * 40 + b'\xff\xd9'
+
+
+def test_out_of_order_chunks_assemble_original_frame():
+    assembler = FrameAssembler()
+    chunks = frame_chunks(7, JPEG, chunk_size=1000, capture=True)
+    assert len(chunks) == 11
+
+    order = [3, 0, 10, 5, 1, 9, 2, 8, 4, 7, 6]
+    results = [assembler.feed("cam-1", chunks[i], 1000 + n) for n, i in enumerate(order)]
+    assert results[:-1] == [None] * 10
+    frame = results[-1]
+    assert frame['data'] == JPEG
+    assert frame['frame_id'] == 7
+    assert frame['capture'] is True
+    assert assembler.incomplete == 0
+
+
+def test_duplicate_chunk_is_not_counted_twice():
+    assembler = FrameAssembler()
+    chunks = frame_chunks(1, JPEG, chunk_size=4096)
+    assert assembler.feed("cam-1", chunks[0], 0) is None
+    assert assembler.feed("cam-1", chunks[0], 1) is None
+    assert assembler.feed("cam-1", chunks[1], 2) is None
+    assert assembler.feed("cam-1", chunks[2], 3)['data'] == JPEG
+
+
+def test_missing_chunk_expires_after_timeout():
+    assembler = FrameAssembler(timeout_ms=5000)
+    chunks = frame_chunks(1, JPEG, chunk_size=4096)
+    for chunk in chunks[:-1]:
+        assert assembler.feed("cam-1", chunk, 0) is None
+
+    # Frame baru setelah timeout membuang frame lama yang tidak lengkap
+    assert assembler.feed("cam-1", frame_chunks(2, JPEG, chunk_size=4096)[0], 6000) is None
+    assert assembler.incomplete == 1
+    assert assembler.feed("cam-1", chunks[-1], 6001) is None
+
+
+def test_pending_frames_are_bounded():
+    assembler = FrameAssembler(max_pending=2)
+    for frame_id in range(4):
+        assembler.feed("cam-1", frame_chunks(frame_id, JPEG, chunk_size=4096)[0], frame_id)
+    assert assembler.incomplete == 2
+
+
+def test_frames_from_different_devices_do_not_mix():
+    assembler = FrameAssembler()
+    a = frame_chunks(1, JPEG, chunk_size=6000)
+    b = frame_chunks(1, JPEG[::-1], chunk_size=6000)
+    assert assembler.feed("cam-a", a[0], 0) is None
+    assert assembler.feed("cam-b", b[1], 0) is None
+    assert assembler.feed("cam-a", a[1], 1)['data'] == JPEG
+    assert assembler.feed("cam-b", b[0], 1)['data'] == JPEG[::-1]
+
+
+def test_invalid_chunks_raise_value_error():
+    assembler = FrameAssembler(max_frame_bytes=5000)
+    with pytest.raises(ValueError):
+        assembler.feed("cam-1", FRAME_MAGIC + b'\x00', 0)
+    with pytest.raises(ValueError):
+        assembler.feed("cam-1", FRAME_HEADER.pack(FRAME_MAGIC, 1, 2, 2, 0) + b'x', 0)
+
+    chunks = frame_chunks(3, JPEG, chunk_size=4096)
+    assembler.feed("cam-1", chunks[0], 0)
+    with pytest.raises(ValueError):
+        assembler.feed("cam-1", chunks[1], 1)
+    assert assembler.incomplete == 1
+
+
+def test_raw_jpeg_bypasses_assembly():
+    frame = FrameAssembler().feed("cam-1", JPEG, 0)
+    assert frame['data'] == JPEG and frame['frame_id'] is None
+
+
+def jpeg_claiming(width, height):
+    """JPEG kecil yang header SOF0-nya mengaku berukuran width x height"""
+    out = io.BytesIO()
+    Image.new("RGB", (16, 16), (200, 10, 10)).save(out, format="JPEG")
+    data = bytearray(out.getvalue())
+    sof = data.index(b'\xff\xc0')
+    data[sof + 5:sof + 9] = height.to_bytes(2, 'big') + width.to_bytes(2, 'big')
+    return bytes(data)
+
+
+def test_thumbnail_rejects_oversized_frames_without_decoding():
+    assert Image.open(io.BytesIO(make_thumbnail(jpeg_claiming(16, 16)))).size == (16, 16)
+    # Di atas MAX_FRAME_PIXELS tetapi di bawah batas bawaan Pillow
+    assert make_thumbnail(jpeg_claiming(5000, 5000)) is None
+    # Cukup besar untuk DecompressionBombError dari Image.open
+    assert make_thumbnail(jpeg_claiming(60000, 60000)) is None
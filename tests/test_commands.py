@@ -0,0 +1,60 @@
+from jmailbox.commands import CommandTracker, reply_id
+
+
+def test_expire_retries_until_max_retries_then_times_out():
+    tracker = CommandTracker(timeout_ms=1000, max_retries=2)
+    tracker.register("c1", "dev-1", "unlock", {}, 0, job="job-1")
+
+    assert tracker.expire(999) == ([], [])
+
+    retry, timed_out = tracker.expire(1000)
+    assert [entry['id'] for entry in retry] == ["c1"] and timed_out == []
+    assert retry[0]['attempts'] == 2
+    assert retry[0]['sent'] == 1000 and retry[0]['deadline'] == 2000
+
+    retry, timed_out = tracker.expire(2000)
+    assert retry[0]['attempts'] == 3 and timed_out == []
+
+    retry, timed_out = tracker.expire(3000)
+    assert retry == [] and [entry['id'] for entry in timed_out] == ["c1"]
+    assert timed_out[0]['status'] == 'timeout'
+    assert len(tracker) == 0
+    assert tracker.job_stats("job-1") == {'acked': 0, 'failed': 0, 'timeout': 1}
+
+
+def test_expire_only_touches_commands_past_deadline_in_order():
+    tracker = CommandTracker(timeout_ms=1000, max_retries=1)
+    tracker.register("c1", "dev-1", "unlock", {}, 0)
+    tracker.register("c2", "dev-2", "unlock", {}, 500)
+
+    retry, _ = tracker.expire(1200)
+    assert [entry['id'] for entry in retry] == ["c1"]
+    # Perintah yang dikirim ulang pindah ke belakang tabel deadline
+    assert list(tracker.pending) == ["c2", "c1"]
+
+    retry, timed_out = tracker.expire(1500)
+    assert [entry['id'] for entry in retry] == ["c2"] and timed_out == []
+
+    retry, timed_out = tracker.expire(2200)
+    assert retry == [] and [entry['id'] for entry in timed_out] == ["c1"]
+
+
+def test_reply_after_retry_measures_latency_from_last_send():
+    tracker = CommandTracker(timeout_ms=1000, max_retries=2)
+    tracker.register("c1", "dev-1", "capture", {}, 0)
+    tracker.expire(1000)
+
+    entry = tracker.match({'cmd_id': "c1", 'result': "ok"}, 1250)
+    assert entry['status'] == 'acked' and entry['latency'] == 250
+    assert tracker.expire(5000) == ([], [])
+    (stats,) = tracker.latency_stats()
+    assert stats['acked'] == 1 and stats['p50'] == 250.0
+
+
+def test_failed_reply_and_unknown_ids():
+    tracker = CommandTracker()
+    tracker.register("c1", "dev-1", "unlock", {}, 0)
+    assert tracker.match({'status': "online"}, 10) is None
+    assert tracker.match({'correlation_id': "other"}, 10) is None
+    assert tracker.match({'correlation_id': "c1", 'result': "Rejected"}, 10)['status'] == 'failed'
+    assert reply_id({'cmd_id': 42}) == "42"
@@ -0,0 +1,105 @@
+from jmailbox.devices import DeviceRegistry, guess_type
+
+SECOND_MS = 1000
+
+
+def test_guess_type_from_device_id():
+    assert guess_type("box-cam-01") == "ESP32-CAM"
+    assert guess_type("box-01") == "ESP32"
+
+
+def test_liveness_moves_online_idle_offline_on_the_clock():
+    registry = DeviceRegistry(online_seconds=30, idle_seconds=120)
+    registry.touch("box-1", 0)
+    registry.touch("box-2", 10 * SECOND_MS)
+    assert registry.with_liveness("online") == ["box-1", "box-2"]
+
+    assert registry.advance(29 * SECOND_MS) == []
+    assert registry.advance(30 * SECOND_MS) == [("box-1", "online", "idle")]
+    assert registry.advance(40 * SECOND_MS) == [("box-2", "online", "idle")]
+    assert registry.advance(119 * SECOND_MS) == []
+    assert registry.advance(130 * SECOND_MS) == [("box-1", "idle", "offline"), ("box-2", "idle", "offline")]
+    assert registry.with_liveness("offline") == ["box-1", "box-2"]
+    # Device offline tidak punya timer lagi
+    assert registry._timers == [] and registry._armed == {}
+
+    registry.touch("box-1", 200 * SECOND_MS)
+    assert registry.get("box-1")['liveness'] == "online"
+    assert registry.with_liveness("offline") == ["box-2"]
+    assert registry.advance(230 * SECOND_MS) == [("box-1", "online", "idle")]
+
+
+def test_message_before_deadline_keeps_device_online():
+    registry = DeviceRegistry(online_seconds=30, idle_seconds=120)
+    registry.touch("box-1", 0)
+    registry.touch("box-1", 25 * SECOND_MS)
+    # Timer lama jatuh tempo, device dijadwalkan ulang dari last_seen terbaru
+    assert registry.advance(30 * SECOND_MS) == []
+    assert registry.get("box-1")['liveness'] == "online"
+    assert registry.advance(55 * SECOND_MS) == [("box-1", "online", "idle")]
+    assert len(registry._timers) == 1
+
+
+def test_late_message_does_not_move_last_seen_back():
+    registry = DeviceRegistry()
+    registry.touch("box-1", 50 * SECOND_MS)
+    registry.touch("box-1", 10 * SECOND_MS, {'free_heap': 1000})
+    assert registry._last_seen_ms["box-1"] == 50 * SECOND_MS
+    assert registry.get("box-1")['status'] == {'free_heap': 1000}
+
+
+def test_announce_reindexes_type_capabilities_and_tags():
+    registry = DeviceRegistry()
+    registry.touch("box-1", 0)
+    registry.touch("box-cam-1", 0)
+    assert registry.of_type("ESP32") == ["box-1"]
+    assert registry.first("door") == "box-1"
+    assert registry.with_capability("camera") == ["box-cam-1"]
+
+    registry.announce("box-1", {'type': "ESP32-S3", 'capabilities': "camera", 'tags': ["zone-1", "zone-1", 2]})
+    device = registry.get("box-1")
+    assert device['type'] == "ESP32-S3" and device['capabilities'] == ("camera",)
+    assert device['tags'] == ("zone-1", "2")
+    assert registry.of_type("ESP32") == []
+    assert registry.first("door") is None
+    assert registry.with_capability("camera") == ["box-cam-1", "box-1"]
+
+    # Tanpa capabilities: kembali ke default tipe; tipe kosong dan tag bukan list diabaikan
+    registry.announce("box-1", {'type': "", 'tags': 5})
+    assert registry.get("box-1")['type'] == "ESP32-S3"
+    assert registry.get("box-1")['capabilities'] == ()
+    assert registry.get("box-1")['tags'] == ("zone-1", "2")
+    registry.announce("box-1", {'type': "ESP32"})
+    assert registry.with_capability("door") == ["box-1"]
+    assert registry.index_snapshot()['type'] == {"ESP32-CAM": ["box-cam-1"], "ESP32": ["box-1"]}
+
+
+def test_select_intersects_filters_in_arrival_order():
+    registry = DeviceRegistry(online_seconds=30, idle_seconds=120)
+    for i, device_id in enumerate(["box-1", "box-cam-1", "box-2", "box-3"]):
+        registry.touch(device_id, i * 20 * SECOND_MS)
+        registry.announce(device_id, {'tags': [f"zone-{i % 2}"]})
+    registry.advance(65 * SECOND_MS)
+
+    assert registry.select() == ["box-1", "box-cam-1", "box-2", "box-3"]
+    assert registry.select(types=["ESP32"]) == ["box-1", "box-2", "box-3"]
+    assert registry.select(liveness=["idle"]) == ["box-1", "box-cam-1"]
+    assert registry.select(types=["ESP32"], liveness=["online"], tags=["zone-0"]) == ["box-2"]
+    assert registry.select(types=["ESP32", "ESP32-CAM"], tags=["zone-1"]) == ["box-cam-1", "box-3"]
+    assert registry.select(tags=["missing"]) == []
+
+
+def test_remove_clears_indexes_and_pending_timer():
+    registry = DeviceRegistry(online_seconds=30, idle_seconds=120)
+    registry.touch("box-1", 0)
+    registry.announce("box-1", {'tags': ["zone-1"]})
+    assert registry.remove("box-1")
+    assert not registry.remove("box-1")
+    assert "box-1" not in registry and len(registry) == 0
+    assert registry.select(tags=["zone-1"]) == []
+    assert registry.with_capability("door") == [] and registry.with_liveness("online") == []
+    assert registry.advance(300 * SECOND_MS) == []
+
+    # Device yang muncul lagi mendapat timer baru
+    registry.touch("box-1", 400 * SECOND_MS)
+    assert registry.advance(430 * SECOND_MS) == [("box-1", "online", "idle")]
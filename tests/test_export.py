@@ -0,0 +1,74 @@
+import csv
+import gzip
+import io
+
+import pytest
+
+from jmailbox.export import export_stream, http_export
+from jmailbox.history import HOUR_MS, HistoryStore
+from jmailbox.series import now_ms
+
+BASE = now_ms() - HOUR_MS
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    # Beberapa log berbagi timestamp yang sama: kunci keyset (ts, id) harus tetap urut dan unik
+    for seq in range(1, 101):
+        store.record_log(seq, BASE + seq // 4, "ERROR" if seq % 5 == 0 else "INFO",
+                         f"dev-{seq % 3}", f"message {seq}")
+    store.flush()
+    yield store
+    store.close()
+
+
+def test_export_rows_pages_by_key_without_gaps_or_duplicates(history):
+    chunks = list(history.export_rows('logs', chunk_size=7))
+    assert [len(chunk) for chunk in chunks] == [7] * 14 + [2]
+    ids = [row[0] for chunk in chunks for row in chunk]
+    assert ids == list(range(1, 101))
+
+
+def test_export_rows_applies_time_range_and_filters(history):
+    rows = [row for chunk in history.export_rows(
+        'logs', BASE + 5, BASE + 10, {'levels': ["ERROR"], 'devices': ["dev-0", "dev-2"]}, chunk_size=2)
+        for row in chunk]
+    assert rows
+    assert all(BASE + 5 <= ts < BASE + 10 and level == "ERROR" and device in ("dev-0", "dev-2")
+               for _, ts, level, device, _ in rows)
+    assert [row[0] for row in rows] == [seq for seq in range(20, 40)
+                                        if seq % 5 == 0 and seq % 3 != 1]
+
+
+def test_export_rows_empty_filter_and_unknown_filter(history):
+    assert list(history.export_rows('logs', filters={'devices': []})) == []
+    assert history.count_export_rows('logs', filters={'devices': []}) == 0
+    with pytest.raises(ValueError):
+        list(history.export_rows('logs', filters={'metrics': ["temperature"]}))
+
+
+def test_count_export_rows_matches_export_and_stops_at_limit(history):
+    assert history.count_export_rows('logs') == 100
+    assert history.count_export_rows('logs', filters={'levels': ["ERROR"]}) == 20
+    assert history.count_export_rows('logs', limit=11) == 11
+
+
+def test_csv_export_stream_round_trip(history):
+    stats = {}
+    data = b"".join(export_stream(history, 'logs', 'csv.gz', filters={'levels': ["ERROR"]},
+                                  chunk_rows=3, stats=stats))
+    rows = list(csv.reader(io.StringIO(gzip.decompress(data).decode())))
+    assert rows[0] == ["id", "time", "level", "device", "message"]
+    assert len(rows) == 21 and stats['rows'] == 20
+    assert [row[0] for row in rows[1:]] == [str(seq) for seq in range(5, 101, 5)]
+
+
+def test_http_export_rejects_bad_parameters_before_streaming(history):
+    with pytest.raises(ValueError):
+        http_export(history, "dataset=logs&format=xml")
+    with pytest.raises(ValueError):
+        http_export(history, "dataset=logs&metric=temperature")
+    headers, blocks = http_export(history, "dataset=logs&format=ndjson.gz&level=ERROR")
+    assert 'jmailbox_logs' in headers["Content-Disposition"]
+    assert gzip.decompress(b"".join(blocks)).count(b"\n") == 20
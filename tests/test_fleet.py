@@ -0,0 +1,120 @@
+import threading
+import time
+
+from jmailbox.fleet import FleetDispatcher
+from jmailbox.store import DashboardStore
+
+
+class FakeClock:
+    """Jam monotonic palsu; sleep() langsung memajukan waktu"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeService:
+    """send_command() mencatat waktu kirim dan mendaftarkan perintah ke CommandTracker"""
+
+    def __init__(self, clock, fail=(), gate=None):
+        self.store = DashboardStore(command_timeout_ms=1000, command_retries=0)
+        self.clock = clock
+        self.fail = set(fail)
+        self.gate = gate
+        self.sent = []
+
+    def send_command(self, device_id, command, data=None, job=None):
+        if self.gate is not None:
+            self.gate(device_id)
+        if device_id in self.fail:
+            raise ConnectionError("MQTT client is not connected")
+        self.sent.append((device_id, self.clock()))
+        with self.store.lock:
+            self.store.commands.register(f"{job}-{device_id}", device_id, command, data, 0, job)
+        return f"{job}-{device_id}"
+
+
+def wait_finished(dispatcher, job_id):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = next(job for job in dispatcher.jobs() if job['id'] == job_id)
+        if job['finished'] is not None:
+            return job
+        time.sleep(0.005)
+    raise AssertionError(f"{job_id} did not finish")
+
+
+def test_shared_bucket_limits_rate_across_jobs():
+    clock = FakeClock()
+    service = FakeService(clock)
+    dispatcher = FleetDispatcher(service, rate=10, burst=2, clock=clock, sleep=clock.sleep)
+    first = dispatcher.dispatch("reboot", ["box-1", "box-2", "box-3", "box-4"])
+    wait_finished(dispatcher, first)
+    second = dispatcher.dispatch("reboot", ["box-5", "box-6"])
+    wait_finished(dispatcher, second)
+
+    times = [round(sent_at, 6) for _, sent_at in service.sent]
+    # Burst 2 langsung, lalu satu perintah per 0.1 s; job kedua memakai bucket yang sama
+    assert times == [0.0, 0.0, 0.1, 0.2, 0.3, 0.4]
+
+
+def test_duplicate_devices_are_sent_once_and_failures_counted():
+    clock = FakeClock()
+    service = FakeService(clock, fail={"box-2"})
+    dispatcher = FleetDispatcher(service, rate=100, burst=100, clock=clock, sleep=clock.sleep)
+    job = wait_finished(dispatcher, dispatcher.dispatch("reboot", ["box-1", "box-2", "box-1", "box-3"]))
+    assert (job['total'], job['sent'], job['send_failed']) == (3, 2, 1)
+    assert [device_id for device_id, _ in service.sent] == ["box-1", "box-3"]
+    [(_, _, _, _, message)] = service.store.logs.query(levels=["ERROR"])
+    assert "failed to send 'reboot' to box-2" in message
+
+
+def test_cancel_stops_remaining_sends():
+    clock = FakeClock()
+    reached = threading.Event()
+    release = threading.Event()
+
+    def gate(device_id):
+        if device_id == "box-2":
+            reached.set()
+            release.wait(5)
+
+    service = FakeService(clock, gate=gate)
+    dispatcher = FleetDispatcher(service, rate=100, burst=100, clock=clock, sleep=clock.sleep)
+    job_id = dispatcher.dispatch("capture", [f"box-{i}" for i in range(1, 6)])
+    assert reached.wait(5)
+    dispatcher.cancel(job_id)
+    release.set()
+    job = wait_finished(dispatcher, job_id)
+
+    assert job['cancelled']
+    assert (job['sent'], job['total']) == (2, 5)
+    # Job yang sudah selesai tidak bisa dibatalkan lagi
+    done = wait_finished(dispatcher, dispatcher.dispatch("capture", ["box-9"]))
+    dispatcher.cancel(done['id'])
+    assert not dispatcher.jobs()[0]['cancelled']
+
+
+def test_job_counts_follow_replies_and_timeouts():
+    clock = FakeClock()
+    service = FakeService(clock)
+    dispatcher = FleetDispatcher(service, rate=100, burst=100, clock=clock, sleep=clock.sleep)
+    job_id = dispatcher.dispatch("system_status", ["box-1", "box-2", "box-3", "box-4"])
+    wait_finished(dispatcher, job_id)
+
+    commands = service.store.commands
+    with service.store.lock:
+        commands.match({'cmd_id': f"{job_id}-box-1", 'result': "ok"}, 100)
+        commands.match({'cmd_id': f"{job_id}-box-2", 'result': "error"}, 100)
+    job = dispatcher.jobs()[0]
+    assert (job['acked'], job['failed'], job['timeout'], job['pending']) == (1, 1, 0, 2)
+
+    with service.store.lock:
+        commands.expire(1000)
+    job = dispatcher.jobs()[0]
+    assert (job['acked'], job['failed'], job['timeout'], job['pending']) == (1, 1, 2, 0)
@@ -0,0 +1,80 @@
+from jmailbox.history import DAY_MS, HOUR_MS, MINUTE_MS, HistoryStore
+from jmailbox.series import now_ms
+
+
+def make_store(tmp_path, **kwargs):
+    return HistoryStore(str(tmp_path / "history.db"), **kwargs)
+
+
+def test_query_series_switches_resolution_with_span(tmp_path):
+    store = make_store(tmp_path)
+    end = now_ms()
+    for i in range(120):
+        store.record_sample("dev-1", "temperature", end - i * MINUTE_MS, 20.0 + i % 5)
+    store.flush()
+
+    raw = store.query_series("temperature", "dev-1", end - HOUR_MS, end + 1)
+    assert raw['resolution'] == "raw"
+    assert len(raw['timestamp']) == 61
+
+    minute = store.query_series("temperature", "dev-1", end - 3 * HOUR_MS, end + 1)
+    assert minute['resolution'] == "1m"
+    assert len(minute['timestamp']) == 120
+
+    hourly = store.query_series("temperature", "dev-1", end - 4 * DAY_MS, end + 1)
+    assert hourly['resolution'] == "1h"
+    assert 2 <= len(hourly['timestamp']) <= 3
+    assert hourly['min'].min() == 20.0 and hourly['max'].max() == 24.0
+    store.close()
+
+
+def test_query_series_without_device_uses_rollup(tmp_path):
+    store = make_store(tmp_path)
+    end = now_ms()
+    store.record_sample("dev-1", "weight", end - MINUTE_MS, 1.0)
+    store.record_sample("dev-2", "weight", end - MINUTE_MS, 3.0)
+    store.flush()
+
+    series = store.query_series("weight", None, end - HOUR_MS, end + 1)
+    assert series['resolution'] == "1m"
+    assert series['min'].tolist() == [1.0]
+    assert series['mean'].tolist() == [2.0]
+    assert series['max'].tolist() == [3.0]
+    assert store.query_series("humidity", None, end - HOUR_MS, end + 1) is None
+    store.close()
+
+
+def test_prune_applies_retention_to_logs_alerts_and_ledger(tmp_path):
+    store = make_store(tmp_path, log_retention_days=1, alert_retention_days=1,
+                       ledger_retention_days=1, prune_interval=0)
+    now = now_ms()
+    old = now - 2 * DAY_MS
+    store.record_log(1, old, "INFO", "dev-1", "old")
+    store.record_log(2, now, "INFO", "dev-1", "new")
+    store.record_alert("g1", old, old, "dev-1", "door", 2, "old")
+    store.record_alert("g2", now, now, "dev-1", "tamper", 3, "new")
+    for seq, ts in ((1, old), (2, now)):
+        store.record_package({
+            'seq': seq, 'resi': f"R{seq}", 'device': "dev-1", 'status': "delivered",
+            'is_cod': True, 'amount': 1000.0, 'paid': 0.0, 'money_slot': 1,
+            'created': ts, 'updated': ts
+        })
+        store.record_package_event(seq, ts, "device", "delivered")
+        store.record_payment((seq, ts, "dev-1", f"R{seq}", 1, 1000.0, "paid"))
+    store.flush()
+
+    assert [row[4] for row in store.recent_logs(10)] == ["new"]
+    assert [row[4] for row in store.recent_alerts(0, 10)] == ["new"]
+    packages = store.recent_packages(10)
+    assert [row[1] for row in packages] == ["R2"]
+    assert len(packages[0][-1]) == 1
+    assert [row[3] for row in store.recent_payments(10)] == ["R2"]
+    store.close()
+
+
+def test_prune_keeps_tables_with_unlimited_retention(tmp_path):
+    store = make_store(tmp_path, log_retention_days=None, prune_interval=0)
+    store.record_log(1, now_ms() - 400 * DAY_MS, "INFO", "dev-1", "ancient")
+    store.flush()
+    assert len(store.recent_logs(10)) == 1
+    store.close()
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+from jmailbox.ingest import IngestService
+
+
+def make_service(**kwargs):
+    return IngestService("127.0.0.1", 1883, ["jmailbox/+/+"], **kwargs)
+
+
+def put_sensor(service, device_id, value):
+    service.buffer.put(("DATA", {
+        "topic": f"jmailbox/{device_id}/sensor",
+        "device": device_id,
+        "channel": "sensor",
+        "data": {"temperature": value},
+        "timestamp": datetime.now()
+    }))
+
+
+def test_async_drain_applies_batches_on_the_calling_thread():
+    service = make_service(drain_max_messages=1000)
+    for i in range(600):
+        put_sensor(service, f"box-{i % 3}", float(i))
+
+    threads = set()
+    apply = service._apply
+
+    def recording_apply(msg_type, content):
+        threads.add(threading.get_ident())
+        return apply(msg_type, content)
+
+    service._apply = recording_apply
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        processed = await service._drain_async(batch_size=100)
+        task.cancel()
+        return processed, ticks
+
+    processed, ticks = asyncio.run(run())
+    assert processed == 600
+    assert threads == {threading.get_ident()}
+    # Event loop sempat menjalankan task lain di antara batch
+    assert ticks >= 5
+    assert len(service.buffer) == 0
+    assert service.drain_stats['drained'] == 600
+
+
+def test_drain_respects_message_budget():
+    service = make_service()
+    for i in range(50):
+        put_sensor(service, "box-1", float(i))
+    assert service.drain(max_messages=20, batch_size=8) == 20
+    assert len(service.buffer) == 30
+
+
+def test_inject_without_event_loop_decodes_immediately():
+    service = make_service()
+    service.inject("jmailbox/box-1/sensor", '{"temperature": 21.5}')
+    service.inject("jmailbox/box-1/sensor", b"not json")
+    assert len(service.buffer) == 2
+    assert service.decode_failures == {"box-1": 1}
+
+
+def test_inject_runs_on_the_event_loop_thread():
+    # Port tertutup: event loop tetap berjalan sambil mencoba reconnect
+    service = IngestService("127.0.0.1", 9, ["jmailbox/+/+"], reconnect_min_s=30)
+    received = []
+    receive = service._receive
+
+    def recording_receive(topic, payload):
+        received.append((threading.get_ident(), payload))
+        receive(topic, payload)
+
+    service._receive = recording_receive
+    service.start(timeout=0.1)
+    try:
+        service.inject("jmailbox/box-1/sensor", '{"temperature": 21.5}')
+        deadline = time.monotonic() + 2.0
+        while not received and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        service.stop()
+    assert received == [(service._loop_thread_id, b'{"temperature": 21.5}')]
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos=1):
+        self.published.append((topic, payload))
+
+
+def test_raw_jpeg_after_capture_command_is_archived(tmp_path):
+    from jmailbox.archive import SnapshotArchive
+    from jmailbox.store import DashboardStore
+
+    archive = SnapshotArchive(str(tmp_path))
+    service = make_service(store=DashboardStore(archive=archive))
+    service.client, service.connected = FakeClient(), True
+    service.inject("jmailbox/cam-1/camera", b"\xff\xd8stream")
+    service.send_command("cam-1", "capture", {"purpose": "manual_capture"})
+    service.inject("jmailbox/cam-1/camera", b"\xff\xd8photo")
+    service.inject("jmailbox/cam-1/camera", b"\xff\xd8stream again")
+    service.send_command("cam-2", "capture")
+    service._capture_requests["cam-2"] = (0, None)
+    service.inject("jmailbox/cam-2/camera", b"\xff\xd8too late")
+    service.drain()
+
+    photos, _ = archive.query()
+    assert [(photo['device'], photo['purpose']) for photo in photos] == [("cam-1", "manual_capture")]
+    assert archive.image(photos[0]['hash']) == b"\xff\xd8photo"
+    archive.close()
@@ -0,0 +1,59 @@
+from jmailbox.logs import LogStore
+
+
+def make_logs(capacity=100):
+    logs = LogStore(capacity)
+    levels = ["INFO", "WARNING", "ERROR"]
+    for i in range(30):
+        logs.append(1000 + i * 10, levels[i % 3], f"dev-{i % 2}", f"msg {i}")
+    return logs
+
+
+def seqs(entries):
+    return [entry[0] for entry in entries]
+
+
+def test_query_without_filters_returns_newest_first():
+    logs = make_logs()
+    assert seqs(logs.query(limit=3)) == [30, 29, 28]
+
+
+def test_query_filters_by_level_and_device():
+    logs = make_logs()
+    entries = logs.query(levels=["ERROR"], devices=["dev-0"], limit=100)
+    assert entries
+    assert all(level == "ERROR" and device == "dev-0" for _, _, level, device, _ in entries)
+    # seq 1-based, i = seq - 1: ERROR -> i % 3 == 2, dev-0 -> i % 2 == 0
+    assert seqs(entries) == [seq for seq in range(30, 0, -1) if (seq - 1) % 6 == 2]
+
+
+def test_query_empty_level_list_matches_nothing():
+    logs = make_logs()
+    assert logs.query(levels=[]) == []
+    assert len(logs.query(levels=None, devices=[])) == 30
+
+
+def test_query_time_window_is_half_open():
+    logs = make_logs()
+    entries = logs.query(since_ms=1050, until_ms=1100)
+    assert [ts for _, ts, _, _, _ in entries] == [1090, 1080, 1070, 1060, 1050]
+
+
+def test_query_cursor_pages_without_gaps_or_overlap():
+    logs = make_logs()
+    pages, before = [], None
+    while True:
+        page = logs.query(levels=["INFO", "WARNING"], before=before, limit=7)
+        if not page:
+            break
+        pages.extend(page)
+        before = page[-1][0]
+    assert seqs(pages) == seqs(logs.query(levels=["INFO", "WARNING"], limit=100))
+    assert len(pages) == 20
+
+
+def test_query_skips_evicted_entries_after_wraparound():
+    logs = make_logs(capacity=8)
+    assert logs.oldest_seq == 23
+    assert seqs(logs.query(limit=100)) == list(range(30, 22, -1))
+    assert seqs(logs.query(levels=["ERROR"], limit=100)) == [30, 27, 24]
@@ -0,0 +1,98 @@
+import pytest
+
+from jmailbox.ingest import IngestService
+from jmailbox.metrics import Histogram, MetricsRegistry
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = Histogram(bounds=(1, 2, 4, 8))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 3, 6, 6, 6, 7):
+        histogram.observe(value)
+
+    # Bucket: (0,1]=1, (1,2]=2, (2,4]=1, (4,8]=4
+    assert histogram.snapshot() == ([1, 2, 1, 4, 0], 8, 31.5, 7)
+    assert histogram.quantile(0.125) == pytest.approx(1.0)
+    assert histogram.quantile(0.25) == pytest.approx(1.5)
+    assert histogram.quantile(0.5) == pytest.approx(4.0)
+    assert histogram.quantile(0.75) == pytest.approx(6.0)
+    # Tidak pernah melebihi maksimum yang teramati
+    assert histogram.quantile(1.0) == 7
+
+    summary = histogram.summary()
+    assert summary['count'] == 8 and summary['mean'] == pytest.approx(31.5 / 8) and summary['max'] == 7
+
+
+def test_histogram_overflow_bucket_uses_maximum():
+    histogram = Histogram(bounds=(1, 2))
+    histogram.observe(10)
+    histogram.observe(30)
+    assert histogram.quantile(0.5) == pytest.approx(16.0)
+    assert histogram.quantile(0.99) <= 30
+
+
+def test_histogram_merge_adds_snapshots():
+    a, b = Histogram(bounds=(1, 2)), Histogram(bounds=(1, 2))
+    a.observe(0.5)
+    b.observe(1.5)
+    b.observe(5)
+    a.merge(b.snapshot())
+    assert a.snapshot() == ([1, 1, 1], 3, 7.0, 5)
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    messages = registry.counter('test_messages_total', "Messages per channel\nsecond line", ('channel',))
+    messages.labels('sensor').inc(3)
+    messages.labels('log "x"\\y\nz').inc()
+    registry.gauge('test_depth', "Queue depth").set(2.5)
+    latency = registry.histogram('test_seconds', "Latency", ('channel',), bounds=(0.1, 1))
+    latency.labels('sensor').observe(0.05)
+    latency.labels('sensor').observe(0.5)
+    latency.labels('sensor').observe(3)
+
+    assert registry.render().splitlines() == [
+        '# HELP test_messages_total Messages per channel\\nsecond line',
+        '# TYPE test_messages_total counter',
+        'test_messages_total{channel="sensor"} 3',
+        'test_messages_total{channel="log \\"x\\"\\\\y\\nz"} 1',
+        '# HELP test_depth Queue depth',
+        '# TYPE test_depth gauge',
+        'test_depth 2.5',
+        '# HELP test_seconds Latency',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{channel="sensor",le="0.1"} 1',
+        'test_seconds_bucket{channel="sensor",le="1"} 2',
+        'test_seconds_bucket{channel="sensor",le="+Inf"} 3',
+        'test_seconds_sum{channel="sensor"} 3.55',
+        'test_seconds_count{channel="sensor"} 3',
+    ]
+
+
+def test_callback_family_reads_value_at_render():
+    registry = MetricsRegistry()
+    state = {'depth': 1, 'per_shard': {('0',): 4, ('1',): 6}}
+    registry.callback('test_queue_depth', "Depth", lambda: state['depth'])
+    registry.callback('test_shard_received_total', "Per shard", lambda: state['per_shard'],
+                      kind='counter', labels=('shard',))
+    # Nama yang sama mengembalikan metrik yang sudah ada
+    assert registry.callback('test_queue_depth', "Other", lambda: 99) is registry.get('test_queue_depth')
+
+    state['depth'] = 7
+    lines = registry.render().splitlines()
+    assert lines[:3] == ['# HELP test_queue_depth Depth', '# TYPE test_queue_depth gauge', 'test_queue_depth 7']
+    assert lines[3:] == [
+        '# HELP test_shard_received_total Per shard',
+        '# TYPE test_shard_received_total counter',
+        'test_shard_received_total{shard="0"} 4',
+        'test_shard_received_total{shard="1"} 6',
+    ]
+
+
+def test_decode_failures_total_is_a_running_counter():
+    service = IngestService("127.0.0.1", 1883, ["jmailbox/+/+"])
+    service.inject("jmailbox/box-1/sensor", b"not json")
+    service.inject("jmailbox/box-2/sensor", b"{}")
+    service._on_shard_report(0, {'channels': {}, 'decode': {}, 'failures': {'box-1': (3, "bad")}})
+    assert service.decode_failures == {'box-1': 4, 'box-2': 1}
+    assert 'jmailbox_decode_failures_total 5' in service.metrics.render().splitlines()
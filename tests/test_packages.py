@@ -0,0 +1,83 @@
+from jmailbox.history import HistoryStore
+from jmailbox.packages import PackageLedger, parse_amount
+from jmailbox.series import now_ms
+from jmailbox.store import DashboardStore
+
+
+def test_parse_amount_coerces_numbers_and_rejects_garbage():
+    assert parse_amount("15000") == 15000.0
+    assert parse_amount(2500) == 2500.0
+    assert parse_amount(None) == 0.0
+    assert parse_amount("") == 0.0
+    assert parse_amount("lima ribu") is None
+    assert parse_amount([1]) is None
+    assert parse_amount("nan") is None
+
+
+def test_record_stores_amounts_as_float():
+    ledger = PackageLedger()
+    package, _ = ledger.record("R1", "dev-1", 1000, 'status',
+                               {'status': "In Progress", 'is_cod': True, 'amount': "15000"})
+    assert package['amount'] == 15000.0
+    assert f"Rp{package['amount']:,.0f}" == "Rp15,000"
+
+    package, _ = ledger.record("R1", "dev-1", 2000, 'payment', {'status': "Paid", 'amount': "15000"})
+    assert package['paid'] == 15000.0
+
+
+def test_record_ignores_invalid_amount_and_keeps_previous():
+    ledger = PackageLedger()
+    ledger.record("R1", "dev-1", 1000, 'status', {'is_cod': True, 'amount': 20000})
+    package, event = ledger.record("R1", "dev-1", 2000, 'status',
+                                   {'status': "Delivered", 'amount': "twenty"})
+    assert package['amount'] == 20000.0
+    assert package['status'] == "Delivered"
+    assert event == (2000, 'status', "Delivered")
+
+
+def test_capacity_evicts_closed_packages_first():
+    ledger = PackageLedger(capacity=3)
+    ledger.record("R1", "dev-1", 1000, 'status', {'status': "In Progress"})
+    ledger.record("R2", "dev-2", 2000, 'status', {'status': "Delivered"})
+    ledger.record("R3", "dev-1", 3000, 'status', {'status': "Delivered"})
+    ledger.record("R4", "dev-3", 4000, 'status', {'status': "Pending"})
+
+    # R2 adalah paket selesai dengan seq terkecil; R1 yang lebih tua masih aktif
+    assert set(ledger.packages) == {"R1", "R3", "R4"}
+    assert ledger.devices() == ["dev-1", "dev-3"]
+    assert ledger.evicted == 1
+
+    # Paket yang dibuka lagi tidak lagi dianggap selesai
+    ledger.record("R3", "dev-1", 5000, 'status', {'status': "Returned to sender"})
+    ledger.record("R5", "dev-3", 6000, 'status', {'status': "Pending"})
+    # Tidak ada paket selesai: yang tertua dibuang
+    assert set(ledger.packages) == {"R3", "R4", "R5"}
+    packages, cursor = ledger.query(limit=10)
+    assert [package['resi'] for package in packages] == ["R5", "R4", "R3"] and cursor is None
+    assert [package['resi'] for package in ledger.query("dev-1")[0]] == ["R3"]
+
+
+def test_restored_package_keeps_seq_order():
+    ledger = PackageLedger(capacity=3)
+    ledger.next_seq = 10
+    ledger.record("R5", "dev-1", 5000, 'status', {'status': "Pending"})
+    ledger.restore(2, "R2", "dev-1", "Delivered", False, 0.0, 0.0, None, 1000, 2000, [])
+    assert [package['resi'] for package in ledger.query("dev-1")[0]] == ["R5", "R2"]
+    assert ledger.next_seq == 11
+
+
+def test_evicted_package_resumes_with_its_seq_from_history(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.db"))
+    store = DashboardStore(history=history, package_capacity=2)
+    now = now_ms()
+    store.record_package("R1", "dev-1", now, 'status', {'status': "Delivered", 'is_cod': True, 'amount': 5000})
+    store.record_package("R2", "dev-1", now + 1, 'status', {'status': "Pending"})
+    history.flush()
+    store.record_package("R3", "dev-2", now + 2, 'status', {'status': "Pending"})
+    assert store.packages.get("R1") is None
+
+    package = store.record_package("R1", "dev-1", now + 3, 'payment', {'status': "Paid", 'amount': 5000})
+    assert package['seq'] == 1 and package['paid'] == 5000.0
+    assert [event[2] for event in package['events']] == ["Delivered", "Paid"]
+    history.flush()
+    assert history.find_package("R1")[0] == 1
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from jmailbox.payloads import PayloadError, decode, loads, parse_topic
+
+
+@pytest.mark.parametrize("topic, expected", [
+    ("jmailbox/box-01/sensor", ("box-01", "sensor")),
+    ("jmailbox/box-01/camera", ("box-01", "camera")),
+    ("jmailbox/box-01", None),
+    ("jmailbox//sensor", None),
+    ("jmailbox/box-01/", None),
+    ("other/box-01/sensor", None),
+    ("jmailbox/box-01/sensor/extra", None),
+])
+def test_parse_topic(topic, expected):
+    assert parse_topic(topic) == expected
+
+
+def encode(data):
+    return json.dumps(data).encode()
+
+
+def test_loads_rejects_empty_and_malformed_payloads():
+    with pytest.raises(PayloadError):
+        loads(b"")
+    with pytest.raises(PayloadError):
+        loads(b"{not json")
+
+
+def test_msgpack_payload_is_decoded_when_available():
+    msgpack = pytest.importorskip("msgpack")
+    assert decode('sensor', msgpack.packb({'temperature': 21.5})) == {'temperature': 21.5}
+
+
+def test_sensor_payload_needs_a_numeric_field():
+    assert decode('sensor', encode({'temperature': 21.5, 'unit': "C"}))['temperature'] == 21.5
+    with pytest.raises(PayloadError):
+        decode('sensor', encode({'unit': "C", 'ok': True}))
+    with pytest.raises(PayloadError):
+        decode('sensor', encode([1, 2, 3]))
+
+
+def test_alert_severity_must_be_number_or_text():
+    assert decode('alert', encode({'severity': "high"}))['severity'] == "high"
+    with pytest.raises(PayloadError):
+        decode('alert', encode({'severity': [3]}))
+
+
+@pytest.mark.parametrize("channel", ['payment', 'status'])
+def test_amount_is_coerced_to_float(channel):
+    assert decode(channel, encode({'resi': "R1", 'amount': "15000"}))['amount'] == 15000.0
+    assert decode(channel, encode({'resi': "R1", 'amount': 2500}))['amount'] == 2500.0
+    assert decode(channel, encode({'resi': "R1", 'amount': None}))['amount'] is None
+    assert 'amount' not in decode(channel, encode({'resi': "R1"}))
+
+
+@pytest.mark.parametrize("amount", ["lima ribu", "NaN", [15000], True, ""])
+def test_invalid_payment_amount_is_rejected(amount):
+    with pytest.raises(PayloadError):
+        decode('payment', encode({'resi': "R1", 'amount': amount}))
+
+
+def test_empty_status_amount_is_zero():
+    data = decode('status', encode({'resi': "R1", 'status': "Delivered", 'amount': ""}))
+    assert data == {'resi': "R1", 'status': "Delivered", 'amount': 0.0}
+
+
+@pytest.mark.parametrize("amount", ["lima ribu", "NaN", [15000], True])
+def test_invalid_status_amount_is_dropped(amount):
+    data = decode('status', encode({'resi': "R1", 'status': "Delivered", 'amount': amount, 'free_heap': 1234}))
+    assert data == {'resi': "R1", 'status': "Delivered", 'free_heap': 1234}
+
+
+def test_unknown_channel_only_requires_an_object():
+    assert decode('diagnostics', encode({'uptime': "3d"})) == {'uptime': "3d"}
+    with pytest.raises(PayloadError):
+        decode('diagnostics', encode("text"))
@@ -0,0 +1,65 @@
+import pytest
+
+from jmailbox.payments import DAY_MS, PaymentLedger
+
+
+def test_expect_coerces_amount_to_float():
+    ledger = PaymentLedger()
+    ledger.expect("R1", "dev-1", 1000, "15000")
+    ledger.append(2000, "dev-1", "R1", 1, 15000.0, "paid")
+
+    (row,) = ledger.reconcile(0)
+    assert row['expected_amount'] == 15000.0
+    assert row['difference'] == 0.0
+
+
+def test_expect_counts_amount_change_as_difference():
+    ledger = PaymentLedger()
+    ledger.expect("R1", "dev-1", 1000, 10000)
+    ledger.expect("R1", "dev-1", 1000, "12500")
+    ledger.expect("R1", "dev-1", 1000, 12500.0)
+
+    (row,) = ledger.reconcile(0)
+    assert row['expected_count'] == 1
+    assert row['expected_amount'] == 12500.0
+
+
+def test_expect_rejects_invalid_amount():
+    ledger = PaymentLedger()
+    ledger.expect("R1", "dev-1", DAY_MS, 5000)
+    for amount in ("lima ribu", [5000], float('inf')):
+        with pytest.raises(ValueError):
+            ledger.expect("R1", "dev-1", DAY_MS, amount)
+    (row,) = ledger.reconcile(1)
+    assert row['expected_amount'] == 5000.0
+
+
+def test_totals_outside_retention_are_evicted():
+    ledger = PaymentLedger(retention_days=2)
+    ledger.expect("R1", "dev-1", 0, 5000)
+    ledger.append(1000, "dev-1", "R1", 1, 5000.0, "paid")
+    ledger.expect("R2", "dev-2", DAY_MS, 7000)
+    ledger.append(DAY_MS + 1000, "dev-2", "R2", 2, 7000.0, "paid")
+    ledger.append(DAY_MS + 2000, "dev-1", None, 1, 1000.0, "paid")
+    assert ledger.by_device == {"dev-1": [2, 6000.0], "dev-2": [1, 7000.0]}
+
+    # Hari 2: hari 0 keluar dari jendela dua hari
+    ledger.append(2 * DAY_MS, "dev-2", None, 2, 500.0, "paid")
+    assert ledger.by_device == {"dev-1": [1, 1000.0], "dev-2": [2, 7500.0]}
+    assert ledger.by_slot == {("dev-1", 1): [1, 1000.0], ("dev-2", 2): [2, 7500.0]}
+    assert ledger.reconcile(0) == []
+    assert set(ledger._expected_by_resi) == {"R2"}
+
+    # Hari 4: semua kedaluwarsa; event di luar jendela tidak dihitung lagi
+    ledger.append(4 * DAY_MS, "dev-3", None, 1, 100.0, "paid")
+    ledger.expect("R1", "dev-1", 0, 5000)
+    assert ledger.by_device == {"dev-3": [1, 100.0]}
+    assert ledger._expected_by_resi == {} and set(ledger.expected) == set()
+    assert set(ledger.collected) == {4}
+
+
+def test_retention_none_keeps_totals():
+    ledger = PaymentLedger(retention_days=None)
+    ledger.append(0, "dev-1", None, 1, 1000.0, "paid")
+    ledger.append(1000 * DAY_MS, "dev-1", None, 1, 1000.0, "paid")
+    assert ledger.by_device == {"dev-1": [2, 2000.0]}
@@ -0,0 +1,105 @@
+import numpy as np
+
+from jmailbox.series import MinMaxDecimator, RingBuffer, decimate_minmax
+
+
+def test_ring_buffer_wraparound_keeps_latest_window_in_order():
+    ring = RingBuffer(4)
+    for i in range(10):
+        ring.append(1000 + i, float(i))
+
+    timestamps, values = ring.view()
+    assert len(ring) == 4
+    assert ring.total == 10
+    assert values.tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert timestamps.view(np.int64).tolist() == [1006, 1007, 1008, 1009]
+    assert ring.latest() == (1009, 9.0)
+
+
+def test_ring_buffer_last_n_across_wrap_point():
+    ring = RingBuffer(5)
+    for i in range(7):
+        ring.append(i, float(i))
+
+    # Sampel 4..6 melewati batas akhir array fisik
+    _, values = ring.view(3)
+    assert values.tolist() == [4.0, 5.0, 6.0]
+    _, values = ring.view(100)
+    assert values.tolist() == [2.0, 3.0, 4.0, 5.0, 6.0]
+
+
+def test_ring_buffer_partial_fill_and_empty():
+    ring = RingBuffer(8)
+    assert ring.latest() is None
+    assert len(ring.view()[1]) == 0
+
+    ring.append(5, 1.5)
+    ring.append(6, 2.5)
+    _, values = ring.view()
+    assert values.tolist() == [1.5, 2.5]
+
+
+def test_ring_buffer_view_is_zero_copy():
+    ring = RingBuffer(3)
+    for i in range(5):
+        ring.append(i, float(i))
+    _, values = ring.view()
+    assert values.base is not None
+
+
+def test_decimate_minmax_short_series_is_returned_unchanged():
+    timestamps = np.arange(10)
+    values = np.arange(10, dtype=np.float64)
+    out_t, out_v = decimate_minmax(timestamps, values, 20)
+    assert out_t is timestamps and out_v is values
+
+
+def test_decimate_minmax_keeps_extremes_within_budget():
+    n = 10007
+    timestamps = np.arange(n)
+    values = np.sin(np.linspace(0, 20 * np.pi, n))
+    values[1234] = 5.0
+    values[8765] = -5.0
+    out_t, out_v = decimate_minmax(timestamps, values, 200)
+
+    assert len(out_v) <= 200
+    assert np.all(np.diff(out_t) > 0)
+    assert out_v.max() == 5.0 and out_v.min() == -5.0
+    assert 1234 in out_t and 8765 in out_t
+    assert np.array_equal(values[out_t], out_v)
+
+
+def test_decimate_minmax_partial_last_bin_ignores_padding():
+    timestamps = np.arange(11)
+    values = np.array([3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 7], dtype=np.float64)
+    out_t, out_v = decimate_minmax(timestamps, values, 4)
+    # Dua bin berukuran 6: [0..5] dan [6..10]
+    assert out_t.tolist() == [1, 5, 6, 10]
+    assert out_v.tolist() == [1.0, 9.0, 2.0, 7.0]
+
+
+def test_minmax_decimator_matches_stateless_after_bin_merges():
+    rng = np.random.default_rng(3)
+    n = 125
+    timestamps = 1000 + np.arange(n) * 10
+    values = rng.normal(size=n)
+    ring = RingBuffer(256)
+    decimator = MinMaxDecimator(max_points=20)
+
+    # Potongan tidak rata: bin mulai berukuran 1 lalu digabung berkali-kali lewat _double()
+    pos = 0
+    for chunk in (1, 3, 7, 20, 50, 44):
+        for i in range(pos, pos + chunk):
+            ring.append(int(timestamps[i]), values[i])
+        pos += chunk
+        assert decimator.update(ring)
+    assert not decimator.update(ring)
+    assert decimator.bin_size == 16
+
+    out_t, out_v = decimator.points()
+    assert len(out_v) <= 20
+    x, index = np.unique(out_t.view(np.int64), return_index=True)
+    # Ukuran bin 16 sama dengan decimate_minmax(125 sampel, 16 titik): 8 bin, bin terakhir tidak penuh
+    expected_t, expected_v = decimate_minmax(timestamps, values, 16)
+    assert x.tolist() == expected_t.tolist()
+    assert out_v[index].tolist() == expected_v.tolist()
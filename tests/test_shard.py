@@ -0,0 +1,110 @@
+import json
+import re
+from types import SimpleNamespace
+
+import pytest
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.reasoncodes import ReasonCode
+
+from jmailbox.shard import ShardPool, ShardWorker, parse_brokers, shard_of, shard_topics
+
+TOPICS = [
+    "jmailbox/+/status",
+    "jmailbox/+/sensor",
+    "jmailbox/+/log",
+    "jmailbox/+/camera",
+]
+
+
+def test_parse_brokers():
+    assert parse_brokers("a, b:1884,") == [("a", 1883), ("b", 1884)]
+    assert parse_brokers("[::1]:1885") == [("[::1]", 1885)]
+    with pytest.raises(ValueError):
+        parse_brokers("a:port")
+    with pytest.raises(ValueError):
+        parse_brokers(":1883")
+
+
+def test_shard_topics_share_mode():
+    assert shard_topics(TOPICS, 0, 3, "share", "g") == [
+        "$share/g/jmailbox/+/status",
+        "$share/g/jmailbox/+/sensor",
+        "$share/g/jmailbox/+/log",
+        "jmailbox/+/camera",
+    ]
+    # Kamera hanya di shard 0
+    assert shard_topics(TOPICS, 2, 3, "share", "g") == [
+        "$share/g/jmailbox/+/status",
+        "$share/g/jmailbox/+/sensor",
+        "$share/g/jmailbox/+/log",
+    ]
+    assert shard_topics(TOPICS, 0, 1, "share", "g") == TOPICS
+    assert shard_topics(TOPICS, 1, 3, "hash", "g") == TOPICS
+
+
+def test_pool_defaults_to_share_with_unique_group():
+    pool = ShardPool([("localhost", 1883)], TOPICS, 2)
+    assert pool.mode == "share"
+    assert pool.share_group != ShardPool([("localhost", 1883)], TOPICS, 2, share_group="other").share_group
+    with pytest.raises(ValueError):
+        ShardPool([("localhost", 1883)], TOPICS, 2, mode="random")
+
+
+def _matches(subscription, topic):
+    pattern = "^" + re.escape(subscription).replace(r"\+", "[^/]+") + "$"
+    return re.match(pattern, topic) is not None
+
+
+def _deliver(workers, topic, payload, turn):
+    """Semantik broker: subscription biasa ke setiap pelanggan, $share ke satu anggota group"""
+    shared = []
+    for worker in workers:
+        for subscription in worker.topics:
+            if subscription.startswith("$share/"):
+                _, _, subscription = subscription.split("/", 2)
+                if _matches(subscription, topic):
+                    shared.append(worker)
+            elif _matches(subscription, topic):
+                worker._on_message(None, 0, SimpleNamespace(topic=topic, payload=payload))
+    if shared:
+        shared[turn % len(shared)]._on_message(None, 0, SimpleNamespace(topic=topic, payload=payload))
+
+
+@pytest.mark.parametrize("mode", ["share", "hash"])
+def test_each_message_applied_exactly_once_across_shards(mode):
+    shards = 3
+    workers = [ShardWorker(shard, shards, [("localhost", 1883)], TOPICS, mode, "g", ("status",), None)
+               for shard in range(shards)]
+    sent = []
+    for i in range(300):
+        device = f"box-{i % 7}"
+        channel = ("status", "sensor", "log", "camera")[i % 4]
+        topic = f"jmailbox/{device}/{channel}"
+        _deliver(workers, topic, json.dumps({"seq": i}).encode(), i)
+        sent.append((topic, i))
+
+    applied = [(item["topic"], item["data"]["seq"])
+               for worker in workers for (kind, item), _ in worker.pending if kind == "DATA"]
+    assert sorted(applied) == sorted(sent)
+    assert sum(worker.counts["received"] - worker.counts["skipped"] for worker in workers) == len(sent)
+    if mode == "hash":
+        # Setiap worker menerima semua pesan; urutan per device terjaga di worker pemiliknya
+        assert all(worker.counts["received"] == len(sent) for worker in workers)
+        for worker in workers:
+            devices = {item["device"] for (_, item), _ in worker.pending}
+            assert all(shard_of(device, shards) == worker.shard for device in devices)
+    else:
+        assert sum(worker.counts["received"] for worker in workers) == len(sent)
+        cameras = [item for worker in workers[1:] for (_, item), _ in worker.pending
+                   if item["channel"] == "camera"]
+        assert cameras == []
+
+
+def test_rejected_share_subscription_is_reported():
+    worker = ShardWorker(1, 2, [("localhost", 1883)], TOPICS, "share", "g", ("status",), None)
+    worker._subscribing = {7: (0, worker.topics[0]), 8: (0, worker.topics[1])}
+    worker._on_subscribe(None, 0, 7, [ReasonCode(PacketTypes.SUBACK, identifier=1)], None)
+    worker._on_subscribe(None, 0, 8, [ReasonCode(PacketTypes.SUBACK, identifier=0x80)], None)
+    [((kind, message), _)] = worker.pending
+    assert kind == "ERROR"
+    assert "$share/g/jmailbox/+/sensor" in message and "JMAILBOX_INGEST_SHARD_MODE=hash" in message
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from jmailbox.ingest import IngestService
+from jmailbox.simulator import (MAX_SPEED, FleetSimulator, LoadRunner, RecordingSink, ServiceSink,
+                                read_recording, run)
+
+TOPICS = ["jmailbox/+/status", "jmailbox/+/sensor", "jmailbox/+/camera"]
+
+
+def messages(count=300, seed=7):
+    # Laju tinggi: offset sangat kecil sehingga run() tidak tidur
+    return list(FleetSimulator(mailboxes=6, cameras=2, seed=seed, chunk_size=1024).messages(1e6, count=count))
+
+
+def test_simulator_is_deterministic_for_a_seed():
+    assert messages(seed=1) == messages(seed=1)
+    assert messages(seed=1) != messages(seed=2)
+
+
+def test_record_and_replay_round_trip(tmp_path):
+    path = tmp_path / "traffic.ndjson"
+    sent = messages()
+    assert any(payload[:1] != b"{" for _, _, payload in sent)
+
+    sink = RecordingSink(path)
+    assert run(iter(sent), sink, speed=MAX_SPEED) == len(sent)
+    sink.close()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == len(sent)
+    assert {"payload", "payload_b64"} & set(json.loads(lines[0]))
+    assert [(round(offset, 6), topic, payload) for offset, topic, payload in sent] == list(read_recording(path))
+
+
+def test_recording_sink_forwards_to_inner_sink(tmp_path):
+    class ListSink:
+        def __init__(self):
+            self.sent = []
+            self.closed = False
+
+        def send(self, topic, payload):
+            self.sent.append((topic, payload))
+
+        def close(self):
+            self.closed = True
+
+    inner = ListSink()
+    sink = RecordingSink(tmp_path / "traffic.ndjson", inner)
+    sink.send("jmailbox/box-1/sensor", b'{"distance": 4}')
+    sink.close()
+    assert inner.sent == [("jmailbox/box-1/sensor", b'{"distance": 4}')] and inner.closed
+
+
+def test_run_rejects_speed_out_of_range():
+    with pytest.raises(ValueError):
+        run(iter([]), None, speed=MAX_SPEED + 1)
+
+
+def test_replay_into_service_sink_drains_every_message(tmp_path):
+    path = tmp_path / "traffic.ndjson"
+    sent = messages()
+    sink = RecordingSink(path)
+    run(iter(sent), sink, speed=MAX_SPEED)
+    sink.close()
+
+    service = IngestService("localhost", 1883, TOPICS, drain_max_messages=50)
+    sink = ServiceSink(service, drain_every=40)
+    run(read_recording(path), sink, speed=MAX_SPEED)
+    sink.close()
+
+    assert len(service.buffer) == 0
+    assert service.store.history is None
+    devices = {topic.split("/")[1] for _, topic, _ in sent}
+    assert set(service.store.registry.devices) == devices
+
+
+def test_load_runner_runs_in_background_and_closes_the_sink():
+    service = IngestService("localhost", 1883, TOPICS)
+    runner = LoadRunner()
+    sink = ServiceSink(service, drain_every=100)
+    runner.start("test", iter(messages(count=200)), sink, MAX_SPEED)
+    with pytest.raises(ValueError):
+        runner.start("again", iter([]), sink)
+    runner._thread.join(5)
+
+    summary = runner.summary()
+    assert summary['description'] == "test" and not summary['running']
+    assert summary['sent'] >= 200 and summary['error'] is None
+    assert runner.sink is sink and len(service.buffer) == 0